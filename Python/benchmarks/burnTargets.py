@@ -0,0 +1,146 @@
+"""
+Times openOCD.burn_targets against openocdShim.py: one target, then N targets flashed at the same time
+and N targets one at a time (maxParallel 1). Every flash takes --flash-time seconds, so N concurrent
+targets should take about as long as a single one and the sequential run N times as long.
+
+    python3 benchmarks/burnTargets.py --targets 4 --flash-time 1 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from libraries.eventLoop import stopEventLoop
+from libraries.loggerSetup import configure_logging, stop_logging
+from services.openOCD import openOCD
+from typing import Any, Dict, List
+
+
+def createService(
+    workDirectory: str, targets: int, flashTime: float, maxParallel: int
+) -> openOCD:
+    configs = []
+
+    for index in range(targets):
+        for program in ["test", "firmware"]:
+            name = f"{program}{index}.cfg"
+            open(os.path.join(workDirectory, name), "w").close()
+        # end for
+
+        configs.append(
+            {
+                "name": f"board{index}",
+                "testProgram": f"test{index}.cfg",
+                "firmware": f"firmware{index}.cfg",
+                "interface": f"interface/board{index}.cfg",
+            }
+        )
+    # end for
+
+    return openOCD(
+        {
+            # the path is relative to the working directory, even with a leading /
+            "path": os.path.relpath(workDirectory),
+            "targets": configs,
+            "maxParallel": maxParallel,
+            "command": [
+                sys.executable,
+                os.path.join(BENCHMARKS, "openocdShim.py"),
+                "--delay",
+                str(flashTime),
+            ],
+        }
+    )
+
+
+# end def
+
+
+def timeBurn(service: openOCD, targets: List[str], repeat: int) -> Dict[str, Any]:
+    """Flashes the test program into the targets repeat times, the median time is returned."""
+    durations = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = service.start_burning_targets("testProgram", targets).result()
+        durations.append(time.perf_counter() - start)
+
+        failed = [name for name, result in results.items() if not result["Success"]]
+
+        if len(results) != len(targets) or failed:
+            raise SystemExit(f"flashing failed: {failed or results}")
+        # end if
+    # end for
+
+    return {"targets": len(targets), "seconds": statistics.median(durations)}
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--targets", type=int, default=4, help="targets flashed at the same time"
+    )
+    parser.add_argument(
+        "--flash-time", type=float, default=1, help="seconds per openocd run"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    configure_logging({"level": args.log_level})
+    workDirectory = tempfile.mkdtemp(prefix="burnTargets")
+    names = [f"board{index}" for index in range(args.targets)]
+
+    try:
+        concurrent = createService(
+            workDirectory, args.targets, args.flash_time, args.targets
+        )
+        sequential = createService(workDirectory, args.targets, args.flash_time, 1)
+        results = {
+            "single": timeBurn(concurrent, names[:1], args.repeat),
+            "concurrent": timeBurn(concurrent, names, args.repeat),
+            "sequential": timeBurn(sequential, names, args.repeat),
+        }
+    finally:
+        stopEventLoop()
+        stop_logging()
+    # end try-finally
+
+    single = results["single"]["seconds"]
+    print(f"{args.flash_time * 1000:.0f} ms per flash, median of {args.repeat} runs")
+
+    for name, value in results.items():
+        value["relativeToSingle"] = value["seconds"] / single
+        print(
+            f"  {name:10} {value['targets']:3} targets {value['seconds'] * 1000:7.0f} ms "
+            f"({value['relativeToSingle']:.2f}x a single target)"
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,89 @@
+"""
+Measures the cost of capturing the serial traffic: the time trafficCapture.append holds the reading or
+writing thread for chunks of several sizes, with the ring full so that the oldest records are
+overwritten on every append.
+
+    python3 benchmarks/capture.py --size 1048576 --appends 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from libraries.trafficCapture import readCapture, trafficCapture, IN
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--size", type=int, default=1024 * 1024, help="bytes of the ring"
+    )
+    parser.add_argument("--appends", type=int, default=100000)
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    results = {}
+    workDirectory = tempfile.mkdtemp(prefix="capture")
+
+    for chunkSize in [12, 64, 512, 4096]:
+        path = os.path.join(workDirectory, f"{chunkSize}.scap")
+        capture = trafficCapture(path, args.size, "benchmark")
+        chunk = bytes(range(256)) * (chunkSize // 256) + bytes(range(chunkSize % 256))
+
+        # the ring is filled first, every measured append overwrites the oldest records
+        for _ in range(args.size // (chunkSize + 12) + 1):
+            capture.append(IN, chunk)
+        # end for
+
+        began = time.perf_counter_ns()
+
+        for index in range(args.appends):
+            capture.append(index & 1, chunk)
+        # end for
+
+        elapsed = time.perf_counter_ns() - began
+        capture.close()
+
+        _, overwritten, records = readCapture(path)
+
+        if records[-1].data != chunk:
+            raise RuntimeError(f"the capture of {chunkSize} byte chunks is corrupted")
+        # end if
+
+        results[chunkSize] = {
+            "nanosecondsPerAppend": elapsed / args.appends,
+            "megabytesPerSecond": chunkSize * args.appends / elapsed * 1000,
+            "records": len(records),
+            "overwritten": overwritten,
+        }
+    # end for
+
+    print(f"{args.size} byte ring, {args.appends} appends per chunk size")
+
+    for chunkSize, value in results.items():
+        print(
+            f"  {chunkSize:5} B chunks {value['nanosecondsPerAppend']:8.0f} ns per append "
+            f"{value['megabytesPerSecond']:8.1f} MB/s, {value['records']} records kept"
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
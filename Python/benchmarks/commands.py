@@ -0,0 +1,199 @@
+"""
+Compares the cost per nextion instruction of the ways the writers encode them:
+
+- join: the writers before the command builder, every string encoded and joined with its terminator.
+- strings: the string api, every string encoded into the writer's reusable buffer. The constants
+  are looked up instead of being encoded again.
+- frames: the instructions pre-encoded or written by a commandBuilder and queued as one frame.
+
+Time is measured with tracemalloc off. Release builds of CPython do not count allocations, so they
+are measured with tracemalloc as the most memory held while a batch is encoded: the formatted
+strings, their encoded copies and the bytes written.
+
+    python3 benchmarks/commands.py --batch 100 --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from libraries.nextionCommands import (
+    commandBuilder,
+    encodeInto,
+    CLEAR_WAVEFORM,
+    HANDSHAKE,
+    PAGE,
+    TERMINATOR,
+)
+from typing import Any, Callable, Dict, List
+
+
+def constantMessages(batch: int) -> List[str]:
+    constants = ["page 9", "cle 2,255", "timeoutTMR.en=1"]
+
+    return [constants[i % len(constants)] for i in range(batch)]
+
+
+# end def
+
+
+def waveformMessages(batch: int) -> List[str]:
+    return [f"add 2,{i % 4},{150 + i % 100}" for i in range(batch)]
+
+
+# end def
+
+
+def join(messages: List[str]) -> bytes:
+    return b"".join(message.encode("utf-8") + TERMINATOR for message in messages)
+
+
+# end def
+
+
+def strings(buffer: bytearray, messages: List[str]) -> bytearray:
+    buffer.clear()
+
+    for message in messages:
+        encodeInto(buffer, message)
+    # end for
+
+    return buffer
+
+
+# end def
+
+
+def constantFrames(buffer: bytearray, batch: int) -> bytearray:
+    constants = [PAGE[9], CLEAR_WAVEFORM, HANDSHAKE]
+    buffer.clear()
+
+    for i in range(batch):
+        buffer += constants[i % len(constants)]
+    # end for
+
+    return buffer
+
+
+# end def
+
+
+def waveformFrames(buffer: bytearray, builder: commandBuilder, batch: int):
+    buffer.clear()
+
+    for i in range(batch):
+        builder.waveform(2, i % 4, 150 + i % 100)
+    # end for
+
+    buffer += builder.frame()
+
+    return buffer
+
+
+# end def
+
+
+def measure(function: Callable[[], Any], batch: int, repeat: int) -> Dict[str, float]:
+    """Nanoseconds and peak bytes allocated, per instruction."""
+    function()
+
+    began = time.perf_counter_ns()
+
+    for _ in range(repeat):
+        function()
+    # end for
+
+    elapsed = time.perf_counter_ns() - began
+
+    tracemalloc.start()
+    peak = 0
+
+    for _ in range(min(repeat, 200)):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = function()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        del result
+    # end for
+
+    tracemalloc.stop()
+
+    return {
+        "nanoseconds": elapsed / repeat / batch,
+        "peakBytes": peak / batch,
+    }
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch", type=int, default=100, help="instructions per write")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    buffer = bytearray()
+    builder = commandBuilder()
+    constants = constantMessages(args.batch)
+
+    results = {
+        "constants": {
+            "join": measure(lambda: join(constants), args.batch, args.repeat),
+            "strings": measure(
+                lambda: strings(buffer, constants), args.batch, args.repeat
+            ),
+            "frames": measure(
+                lambda: constantFrames(buffer, args.batch), args.batch, args.repeat
+            ),
+        },
+        # the strings are formatted in every batch, like the display formats every point
+        "waveform": {
+            "join": measure(
+                lambda: join(waveformMessages(args.batch)), args.batch, args.repeat
+            ),
+            "strings": measure(
+                lambda: strings(buffer, waveformMessages(args.batch)),
+                args.batch,
+                args.repeat,
+            ),
+            "frames": measure(
+                lambda: waveformFrames(buffer, builder, args.batch),
+                args.batch,
+                args.repeat,
+            ),
+        },
+    }
+
+    for workload, paths in results.items():
+        print(f"{workload} ({args.batch} instructions per write):")
+
+        for path, value in paths.items():
+            print(
+                f"  {path:8} {value['nanoseconds']:8.1f} ns  "
+                f"{value['peakBytes']:7.1f} bytes per instruction"
+            )
+        # end for
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
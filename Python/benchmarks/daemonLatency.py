@@ -0,0 +1,203 @@
+"""
+Compares the latency of a flash in the two modes of the openOCD service, with flashTarget.py as
+openocd:
+
+- spawn: the default mode, openocd is started for every flash with a cfg that programs the image. Every
+  flash pays the start of the process and --init-time, setting up the adapter and examining the target.
+- daemon: openocd is started once and every flash is a program command sent through its Tcl RPC port.
+
+Both write the same image into the same simulated flash. Before measuring, the results of the daemon
+commands are checked: the service wraps them in format "%d %s" [catch {...} result] $result and must
+report a command that succeeds and one that fails as such.
+
+    python3 benchmarks/daemonLatency.py --flashes 10 --init-time 0.3 --image-size 8192
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from benchmarks.delta import freePort, writeHex, IMAGE_ADDRESS
+from libraries.loggerSetup import configure_logging, stop_logging
+from services.openOCD import openOCD
+from typing import Any, Dict, List
+
+
+def checkResult(name: str, result: Dict[str, Any], success: bool, text: str) -> None:
+    """Raises SystemExit if the parsed result is not the expected one."""
+    output, error = result["Output:"], result["Error:"]
+    expected = output if success else error
+
+    if result["Success"] != success or text not in expected or (output and error):
+        raise SystemExit(f"{name}: unexpected result {result}")
+    # end if
+
+
+# end def
+
+
+def checkCatchResults(service: openOCD, image: str, missing: str) -> None:
+    # success with an empty result and with one of several words
+    checkResult("halt", service.halt(), True, "")
+    checkResult("program", service.program(image), True, "** Programming Finished **")
+    # the error message, after the code 1, is reported as the error
+    checkResult("missing image", service.program(missing), False, "No such file")
+
+
+# end def
+
+
+def timeFlashes(service: openOCD, flashes: int) -> List[float]:
+    durations = []
+
+    for _ in range(flashes):
+        start = time.perf_counter()
+        result = service.burn_test_program()
+        durations.append(time.perf_counter() - start)
+
+        if not result["Success"]:
+            raise SystemExit(f"flashing failed: {result['Error:']}")
+        # end if
+    # end for
+
+    return durations
+
+
+# end def
+
+
+def summary(durations: List[float]) -> Dict[str, float]:
+    return {
+        "flashes": len(durations),
+        "meanMilliseconds": statistics.mean(durations) * 1000,
+        "p50Milliseconds": statistics.median(durations) * 1000,
+        "maxMilliseconds": max(durations) * 1000,
+    }
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--flashes", type=int, default=10)
+    parser.add_argument(
+        "--init-time",
+        type=float,
+        default=0.3,
+        help="seconds openocd takes to set up the adapter and examine the target",
+    )
+    parser.add_argument("--image-size", type=int, default=8192)
+    parser.add_argument(
+        "--write-speed", type=float, default=20000, help="bytes per second"
+    )
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    configure_logging({"level": args.log_level})
+    workDirectory = tempfile.mkdtemp(prefix="daemonLatency")
+    image = os.path.join(workDirectory, "image.hex")
+    generator = random.Random(1)
+    writeHex(
+        image,
+        IMAGE_ADDRESS,
+        bytes(generator.getrandbits(8) for _ in range(args.image_size)),
+    )
+
+    # the cfg of the spawn mode does what a program command does in the daemon
+    with open(os.path.join(workDirectory, "program.cfg"), "w") as file:
+        file.write(f"init\nprogram {{{image}}} verify reset\nshutdown\n")
+    # end with
+
+    open(os.path.join(workDirectory, "target.cfg"), "w").close()
+
+    command = [
+        sys.executable,
+        os.path.join(BENCHMARKS, "flashTarget.py"),
+        "--init-time",
+        str(args.init_time),
+        "--write-speed",
+        str(args.write_speed),
+    ]
+    settings = {
+        # the path is relative to the working directory, even with a leading /
+        "path": os.path.relpath(workDirectory),
+        "testProgram": "program.cfg",
+        "firmware": "program.cfg",
+        "command": command,
+    }
+    results = {}
+
+    try:
+        spawn = openOCD(settings)
+        results["spawn"] = summary(timeFlashes(spawn, args.flashes))
+
+        start = time.perf_counter()
+        daemon = openOCD(
+            {
+                **settings,
+                "mode": "daemon",
+                "daemon": {
+                    "config": "target.cfg",
+                    "testImage": "image.hex",
+                    "firmwareImage": "image.hex",
+                    "tclPort": freePort(),
+                },
+            }
+        )
+
+        try:
+            checkCatchResults(daemon, image, os.path.join(workDirectory, "missing.hex"))
+            startSeconds = time.perf_counter() - start
+            results["daemon"] = summary(timeFlashes(daemon, args.flashes))
+            results["daemon"]["startMilliseconds"] = startSeconds * 1000
+        finally:
+            daemon.dispose()
+        # end try-finally
+    finally:
+        stop_logging()
+    # end try-finally
+
+    print(
+        f"{args.image_size} byte image at {args.write_speed:.0f} B/s, "
+        f"{args.init_time * 1000:.0f} ms to set up openocd, {args.flashes} flashes"
+    )
+
+    for name, value in results.items():
+        print(
+            f"  {name:6} mean {value['meanMilliseconds']:6.0f} ms  "
+            f"p50 {value['p50Milliseconds']:6.0f} ms  max {value['maxMilliseconds']:6.0f} ms"
+        )
+    # end for
+
+    saved = results["spawn"]["meanMilliseconds"] - results["daemon"]["meanMilliseconds"]
+    print(
+        f"  the daemon saves {saved:.0f} ms per flash, it was started and checked in "
+        f"{results['daemon']['startMilliseconds']:.0f} ms"
+    )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,233 @@
+"""
+Compares programming a whole image with delta flashing against the simulated flash of
+flashTarget.py, started as the openocd daemon of the openOCD service. For every scenario the target
+holds the base image and the new image is programmed both ways from that same content.
+
+    python3 benchmarks/delta.py --image-size 65536 --write-speed 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from libraries.firmwareImage import loadPagedImage
+from libraries.tclRpcClient import tclRpcClient
+from services.openOCD import openOCD
+from typing import Dict, List, Tuple
+
+# the application starts after the bootloader, like in the SAMD21 boards
+IMAGE_ADDRESS = 0x2000
+
+
+def writeHex(path: str, address: int, data: bytes) -> None:
+    """Writes the data as an Intel HEX file of 16 byte records."""
+    lines = []
+    segment = None
+
+    for offset in range(0, len(data), 16):
+        current = address + offset
+
+        if current >> 16 != segment:
+            segment = current >> 16
+            record = bytes([2, 0, 0, 4]) + segment.to_bytes(2, "big")
+            lines.append(f":{(record + bytes([-sum(record) & 0xFF])).hex().upper()}")
+        # end if
+
+        chunk = data[offset : offset + 16]
+        record = bytes([len(chunk), (current >> 8) & 0xFF, current & 0xFF, 0]) + chunk
+        lines.append(f":{(record + bytes([-sum(record) & 0xFF])).hex().upper()}")
+    # end for
+
+    lines.append(":00000001FF")
+
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+    # end with
+
+
+# end def
+
+
+def scenarios(size: int) -> List[Tuple[str, bytes, bytes]]:
+    """Name, image in the target and new image of every scenario."""
+    generator = random.Random(1)
+    base = bytes(generator.getrandbits(8) for _ in range(size))
+
+    calibration = bytearray(base)
+    calibration[-32:] = bytes(generator.getrandbits(8) for _ in range(32))
+
+    patch = bytearray(base)
+    patch[size // 2 : size // 2 + 300] = bytes(
+        generator.getrandbits(8) for _ in range(300)
+    )
+
+    return [
+        ("identical", base, base),
+        ("calibration block", base, bytes(calibration)),
+        ("small patch", base, bytes(patch)),
+        ("new firmware", base, bytes(generator.getrandbits(8) for _ in range(size))),
+    ]
+
+
+# end def
+
+
+def freePort() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+    # end with
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image-size", type=int, default=65536)
+    parser.add_argument("--page-size", type=int, default=256)
+    parser.add_argument(
+        "--write-speed", type=float, default=20000, help="bytes per second"
+    )
+    parser.add_argument(
+        "--read-speed", type=float, default=200000, help="bytes per second"
+    )
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    workDirectory = tempfile.mkdtemp(prefix="delta")
+
+    for name in ["target.cfg", "test.cfg", "firmware.cfg"]:
+        open(os.path.join(workDirectory, name), "w").close()
+    # end for
+
+    cases = scenarios(args.image_size)
+    writeHex(os.path.join(workDirectory, "base.hex"), IMAGE_ADDRESS, cases[0][1])
+    port = freePort()
+
+    service = openOCD(
+        {
+            # the path is relative to the working directory, even with a leading /
+            "path": os.path.relpath(workDirectory),
+            "testProgram": "test.cfg",
+            "firmware": "firmware.cfg",
+            "mode": "daemon",
+            "command": [
+                sys.executable,
+                os.path.join(BENCHMARKS, "flashTarget.py"),
+                "--row-size",
+                str(args.page_size),
+                "--write-speed",
+                str(args.write_speed),
+                "--read-speed",
+                str(args.read_speed),
+            ],
+            "daemon": {
+                "config": "target.cfg",
+                "testImage": "base.hex",
+                "firmwareImage": "base.hex",
+                "tclPort": port,
+                "pageSize": args.page_size,
+            },
+        }
+    )
+    # the fake commands go through a connection of their own
+    control = tclRpcClient(port=port)
+    results: Dict[str, Dict[str, float]] = {}
+
+    try:
+        service.halt()
+
+        # the content of the target before every scenario
+        baseState = os.path.join(workDirectory, "base.state")
+        service.program(os.path.join(workDirectory, "base.hex"))
+        control.call(f"fake_save {{{baseState}}}")
+
+        for name, _, image in cases:
+            imagePath = os.path.join(workDirectory, f"{name.replace(' ', '_')}.hex")
+            writeHex(imagePath, IMAGE_ADDRESS, image)
+
+            # parsing and paging the image is cached, it is not part of the measurement
+            began = time.perf_counter()
+            loadPagedImage(
+                imagePath, args.page_size, os.path.join(workDirectory, ".cache")
+            )
+            pagingSeconds = time.perf_counter() - began
+
+            measured = {}
+
+            for method in ["program", "delta"]:
+                control.call(f"fake_load {{{baseState}}}")
+                control.call("fake_reset_stats")
+
+                began = time.perf_counter()
+
+                if method == "program":
+                    result = service.program(imagePath)
+                else:
+                    result = service.program_delta(imagePath)
+                # end if
+
+                seconds = time.perf_counter() - began
+
+                if not result["Success"]:
+                    raise RuntimeError(f"{name} {method}: {result['Error:']}")
+                # end if
+
+                measured[method] = {
+                    "seconds": seconds,
+                    **json.loads(control.call("fake_stats")),
+                }
+            # end for
+
+            results[name] = {
+                "pagingSeconds": pagingSeconds,
+                **{
+                    f"{method}{key[0].upper()}{key[1:]}": value
+                    for method, values in measured.items()
+                    for key, value in values.items()
+                },
+            }
+        # end for
+    finally:
+        control.close()
+        service.dispose()
+    # end try-finally
+
+    print(
+        f"{args.image_size} byte image, {args.page_size} byte pages, "
+        f"writing at {args.write_speed:.0f} B/s, reading at {args.read_speed:.0f} B/s"
+    )
+
+    for name, value in results.items():
+        saved = value["programSeconds"] - value["deltaSeconds"]
+        print(
+            f"  {name:18} program {value['programSeconds']:6.2f} s "
+            f"{value['programBytesWritten']:7} B written  |  "
+            f"delta {value['deltaSeconds']:6.2f} s {value['deltaBytesWritten']:7} B written "
+            f"{value['deltaBytesRead']:7} B read  |  saved {saved:6.2f} s"
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,195 @@
+"""
+Measures how long the display takes to render an error page, from the message to the frame of
+instructions, the work done by display.__printError. The lines are wrapped three ways:
+
+- pil: the wrapping before textLayout, the font loaded on every call and every growing line measured
+  with ImageDraw.textbbox.
+- layout: textLayout, the characters measured once and every word summed, with an empty cache.
+- cached: textLayout with the message already wrapped, like the display's known messages.
+
+The lines and line height must be the same for the three of them.
+
+    python3 benchmarks/errorLayout.py --repeat 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from libraries.nextionCommands import commandBuilder, CLEAR_ERROR_MESSAGE, ERROR_TITLE
+from libraries.textLayout import textLayout
+from PIL import Image, ImageDraw, ImageFont
+from typing import Any, Callable, Dict, List, Tuple
+
+FONT = os.path.join(ROOT, "Resources", "Fonts", "Poppins-Bold.ttf")
+FONT_SIZE = 24
+WIDTH = 250
+
+MESSAGES = {
+    "button": "No se detectó el botón.\n PRUEBA NO APROBADA",
+    "firmware": "No se pudo cargar el firmware.\n PRUEBA NO APROBADA",
+    "long": "El relé de la bomba no cerró al recibir la orden y el de la válvula quedó "
+    "cerrado cuando debía estar abierto, revise el conector de la placa.\n PRUEBA NO APROBADA",
+}
+
+
+def pilWrap(text: str) -> Tuple[List[str], int]:
+    # the display's wrapping before textLayout
+    image = Image.new("RGB", (1, 1))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(FONT, FONT_SIZE)
+
+    words = text.split()
+    lines = []
+    current_line = ""
+    line_height = 0
+
+    for word in words:
+        test_line = f"{current_line} {word}".strip()
+        txtbox = draw.textbbox((0, 0), test_line, font=font)
+        text_width = txtbox[2] - txtbox[0]
+
+        if len(lines) == 0:
+            line_height = txtbox[3] - txtbox[1]
+
+        if text_width <= WIDTH:
+            current_line = test_line
+
+        else:
+            lines.append(current_line)
+            current_line = word
+        # end if
+
+    # end for
+
+    if current_line:
+        lines.append(current_line)
+
+    return (lines, line_height)
+
+
+# end def
+
+
+def errorFrame(lines: List[str], lineHeight: int) -> bytes:
+    # the frame written by display.__printError
+    if len(lines) > 3:
+        lines = lines[:2] + [" ".join(line.strip() for line in lines[2:])]
+    # end if
+
+    builder = commandBuilder()
+    builder.page(6).raw(CLEAR_ERROR_MESSAGE).raw(ERROR_TITLE)
+
+    y = 19 + 35
+    for line in lines:
+        builder.command(f'xstr 34,{y},250,{lineHeight},2,WHITE,0,1,1,0,"{line}"')
+        y += lineHeight + 5
+    # end for
+
+    return builder.frame()
+
+
+# end def
+
+
+def timeRender(
+    wrap: Callable[[str], Tuple[List[str], int]],
+    message: str,
+    repeat: int,
+    before: Callable[[], None] = None,
+) -> Dict[str, float]:
+    durations = []
+
+    for _ in range(repeat):
+        if before:
+            before()
+        # end if
+
+        start = time.perf_counter()
+        lines, lineHeight = wrap(message)
+        errorFrame(list(lines), lineHeight)
+        durations.append(time.perf_counter() - start)
+    # end for
+
+    return {
+        "p50Microseconds": statistics.median(durations) * 1e6,
+        "maxMicroseconds": max(durations) * 1e6,
+    }
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    layout = textLayout(FONT, FONT_SIZE)
+    loadSeconds = time.perf_counter() - start
+    results: Dict[str, Any] = {"layoutLoadMilliseconds": loadSeconds * 1000}
+
+    def layoutWrap(message: str) -> Tuple[List[str], int]:
+        return layout.wrap(message, WIDTH)
+
+    # end def
+
+    for name, message in MESSAGES.items():
+        expected = pilWrap(message)
+        wrapped = layoutWrap(message)
+
+        if (list(wrapped[0]), wrapped[1]) != expected:
+            raise SystemExit(f"{name}: {wrapped} instead of {expected}")
+        # end if
+
+        results[name] = {
+            "lines": len(expected[0]),
+            "pil": timeRender(pilWrap, message, args.repeat),
+            "layout": timeRender(
+                layoutWrap, message, args.repeat, layout.wrap.cache_clear
+            ),
+            "cached": timeRender(layoutWrap, message, args.repeat),
+        }
+    # end for
+
+    print(
+        f"Poppins Bold {FONT_SIZE}, {WIDTH} px wide, the layout is loaded once in "
+        f"{results['layoutLoadMilliseconds']:.0f} ms. Median and max of {args.repeat} renders"
+    )
+
+    for name in MESSAGES:
+        value = results[name]
+        print(
+            f"  {name:9} {value['lines']} lines  "
+            + "  ".join(
+                f"{way} {value[way]['p50Microseconds']:7.0f} us "
+                f"(max {value[way]['maxMicroseconds']:6.0f})"
+                for way in ["pil", "layout", "cached"]
+            )
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,352 @@
+"""
+Stand-in for the openocd daemon with a simulated flash memory behind its Tcl RPC port. It takes
+openocd's arguments, listens on the tcl_port given with -c and answers the commands the openOCD
+service sends, taking as long as a SAMD21 flashed through SWD would.
+
+    python3 flashTarget.py --flash-size 262144 --write-speed 20000 -c "tcl_port 6666"
+
+Besides the openocd commands it answers fake_stats, the bytes read, erased and written so far,
+fake_reset_stats, and fake_save/fake_load {file} to store and restore the flash content.
+
+Without a tcl_port it runs the commands of its -f files, one per line, and exits, like openocd started
+for every flash. --init-time is spent before the first command in both modes, setting up the adapter
+and examining the target.
+
+    python3 flashTarget.py --init-time 0.3 -f interface.cfg -f program.cfg
+"""
+
+import argparse
+import json
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from libraries.firmwareImage import firmwareImage
+from typing import List
+
+SEPARATOR = b"\x1a"
+_CATCH = re.compile(r'^format "%d %s" \[catch \{(.*)\} result\] \$result$', re.DOTALL)
+
+
+def tokens(command: str):
+    """Splits a tcl command into its words, a {braced} word keeps its spaces."""
+    return [
+        braced if braced else plain
+        for braced, plain in re.findall(r"\{([^}]*)\}|(\S+)", command)
+    ]
+
+
+# end def
+
+
+class flashMemory:
+    def __init__(self, args) -> None:
+        self.args = args
+        self.content = bytearray(b"\xff" * args.flash_size)
+        self.lock = threading.Lock()
+        self.resetStatistics()
+
+    # end def
+
+    def resetStatistics(self) -> None:
+        self.statistics = {"bytesRead": 0, "bytesErased": 0, "bytesWritten": 0}
+
+    # end def
+
+    def read(self, address: int, size: int) -> bytes:
+        self.statistics["bytesRead"] += size
+        time.sleep(size / self.args.read_speed)
+
+        return bytes(self.content[address : address + size])
+
+    # end def
+
+    def write(self, address: int, data: bytes) -> None:
+        """Writes like the SAMD21 driver: every row touched is erased and written back whole."""
+        rowSize = self.args.row_size
+        first = address // rowSize * rowSize
+        last = (address + len(data) + rowSize - 1) // rowSize * rowSize
+
+        if last > len(self.content):
+            raise RuntimeError(f"address {last:#x} is out of the flash")
+        # end if
+
+        rows = (last - first) // rowSize
+        self.statistics["bytesErased"] += rows * rowSize
+        self.statistics["bytesWritten"] += rows * rowSize
+        time.sleep(rows * self.args.erase_time + rows * rowSize / self.args.write_speed)
+
+        self.content[address : address + len(data)] = data
+
+    # end def
+
+
+# end class
+
+
+class tclHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        buffer = bytearray()
+
+        while True:
+            chunk = self.request.recv(65536)
+
+            if chunk == b"":
+                return
+            # end if
+
+            buffer += chunk
+
+            while SEPARATOR in buffer:
+                index = buffer.index(SEPARATOR)
+                command = buffer[:index].decode("utf-8")
+                del buffer[: index + 1]
+
+                with self.server.flash.lock:
+                    response = self.server.execute(command)
+                # end with
+
+                self.request.sendall(response.encode("utf-8") + SEPARATOR)
+
+                if command == "shutdown":
+                    threading.Thread(target=self.server.shutdown).start()
+                    return
+                # end if
+            # end while
+        # end while
+
+    # end def
+
+
+# end class
+
+
+class targetCommands:
+    def __init__(self, flash: flashMemory) -> None:
+        """The openocd commands sent by the openOCD service, run on the simulated flash."""
+        self.flash = flash
+
+    # end def
+
+    def execute(self, command: str) -> str:
+        match = _CATCH.match(command)
+
+        if match is None:
+            try:
+                return self.run(command)
+            except Exception as e:
+                return str(e)
+            # end try-except
+        # end if
+
+        try:
+            result = ""
+
+            for part in match.group(1).split(";"):
+                if part.strip():
+                    result = self.run(part.strip())
+                # end if
+            # end for
+
+            return f"0 {result}"
+        except Exception as e:
+            return f"1 {e}"
+        # end try-except
+
+    # end def
+
+    def run(self, command: str) -> str:
+        words = tokens(command)
+        flash = self.flash
+
+        if words[0] in ["halt", "init", "reset", "shutdown"]:
+            return ""
+        elif words[0] == "read_memory":
+            address, width, count = int(words[1], 0), int(words[2]), int(words[3])
+            data = flash.read(address, count * width // 8)
+
+            return " ".join(
+                f"{int.from_bytes(data[offset : offset + 4], 'little'):#010x}"
+                for offset in range(0, len(data), 4)
+            )
+        elif words[:2] == ["flash", "write_image"]:
+            arguments = [word for word in words[2:] if word != "erase"]
+
+            with open(arguments[0], "rb") as file:
+                flash.write(int(arguments[1], 0), file.read())
+            # end with
+
+            return ""
+        elif words[0] == "verify_image":
+            with open(words[1], "rb") as file:
+                data = file.read()
+            # end with
+
+            if flash.read(int(words[2], 0), len(data)) != data:
+                raise RuntimeError("verify_image: contents differ")
+            # end if
+
+            return "verified"
+        elif words[0] == "program":
+            image = firmwareImage(words[1])
+
+            for address, data in image.sections:
+                flash.write(address, data)
+            # end for
+
+            if "verify" in words:
+                for address, data in image.sections:
+                    if flash.read(address, len(data)) != data:
+                        raise RuntimeError("** Verify Failed **")
+                    # end if
+                # end for
+            # end if
+
+            return "** Programming Finished **"
+        elif words[0] == "verify_image_checksum":
+            # the checksums are computed by the target, only the result crosses the link
+            image = firmwareImage(words[1])
+
+            for address, data in image.sections:
+                if flash.content[address : address + len(data)] != data:
+                    raise RuntimeError("checksum mismatch")
+                # end if
+            # end for
+
+            return "verified"
+        elif words[0] == "fake_stats":
+            return json.dumps(flash.statistics)
+        elif words[0] == "fake_reset_stats":
+            flash.resetStatistics()
+            return ""
+        elif words[0] == "fake_save":
+            with open(words[1], "wb") as file:
+                file.write(flash.content)
+            # end with
+
+            return ""
+        elif words[0] == "fake_load":
+            with open(words[1], "rb") as file:
+                flash.content[:] = file.read()
+            # end with
+
+            return ""
+        # end if
+
+        raise RuntimeError(f'invalid command name "{words[0]}"')
+
+    # end def
+
+
+# end class
+
+
+class tclServer(socketserver.ThreadingMixIn, socketserver.TCPServer, targetCommands):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port: int, flash: flashMemory) -> None:
+        super().__init__(("127.0.0.1", port), tclHandler)
+        targetCommands.__init__(self, flash)
+
+    # end def
+
+
+# end class
+
+
+def runScripts(files: List[str], commands: targetCommands) -> int:
+    """Runs the commands of the files like openocd -f, returns the exit code."""
+    for path in files:
+        if not os.path.isfile(path):
+            continue
+        # end if
+
+        with open(path) as file:
+            lines = [line.strip() for line in file]
+        # end with
+
+        for line in lines:
+            if line == "" or line.startswith("#"):
+                continue
+            # end if
+
+            try:
+                result = commands.run(line)
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+            # end try-except
+
+            if result:
+                print(result, file=sys.stderr)
+            # end if
+
+            if line == "shutdown":
+                return 0
+            # end if
+        # end for
+    # end for
+
+    return 0
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flash-size", type=int, default=262144)
+    parser.add_argument("--row-size", type=int, default=256)
+    parser.add_argument(
+        "--write-speed", type=float, default=20000, help="bytes per second"
+    )
+    parser.add_argument(
+        "--read-speed", type=float, default=200000, help="bytes per second"
+    )
+    parser.add_argument(
+        "--erase-time", type=float, default=0.006, help="seconds per row"
+    )
+    parser.add_argument(
+        "--init-time",
+        type=float,
+        default=0.0,
+        help="seconds to set up the adapter and examine the target",
+    )
+    parser.add_argument("-f", dest="files", action="append", default=[])
+    parser.add_argument("-c", dest="commands", action="append", default=[])
+    args, _ = parser.parse_known_args()
+
+    port = None
+
+    for command in args.commands:
+        if command.startswith("tcl_port "):
+            port = int(command.split()[1])
+        # end if
+    # end for
+
+    print("Open On-Chip Debugger (flash target)", file=sys.stderr)
+    time.sleep(args.init_time)
+
+    if port is None:
+        sys.exit(runScripts(args.files, targetCommands(flashMemory(args))))
+    # end if
+
+    server = tclServer(port, flashMemory(args))
+    server.serve_forever()
+    server.server_close()
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,132 @@
+"""
+Times the pin accesses of the GPIO service with its two backends:
+
+- rpi: RPi.GPIO, here the simulated one in fakes, every pin read or written with its own call.
+- gpiomem: the registers mapped from a regular file instead of /dev/gpiomem, every input read with a
+  single register read and several outputs written with a single register write.
+
+It reports the nanoseconds per snapshot of every input, per readPin of every input and per setPin of a
+single output and of every harness output.
+
+    python3 benchmarks/gpio.py --repeat 100000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "fakes"))
+
+from libraries.loggerSetup import configure_logging, stop_logging
+from services.gpio import GPIO, harnessWires, InputPin, OutputPin
+from typing import Callable, Dict
+
+ROUNDS = 5
+
+
+def timeCall(function: Callable[[], None], repeat: int) -> float:
+    """Returns the nanoseconds per call, the median of ROUNDS rounds of repeat calls."""
+    durations = []
+
+    for _ in range(ROUNDS):
+        start = time.perf_counter_ns()
+
+        for _ in range(repeat):
+            function()
+        # end for
+
+        durations.append((time.perf_counter_ns() - start) / repeat)
+    # end for
+
+    return statistics.median(durations)
+
+
+# end def
+
+
+def timeService(service: GPIO, repeat: int) -> Dict[str, float]:
+    inputs = list(InputPin)
+    outputs = [output for output, _ in harnessWires()]
+    level = [False]
+
+    def setOne():
+        level[0] = not level[0]
+        service.setPin(OutputPin.LINE, level[0])
+
+    # end def
+
+    def setAll():
+        level[0] = not level[0]
+        service.setPin(outputs, level[0])
+
+    # end def
+
+    return {
+        "snapshot": timeCall(service.snapshot, repeat),
+        "readPin": timeCall(lambda: service.readPin(inputs), repeat),
+        "setPin": timeCall(setOne, repeat),
+        "setPins": timeCall(setAll, repeat),
+    }
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=100000)
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    configure_logging({"level": args.log_level})
+    # the backend grows the file to the size of the register block
+    registers = os.path.join(tempfile.mkdtemp(prefix="gpio"), "gpiomem")
+    open(registers, "w").close()
+
+    try:
+        results = {
+            "rpi": timeService(GPIO({"backend": "rpi"}), args.repeat),
+            "gpiomem": timeService(
+                GPIO({"backend": "gpiomem", "path": registers}), args.repeat
+            ),
+        }
+    finally:
+        stop_logging()
+    # end try-finally
+
+    print(
+        f"{len(InputPin)} inputs, {len(harnessWires())} harness outputs, "
+        f"median of {ROUNDS} rounds of {args.repeat} calls"
+    )
+
+    for name in results["rpi"]:
+        rpi, gpiomem = results["rpi"][name], results["gpiomem"][name]
+        print(
+            f"  {name:8} rpi {rpi:8.0f} ns  gpiomem {gpiomem:8.0f} ns  "
+            f"({rpi / gpiomem:.1f}x)"
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,263 @@
+"""
+Measures the link supervisor and the reopening of the serial ports, on a fake display behind a
+symbolic link to a pseudo terminal, the way a USB adapter is reached through /dev/serial/by-id.
+
+- rtt: round trip time of the get dp probe, answered with the numeric data return code.
+- stall: the display stops answering, the time until the supervisor reopens the port and until a
+  probe is answered again once the display answers.
+- blocked: the display stops reading, the station's writes fill the pty and then the control lane.
+  The probes are not queued then, the time until the supervisor reopens the port and the longest
+  delay of another job of the shared scheduler are measured.
+- unplugged: the pseudo terminal is closed, like a USB adapter unplugged, and another one is linked
+  --outage seconds later. Messages of every lane are queued meanwhile, the ones written once the
+  port is reopened show the whileDown policy.
+
+    python3 benchmarks/linkHealth.py --interval 0.1 --stall-window 0.5 --outage 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from benchmarks.peers import fakeNextion
+from libraries.eventLoop import stopEventLoop
+from libraries.frameParser import BINARY_FRAME, NEXTION_TERMINATORS
+from libraries.linkSupervisor import linkSupervisor, KEEP, KEEP_CONTROL, DROP
+from libraries.loggerSetup import configure_logging, stop_logging
+from libraries.metrics import getRegistry
+from libraries.nextionCommands import GET_PAGE, NUMERIC_DATA
+from libraries.outbox import NEXTION_LANES
+from libraries.scheduler import getScheduler, stopScheduler, FIXED_RATE
+from libraries.serialDevice import createSerialDevice
+from typing import Any, Callable, Dict
+
+# one message of every lane, queued while the port is closed
+QUEUED = {"control": "page 2", "text": 't0.txt="ready"', "waveform": "add 2,0,150"}
+
+
+def waitUntil(condition: Callable[[], bool], timeout: float = 30) -> float:
+    """Returns when the condition became true, raises TimeoutError after timeout seconds."""
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("the link did not recover")
+        # end if
+
+        time.sleep(0.001)
+    # end while
+
+    return time.monotonic()
+
+
+# end def
+
+
+def relink(link: str, peer: fakeNextion) -> None:
+    if os.path.lexists(link):
+        os.remove(link)
+    # end if
+
+    os.symlink(peer.port, link)
+
+
+# end def
+
+
+def measure(backend: str, policy: str, link: str, args) -> Dict[str, Any]:
+    name = f"{backend} {policy}"
+    peer = fakeNextion()
+    relink(link, peer)
+    device = createSerialDevice(
+        backend,
+        link,
+        115200,
+        False,
+        loggerName=name,
+        terminators=NEXTION_TERMINATORS,
+        lanes=NEXTION_LANES,
+        reconnect={
+            "initialDelay": args.initial_delay,
+            "maxDelay": args.max_delay,
+            "factor": 2,
+            "whileDown": policy,
+        },
+    )
+    supervisor = linkSupervisor(
+        device,
+        name,
+        GET_PAGE,
+        lambda kind, frame: kind == BINARY_FRAME and frame[:1] == bytes([NUMERIC_DATA]),
+        args.interval,
+        args.stall_window,
+    )
+    registry = getRegistry()
+    rtt = registry.histogram("serial_rtt_seconds", device=name)
+    reconnects = registry.counter("serial_reconnects_total", device=name)
+    result = {}
+
+    try:
+        time.sleep(args.seconds)
+        observed = rtt.get()
+        result["rtt"] = {
+            "probes": observed["count"],
+            "meanMilliseconds": observed["sum"] / max(observed["count"], 1) * 1000,
+        }
+
+        # the display stops answering, nothing else is received either
+        peer.answering = False
+        stalled = time.monotonic()
+        detected = waitUntil(lambda: reconnects.get() >= 1)
+        peer.answering = True
+        answered = rtt.get()["count"]
+        recovered = waitUntil(lambda: rtt.get()["count"] > answered)
+        result["stall"] = {
+            "detectedSeconds": detected - stalled,
+            "answeredSeconds": recovered - detected,
+        }
+
+        # the display stops reading. The writer waits for the pty and the control lane fills up, a
+        # job of the shared scheduler goes on being called meanwhile
+        ticks = []
+        getScheduler().schedule(
+            f"{name} tick", lambda: ticks.append(time.monotonic()), 0.01, FIXED_RATE
+        )
+        flooding = threading.Event()
+        flooding.set()
+
+        def flood():
+            while flooding.is_set():
+                device.sendMessage("ref b0")
+            # end while
+
+        # end def
+
+        peer.reading = False
+        blocked = time.monotonic()
+        flooder = threading.Thread(target=flood, daemon=True)
+        flooder.start()
+        detected = waitUntil(lambda: reconnects.get() >= 2)
+        flooding.clear()
+        peer.reading = True
+        flooder.join()
+        getScheduler().cancel(f"{name} tick")
+        gaps = [later - earlier for earlier, later in zip(ticks, ticks[1:])]
+        result["blocked"] = {
+            "detectedSeconds": detected - blocked,
+            "longestTickGapSeconds": max(gaps),
+        }
+
+        # the adapter is unplugged, the port is reopened once another one is linked
+        peer.close()
+        unplugged = time.monotonic()
+        os.remove(link)
+        waitUntil(lambda: not device.linkUp)
+        down = time.monotonic()
+
+        for message in QUEUED.values():
+            device.sendMessage(message)
+        # end for
+
+        time.sleep(args.outage)
+        peer = fakeNextion()
+        relink(link, peer)
+        plugged = time.monotonic()
+        reopened = waitUntil(lambda: device.linkUp)
+        time.sleep(0.2)
+        written = [message for _, message in peer.received]
+        result["unplugged"] = {
+            "detectedSeconds": down - unplugged,
+            "reopenedSeconds": reopened - plugged,
+            "reconnects": reconnects.get(),
+            "written": [lane for lane, message in QUEUED.items() if message in written],
+        }
+    finally:
+        supervisor.stop()
+        device.closeConnection()
+        peer.close()
+    # end try-finally
+
+    return result
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--interval", type=float, default=0.1, help="seconds between probes"
+    )
+    parser.add_argument(
+        "--stall-window", type=float, default=0.5, help="seconds before reconnecting"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=2, help="seconds the round trip is measured"
+    )
+    parser.add_argument(
+        "--outage", type=float, default=1, help="seconds the adapter is unplugged"
+    )
+    parser.add_argument("--initial-delay", type=float, default=0.05)
+    parser.add_argument("--max-delay", type=float, default=0.4)
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    configure_logging({"level": args.log_level})
+    link = os.path.join(tempfile.mkdtemp(prefix="linkHealth"), "nextion")
+    results = {}
+
+    try:
+        for backend in ["threads", "asyncio"]:
+            for policy in [KEEP_CONTROL, KEEP, DROP]:
+                results[f"{backend} {policy}"] = measure(backend, policy, link, args)
+            # end for
+        # end for
+    finally:
+        stopScheduler()
+        stopEventLoop()
+        stop_logging()
+    # end try-finally
+
+    print(
+        f"probe every {args.interval * 1000:.0f} ms, stall window {args.stall_window * 1000:.0f} ms, "
+        f"unplugged for {args.outage * 1000:.0f} ms"
+    )
+
+    for name, value in results.items():
+        print(
+            f"  {name:20} rtt {value['rtt']['meanMilliseconds']:6.2f} ms "
+            f"({value['rtt']['probes']} probes)  "
+            f"stall detected {value['stall']['detectedSeconds'] * 1000:5.0f} ms, "
+            f"answered {value['stall']['answeredSeconds'] * 1000:5.0f} ms later  "
+            f"blocked detected {value['blocked']['detectedSeconds'] * 1000:5.0f} ms, "
+            f"scheduler delayed {value['blocked']['longestTickGapSeconds'] * 1000:4.0f} ms  "
+            f"unplugged detected {value['unplugged']['detectedSeconds'] * 1000:4.1f} ms, "
+            f"reopened {value['unplugged']['reopenedSeconds'] * 1000:4.0f} ms after "
+            f"plugged, written: {', '.join(value['unplugged']['written']) or 'none'}"
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,222 @@
+"""
+Measures how long a log call holds the thread that makes it when the console is slow, like a serial
+console or an SD card. The console is a stream that sleeps --write-time seconds on every write.
+
+- direct: the loggers before the logging pipeline, a StreamHandler writing in the calling thread.
+- queued: setup_logger, the records are queued to the listener thread and rate limited per site.
+
+Two workloads are logged: distinct info records, e.g. steps and tasks starting, and a burst of the
+same read error, like serialDevice logged it when the port failed. Before the pipeline every error
+was logged once per frame of its traceback.
+
+    python3 benchmarks/logThroughput.py --records 2000 --write-time 0.0005
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from typing import Callable, Dict
+
+
+class slowStream:
+    def __init__(self, writeTime: float) -> None:
+        self.writeTime = writeTime
+        self.writes = 0
+
+    # end def
+
+    def write(self, text: str) -> None:
+        self.writes += 1
+        time.sleep(self.writeTime)
+
+    # end def
+
+    def flush(self) -> None:
+        pass
+
+    # end def
+
+
+# end class
+
+
+def raiseReadError():
+    def feed():
+        raise OSError(5, "Input/output error")
+
+    # end def
+
+    def read():
+        feed()
+
+    # end def
+
+    read()
+
+
+# end def
+
+
+def distinctRecords(logger: logging.Logger, records: int) -> None:
+    for i in range(records):
+        logger.info(f"step {i} finished")
+    # end for
+
+
+# end def
+
+
+def readErrorsDirect(logger: logging.Logger, records: int) -> None:
+    import traceback
+
+    # the way serialDevice.__read logged every error before
+    for _ in range(records):
+        try:
+            raiseReadError()
+        except Exception as e:
+            for tb in traceback.extract_tb(sys.exc_info()[2]):
+                logger.error(f"Read error: Line {tb.line}. {e}")
+            # end for
+        # end try-except
+    # end for
+
+
+# end def
+
+
+def readErrorsQueued(logger: logging.Logger, records: int) -> None:
+    for _ in range(records):
+        try:
+            raiseReadError()
+        except Exception as e:
+            logger.error(f"Read error: {e}", exc_info=True)
+        # end try-except
+    # end for
+
+
+# end def
+
+
+def measure(function: Callable[[], None], records: int) -> Dict[str, float]:
+    began = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - began
+
+    return {"seconds": elapsed, "microsecondsPerCall": elapsed / records * 1e6}
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument(
+        "--write-time", type=float, default=0.0005, help="seconds per console write"
+    )
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    directStream = slowStream(args.write_time)
+    direct = logging.getLogger("direct")
+    direct.setLevel(logging.INFO)
+    direct.propagate = False
+    handler = logging.StreamHandler(directStream)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    direct.addHandler(handler)
+
+    # the listener's console handler writes to sys.stderr as it is when the first logger is set up
+    queuedStream = slowStream(args.write_time)
+    standardError = sys.stderr
+    sys.stderr = queuedStream
+
+    try:
+        from libraries.loggerSetup import configure_logging, setup_logger, stop_logging
+
+        queued = setup_logger("queued")
+        defaultRate = {"rate": 5, "burst": 20}
+
+        # distinct records are not rate limited, every one of them is queued and written
+        configure_logging({"rate": args.records, "burst": args.records})
+        results = {
+            "distinct": {
+                "direct": measure(
+                    lambda: distinctRecords(direct, args.records), args.records
+                ),
+                "queued": measure(
+                    lambda: distinctRecords(queued, args.records), args.records
+                ),
+            },
+        }
+        configure_logging(defaultRate)
+
+        began = time.perf_counter()
+        queued.info("drained")
+
+        while queuedStream.writes < args.records + 1:
+            time.sleep(0.001)
+        # end while
+
+        drainSeconds = time.perf_counter() - began
+        results["readErrors"] = {
+            "direct": measure(
+                lambda: readErrorsDirect(direct, args.records), args.records
+            ),
+            "queued": measure(
+                lambda: readErrorsQueued(queued, args.records), args.records
+            ),
+        }
+
+        stop_logging()
+    finally:
+        sys.stderr = standardError
+    # end try-finally
+
+    print(
+        f"{args.records} calls per workload, {args.write_time * 1000:.2f} ms per console write"
+    )
+
+    for workload, paths in results.items():
+        print(f"{workload}:")
+
+        for path, value in paths.items():
+            print(
+                f"  {path:7} {value['seconds']:7.3f} s  "
+                f"{value['microsecondsPerCall']:9.1f} us per call"
+            )
+        # end for
+    # end for
+
+    print(
+        f"console writes: direct {directStream.writes}, queued {queuedStream.writes} "
+        f"(the listener wrote the queued distinct records {drainSeconds:.3f} s after the calls)"
+    )
+
+    results["consoleWrites"] = {
+        "direct": directStream.writes,
+        "queued": queuedStream.writes,
+    }
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
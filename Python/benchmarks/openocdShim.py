@@ -0,0 +1,38 @@
+"""
+Stand-in for the openocd executable. It takes openocd's arguments, waits as long as a flashing
+session and exits like openocd would.
+
+    python3 openocdShim.py --delay 1.5 --failure-rate 0.1 -f interface.cfg -f target.cfg
+"""
+
+import argparse
+import random
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("-f", dest="files", action="append", default=[])
+    parser.add_argument("-c", dest="commands", action="append", default=[])
+    args, _ = parser.parse_known_args()
+
+    print("Open On-Chip Debugger (benchmark shim)", file=sys.stderr)
+    time.sleep(args.delay)
+
+    if random.random() < args.failure_rate:
+        print("Error: failed erasing sectors", file=sys.stderr)
+        sys.exit(1)
+    # end if
+
+    print("** Programming Finished **", file=sys.stderr)
+    print("** Verified OK **", file=sys.stderr)
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,273 @@
+import os
+import pty
+import select
+import threading
+import time
+import tty
+from typing import Callable, List, Tuple, Union
+
+# the station ends every message with the nextion terminator, also the ones sent to the board
+TERMINATOR = b"\xff\xff\xff"
+
+
+def ptyLink() -> Tuple[int, str]:
+    """
+    Creates a raw pseudo terminal pair.
+
+    Returns:
+        Tuple[int, str]: the peer's file descriptor and the port the station opens.
+    """
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+
+    return master, os.ttyname(slave)
+
+
+# end def
+
+
+class _peer:
+    def __init__(self, name: str) -> None:
+        """Reads the messages written by the station from its side of a pty pair."""
+        self.fd, self.port = ptyLink()
+        self.received: List[Tuple[float, str]] = []
+        self.bytesReceived = 0
+        # False leaves the station's writes in the pty, like a device that stopped reading
+        self.reading = True
+        self.__condition = threading.Condition()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__read, name=name, daemon=True)
+        self.__thread.start()
+
+    # end def
+
+    def __read(self):
+        buffer = bytearray()
+
+        while self.__running:
+            if not self.reading:
+                time.sleep(0.01)
+                continue
+            # end if
+
+            ready, _, _ = select.select([self.fd], [], [], 0.1)
+
+            if not ready:
+                continue
+            # end if
+
+            try:
+                chunk = os.read(self.fd, 65536)
+            except OSError:
+                break
+            # end try-except
+
+            now = time.perf_counter()
+            buffer += chunk
+            messages = []
+
+            while True:
+                end = buffer.find(TERMINATOR)
+
+                if end < 0:
+                    break
+                # end if
+
+                messages.append(buffer[:end].decode("utf-8", errors="replace"))
+                del buffer[: end + len(TERMINATOR)]
+            # end while
+
+            with self.__condition:
+                self.bytesReceived += len(chunk)
+                self.received.extend((now, message) for message in messages)
+                self.__condition.notify_all()
+            # end with
+
+            for message in messages:
+                self.onMessage(message)
+            # end for
+        # end while
+
+    # end def
+
+    def onMessage(self, message: str) -> None:
+        pass
+
+    # end def
+
+    def close(self) -> None:
+        self.__running = False
+        self.__thread.join(1)
+        os.close(self.fd)
+
+    # end def
+
+    def count(self) -> int:
+        with self.__condition:
+            return len(self.received)
+
+    # end def
+
+    def send(self, message: Union[str, bytes]) -> float:
+        """Writes the message as it is and returns when it was written."""
+        data = message.encode("ascii") if isinstance(message, str) else message
+        sent = time.perf_counter()
+        os.write(self.fd, data)
+
+        return sent
+
+    # end def
+
+    def waitFor(
+        self,
+        match: Union[str, Callable[[str], bool]],
+        since: int = 0,
+        timeout: float = 10,
+    ) -> Tuple[float, str, int]:
+        """
+        Waits for a message received after the first since messages.
+
+        Args:
+            match (Union[str, Callable[[str], bool]]): the expected message or a predicate.
+            since (int): messages already seen, e.g. count() before sending a command.
+            timeout (float): seconds to wait.
+
+        Returns:
+            Tuple[float, str, int]: when the message was received, the message and its index.
+        """
+        predicate = match if callable(match) else (lambda message: message == match)
+        deadline = time.monotonic() + timeout
+        index = since
+
+        with self.__condition:
+            while True:
+                while index < len(self.received):
+                    received, message = self.received[index]
+
+                    if predicate(message):
+                        return received, message, index
+                    # end if
+
+                    index += 1
+                # end while
+
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    raise TimeoutError(f"{match} was not received")
+                # end if
+
+                self.__condition.wait(remaining)
+            # end while
+
+    # end def
+
+
+# end class
+
+
+class fakeNextion(_peer):
+    def __init__(self) -> None:
+        """
+        Display peer. Like the HMI, it sends the command of the pages that start a test step
+        as soon as the station shows them.
+        """
+        self.page = 0
+        self.answering = True
+        super().__init__("fakeNextion")
+
+    # end def
+
+    def onMessage(self, message: str) -> None:
+        if message.startswith("page "):
+            self.page = int(message[5:])
+        # end if
+
+        if message == "page 4":
+            self.send("page4\r\n")
+        elif message == "page 5":
+            self.send("page5;waveId=2\r\n")
+        elif message == "get dp" and self.answering:
+            # numeric data return code, the link supervisor's probe
+            self.send(b"\x71" + self.page.to_bytes(4, "little") + TERMINATOR)
+        # end if
+
+    # end def
+
+
+# end class
+
+
+class fakePcb(_peer):
+    # board commands and the line each relay connects to the station's LINE output
+    __RELAYS = {"agitatorOn": 27, "FillOn": 17, "DispOff": 23}
+    __RELEASES = ["agitatorOff", "FillOff", "DispOn"]
+    __LINE = 22
+    __FLOATING_SWITCH = 21
+    __DISPENSE_LED = 24
+    __FILL_LED = 25
+
+    def __init__(self, gpio) -> None:
+        """
+        Board peer. Relay commands wire the fake GPIO's LINE output to the relay's input, buttons are
+        pressed by the benchmark and the floating switch is reported when the station drives it.
+
+        Args:
+            gpio: the fake RPi.GPIO module.
+        """
+        self.__gpio = gpio
+        super().__init__("fakePcb")
+
+        # the station only detects edges of its inputs, the switch output is free
+        gpio.add_event_detect(
+            self.__FLOATING_SWITCH, gpio.RISING, callback=self.__floatingSwitch
+        )
+
+    # end def
+
+    def __floatingSwitch(self, pin: int):
+        self.send("FloatingSwitchOn\r\n")
+
+    # end def
+
+    def onMessage(self, message: str) -> None:
+        if message.startswith("echo "):
+            self.send(message[5:] + "\r\n")
+        elif message in self.__RELAYS:
+            self.__gpio.connect(self.__LINE, self.__RELAYS[message])
+        elif message in self.__RELEASES:
+            self.__gpio.disconnectAll()
+        # end if
+
+    # end def
+
+    def pressDispense(self) -> float:
+        self.__gpio.simulateInput(self.__DISPENSE_LED, True)
+        return self.send("DispBtn On\r\n")
+
+    # end def
+
+    def pressFill(self) -> float:
+        self.__gpio.simulateInput(self.__FILL_LED, True)
+        return self.send("fillBtn On\r\n")
+
+    # end def
+
+    def seat(self, wires: List[Tuple[int, int]]) -> None:
+        """Wires every harness output to its input, like a device seated in a good harness."""
+        for output, input in wires:
+            self.__gpio.connect(output, input)
+        # end for
+
+    # end def
+
+    def release(self) -> None:
+        self.__gpio.simulateInput(self.__DISPENSE_LED, False)
+        self.__gpio.simulateInput(self.__FILL_LED, False)
+        self.__gpio.disconnectAll()
+
+    # end def
+
+
+# end class
@@ -0,0 +1,370 @@
+"""
+Fuzzes the path of the frames received from the display: the bytes are split by frameParser, the text
+frames are parsed by parseFrame and the events are dispatched through the handlerExecutor, with the
+display's commands and rules. The stream mixes:
+
+- valid frames, e.g. page2;waveId=2, with and without parameters.
+- malformed parameters: waveId empty, negative, out of range, not a number, repeated separators.
+- truncated frames, cut anywhere and followed by the next one.
+- random bytes, binary return codes and frames longer than the parser keeps.
+
+The stream is fed in chunks of random size, the way the reader gets it. Every handler checks the event
+and writes the waveform instruction, like the display does. The script fails if anything raises, in
+the parser or in a handler, and reports the events per second parsed and dispatched.
+
+    python3 benchmarks/protocol.py --frames 200000 --seed 1
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from libraries.eventLoop import getEventLoop, stopEventLoop
+from libraries.frameParser import frameParser, NEXTION_TERMINATORS, TEXT_FRAME
+from libraries.handlerExecutor import handlerExecutor, PREEMPT, SERIALIZED
+from libraries.loggerSetup import configure_logging, stop_logging
+from libraries.nextionCommands import commandBuilder
+from libraries.nextionProtocol import commandEvent, dispatcher, parseFrame
+from typing import Any, Dict, List
+
+# the commands of the display and how they run alongside the others
+COMMANDS = [
+    "page0",
+    "cancel",
+    "page1",
+    "page2",
+    "page3",
+    "page4",
+    "page5",
+    "page10",
+    "testCable",
+]
+RULES = {
+    "page2": SERIALIZED,
+    "page3": SERIALIZED,
+    "page4": SERIALIZED,
+    "page5": SERIALIZED,
+    "testCable": SERIALIZED,
+    "page0": PREEMPT,
+    "cancel": PREEMPT,
+}
+
+# waveId values the parser must turn into None instead of a component id
+BAD_WAVE_IDS = ["", "b2", "-1", "256", "2.5", "0x10", " ", "٣", "9" * 30]
+
+MAX_FRAME_SIZE = 1024
+
+
+def validFrame(rng: random.Random) -> bytes:
+    command = rng.choice(COMMANDS)
+
+    if rng.random() < 0.5:
+        command += f";waveId={rng.randrange(256)}"
+    # end if
+
+    return command.encode("ascii") + b"\r\n"
+
+
+# end def
+
+
+def malformedFrame(rng: random.Random) -> bytes:
+    command = rng.choice(COMMANDS + ["", "page", "PAGE2", "page2 "])
+    parts = [
+        f"waveId={rng.choice(BAD_WAVE_IDS)}",
+        "=",
+        "waveId",
+        "=2",
+        "",
+        f"{rng.choice(['WAVEID', 'waveid', ' waveId '])}={rng.randrange(300)}",
+    ]
+    rng.shuffle(parts)
+
+    return (command + ";" + ";".join(parts[: rng.randrange(1, 4)])).encode(
+        "utf-8"
+    ) + b"\r\n"
+
+
+# end def
+
+
+def randomBytes(rng: random.Random) -> bytes:
+    data = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 40)))
+
+    return data + rng.choice([b"", b"\r\n", b"\xff\xff\xff"])
+
+
+# end def
+
+
+def generateStream(frames: int, seed: int) -> bytes:
+    """Returns the bytes of the fuzzed frames, concatenated."""
+    rng = random.Random(seed)
+    stream = bytearray()
+
+    for _ in range(frames):
+        kind = rng.random()
+
+        if kind < 0.5:
+            stream += validFrame(rng)
+        elif kind < 0.7:
+            stream += malformedFrame(rng)
+        elif kind < 0.8:
+            # cut anywhere, even inside the terminator
+            frame = validFrame(rng)
+            stream += frame[: rng.randrange(len(frame))]
+        elif kind < 0.9:
+            stream += randomBytes(rng)
+        elif kind < 0.99:
+            # return codes, e.g. the numeric data of get dp
+            stream += bytes([rng.randrange(256) for _ in range(rng.randrange(5))])
+            stream += b"\xff\xff\xff"
+        else:
+            stream += b"x" * (MAX_FRAME_SIZE + rng.randrange(100))
+        # end if
+    # end for
+
+    return bytes(stream)
+
+
+# end def
+
+
+def chunks(stream: bytes, seed: int) -> List[bytes]:
+    rng = random.Random(seed)
+    result = []
+    start = 0
+
+    while start < len(stream):
+        end = start + rng.randrange(1, 256)
+        result.append(stream[start:end])
+        start = end
+    # end while
+
+    return result
+
+
+# end def
+
+
+def checkEvent(event: commandEvent) -> None:
+    # what the handlers rely on, the parser must not let anything else through
+    waveId = event.params.get("waveid")
+
+    if waveId is not None and not (isinstance(waveId, int) and 0 <= waveId <= 255):
+        raise AssertionError(f"bad waveid {waveId!r} from {event.raw!r}")
+    # end if
+
+
+# end def
+
+
+def handle(event: commandEvent) -> None:
+    checkEvent(event)
+
+
+# end def
+
+
+async def handleWithAnimation(event: commandEvent) -> bytes:
+    checkEvent(event)
+    waveId = event.params.get("waveid")
+
+    if waveId is None:
+        return b""
+    # end if
+
+    # the loading animation, a builder per call since they are not thread safe
+    return commandBuilder().waveform(waveId, 0, 150).frame()
+
+
+# end def
+
+
+def parseAll(pieces: List[bytes]) -> Dict[str, Any]:
+    """Splits and parses every frame, the events are returned with the counts."""
+    parser = frameParser(NEXTION_TERMINATORS, MAX_FRAME_SIZE)
+    events = []
+    returnCodes = 0
+
+    for chunk in pieces:
+        for kind, frame in parser.feed(chunk):
+            if kind == TEXT_FRAME:
+                # what the serial reader hands to the display
+                event = parseFrame(frame.decode("ascii") + "\r\n")
+                checkEvent(event)
+                events.append(event)
+            else:
+                returnCodes += 1
+            # end if
+        # end for
+    # end for
+
+    return {
+        "events": events,
+        "returnCodes": returnCodes,
+        "discardedBytes": parser.discardedBytes,
+    }
+
+
+# end def
+
+
+def dispatchAll(
+    events: List[commandEvent], workers: int, maxPending: int
+) -> Dict[str, Any]:
+    """
+    Submits every event like the display does and waits for the handlers. A rejected event is
+    submitted again once a handler has finished, the rejections are counted.
+    """
+    handlers = {command: handle for command in COMMANDS}
+
+    for command in RULES:
+        if RULES[command] == SERIALIZED:
+            handlers[command] = handleWithAnimation
+        # end if
+    # end for
+
+    commands = dispatcher(handlers)
+    executor = handlerExecutor(
+        getEventLoop(), RULES, workers, maxPending, "protocol fuzz"
+    )
+    futures = []
+    pending = set()
+    rejected = 0
+
+    try:
+        for event in events:
+            if event.command not in commands:
+                commands.dispatch(event)
+                continue
+            # end if
+
+            future = executor.submit(event.command, commands.dispatch, event)
+
+            while future is None:
+                rejected += 1
+                _, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                future = executor.submit(event.command, commands.dispatch, event)
+            # end while
+
+            futures.append(future)
+            pending.add(future)
+        # end for
+
+        concurrent.futures.wait(futures)
+    finally:
+        executor.shutdown()
+    # end try-finally
+
+    failures = [
+        future.exception()
+        for future in futures
+        if not future.cancelled() and future.exception() is not None
+    ]
+
+    return {
+        "dispatched": len(futures),
+        "preempted": sum(1 for future in futures if future.cancelled()),
+        "rejected": rejected,
+        "unknown": sum(commands.unknownCommands.values()),
+        "failures": failures,
+    }
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--frames", type=int, default=200000, help="frames generated")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--workers", type=int, default=4, help="threads of the handler executor"
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=16,
+        help="handlers pending before the executor rejects the events",
+    )
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    configure_logging({"level": args.log_level})
+    stream = generateStream(args.frames, args.seed)
+    pieces = chunks(stream, args.seed)
+
+    try:
+        start = time.perf_counter()
+        parsed = parseAll(pieces)
+        parseSeconds = time.perf_counter() - start
+        events = parsed.pop("events")
+
+        start = time.perf_counter()
+        dispatched = dispatchAll(events, args.workers, args.max_pending)
+        dispatchSeconds = time.perf_counter() - start
+    finally:
+        stopEventLoop()
+        stop_logging()
+    # end try-finally
+
+    failures = dispatched.pop("failures")
+    results = {
+        "bytes": len(stream),
+        "chunks": len(pieces),
+        "events": len(events),
+        "malformed": sum(1 for event in events if event.args),
+        **parsed,
+        **dispatched,
+        "failures": [repr(failure) for failure in failures],
+        "parsedPerSecond": len(events) / parseSeconds,
+        "dispatchedPerSecond": len(events) / dispatchSeconds,
+    }
+
+    print(
+        f"{results['bytes']} bytes in {results['chunks']} chunks: {results['events']} events "
+        f"({results['malformed']} with malformed parameters), {results['returnCodes']} return codes, "
+        f"{results['discardedBytes']} bytes discarded"
+    )
+    print(f"  parsed     {results['parsedPerSecond']:10.0f} events/s")
+    print(
+        f"  dispatched {results['dispatchedPerSecond']:10.0f} events/s "
+        f"({results['dispatched']} handlers, {results['preempted']} preempted, "
+        f"{results['unknown']} unknown commands, {results['rejected']} rejected and resubmitted)"
+    )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+    if failures:
+        for failure in failures[:10]:
+            print(f"  handler failed: {failure!r}")
+        # end for
+
+        raise SystemExit(f"{len(failures)} handlers failed")
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,311 @@
+"""
+Replays serial captures, the ring files written by the capture setting of displayConfig and pcbConfig,
+through pseudo terminals. The bytes the device sent are written to the station at the captured times
+divided by --speed, the bytes the station writes are read and counted. Several captures, e.g. the
+display's and the board's, are replayed on the same clock.
+
+    python3 benchmarks/replay.py captures/display.scap captures/board.scap \\
+        --link /tmp/nextion --link /tmp/pcb --speed 10
+
+The station is started with its ports pointing at the links. --list prints the records instead.
+"""
+
+import argparse
+import json
+import os
+import select
+import sys
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from benchmarks.peers import ptyLink
+from libraries.trafficCapture import readCapture, trafficCapture, IN, OUT
+from typing import Any, Dict, List
+
+
+class replayedLink:
+    def __init__(self, path: str, link: str = None, output: str = None) -> None:
+        self.name, self.overwritten, self.records = readCapture(path)
+        self.fd, self.port = ptyLink()
+        self.link = link
+        self.bytesWritten = 0
+        self.bytesDropped = 0
+        self.bytesRead = 0
+        self.stalled = False
+        # a station that stopped reading must not stop the replay of the other links
+        os.set_blocking(self.fd, False)
+        self.closed = False
+        # the station's writes are captured again, e.g. to compare them with the recorded ones
+        self.output = trafficCapture(output, name=self.name) if output else None
+
+        if link:
+            if os.path.lexists(link):
+                os.remove(link)
+            # end if
+
+            os.symlink(self.port, link)
+        # end if
+
+        self.__reader = threading.Thread(target=self.__read, daemon=True)
+        self.__reader.start()
+
+    # end def
+
+    def __read(self):
+        while not self.closed:
+            ready, _, _ = select.select([self.fd], [], [], 0.1)
+
+            if not ready:
+                continue
+            # end if
+
+            try:
+                chunk = os.read(self.fd, 65536)
+            except OSError:
+                # the station closed the port
+                time.sleep(0.01)
+                continue
+            # end try-except
+
+            self.bytesRead += len(chunk)
+
+            if self.output:
+                self.output.append(OUT, chunk)
+            # end if
+        # end while
+
+    # end def
+
+    def write(self, data: bytes, timeout: float = 1) -> None:
+        view = memoryview(data)
+
+        while view:
+            try:
+                written = os.write(self.fd, view)
+                view = view[written:]
+                self.bytesWritten += written
+                self.stalled = False
+            except BlockingIOError:
+                # the station does not read the port, what does not fit is dropped. Once it
+                # stalled the link is not waited for until it reads again
+                waiting = 0 if self.stalled else timeout
+
+                if not select.select([], [self.fd], [], waiting)[1]:
+                    self.bytesDropped += len(view)
+                    self.stalled = True
+                    return
+                # end if
+            # end try-except
+        # end while
+
+    # end def
+
+    def close(self) -> None:
+        self.closed = True
+        self.__reader.join(1)
+
+        if self.output:
+            self.output.close()
+        # end if
+
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        # end if
+
+        os.close(self.fd)
+
+    # end def
+
+
+# end class
+
+
+def listRecords(path: str, width: int) -> None:
+    name, overwritten, records = readCapture(path)
+    print(f"{path}: {name}, {len(records)} records, {overwritten} overwritten")
+
+    if not records:
+        return
+    # end if
+
+    first = records[0].timestamp
+
+    for record in records:
+        arrow = "<-" if record.direction == IN else "->"
+        print(
+            f"  {record.timestamp - first:12.6f} {arrow} {len(record.data):5}  "
+            f"{record.data[:width]!r}{'...' if len(record.data) > width else ''}"
+        )
+    # end for
+
+
+# end def
+
+
+def replay(links: List[replayedLink], speed: float, maxGap: float) -> Dict[str, Any]:
+    """
+    Writes the records read from the devices to the station, following the captured times.
+
+    Args:
+        links (List[replayedLink]): the captures, replayed on the same clock.
+        speed (float): times faster than captured, 0 writes them as fast as possible.
+        maxGap (float): longest captured silence kept, in captured seconds.
+
+    Returns:
+        Dict[str, Any]: records and bytes written, seconds taken and the most a write was late.
+    """
+    events = sorted(
+        (record.timestamp, index, record.data)
+        for index, link in enumerate(links)
+        for record in link.records
+        if record.direction == IN
+    )
+
+    began = time.perf_counter()
+    lateness = 0.0
+    schedule = 0.0
+    previous = events[0][0] if events else 0
+
+    for timestamp, index, data in events:
+        # the silences of the capture are shortened to maxGap, e.g. the station idle overnight
+        schedule += min(timestamp - previous, maxGap)
+        previous = timestamp
+
+        if speed > 0:
+            delay = began + schedule / speed - time.perf_counter()
+
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lateness = max(lateness, -delay)
+            # end if
+        # end if
+
+        links[index].write(data)
+    # end for
+
+    return {
+        "records": len(events),
+        "bytes": sum(len(event[2]) for event in events),
+        "capturedSeconds": schedule,
+        "seconds": time.perf_counter() - began,
+        "maxLateSeconds": lateness,
+    }
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("captures", nargs="+", help="capture files")
+    parser.add_argument(
+        "--link",
+        action="append",
+        default=[],
+        help="symbolic link to the port of every capture, in the same order",
+    )
+    parser.add_argument(
+        "--speed", type=float, default=1, help="times real time, 0 for no waits"
+    )
+    parser.add_argument(
+        "--max-gap", type=float, default=5, help="longest silence kept, in seconds"
+    )
+    parser.add_argument(
+        "--delay", type=float, default=2, help="seconds given to the station to start"
+    )
+    parser.add_argument(
+        "--drain", type=float, default=1, help="seconds the station's answers are read"
+    )
+    parser.add_argument(
+        "--output",
+        action="append",
+        default=[],
+        help="capture where the station's writes are stored, one per capture",
+    )
+    parser.add_argument("--list", action="store_true", help="print the records")
+    parser.add_argument("--width", type=int, default=48, help="bytes printed by --list")
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    if args.list:
+        for path in args.captures:
+            listRecords(path, args.width)
+        # end for
+
+        return
+    # end if
+
+    links = [
+        replayedLink(
+            path,
+            args.link[index] if index < len(args.link) else None,
+            args.output[index] if index < len(args.output) else None,
+        )
+        for index, path in enumerate(args.captures)
+    ]
+
+    try:
+        for link in links:
+            print(
+                f"{link.name or 'capture'}: {len(link.records)} records "
+                f"({link.overwritten} overwritten) on {link.link or link.port}"
+            )
+        # end for
+
+        time.sleep(args.delay)
+        result = replay(links, args.speed, args.max_gap)
+        time.sleep(args.drain)
+
+        result["links"] = {
+            (link.name or link.port): {
+                "bytesWritten": link.bytesWritten,
+                "bytesDropped": link.bytesDropped,
+                "bytesRead": link.bytesRead,
+                "bytesCaptured": sum(
+                    len(record.data)
+                    for record in link.records
+                    if record.direction == OUT
+                ),
+            }
+            for link in links
+        }
+    finally:
+        for link in links:
+            link.close()
+        # end for
+    # end try-finally
+
+    print(
+        f"replayed {result['records']} records, {result['bytes']} bytes, "
+        f"{result['capturedSeconds']:.3f} captured seconds in {result['seconds']:.3f} s, "
+        f"at most {result['maxLateSeconds'] * 1000:.1f} ms late"
+    )
+
+    for name, value in result["links"].items():
+        print(
+            f"  {name}: {value['bytesWritten']} bytes written, {value['bytesDropped']} dropped, "
+            f"the station answered "
+            f"{value['bytesRead']} bytes ({value['bytesCaptured']} captured)"
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,497 @@
+"""
+Drives the station through full test cycles without a Raspberry pi, a Nextion or a board and
+reports throughput, latency percentiles, idle CPU per thread and cycle time.
+
+    python3 benchmarks/run.py --cycles 10 --backend asyncio --json results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+# the station's packages and the fake RPi.GPIO
+sys.path.insert(0, os.path.join(ROOT, "fakes"))
+sys.path.insert(0, ROOT)
+
+import RPi.GPIO as fakeGpio
+import services.gpio as gpio
+from benchmarks.peers import fakeNextion, fakePcb
+from libraries.metrics import getRegistry, DURATION_BUCKETS
+from libraries.resultsStore import resultsStore
+from services.board import board
+from services.display import display
+from services.openOCD import openOCD
+from typing import Any, Dict, List
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Nearest rank percentiles of the values, in milliseconds."""
+    if len(values) == 0:
+        return {}
+    # end if
+
+    ordered = sorted(values)
+
+    def rank(percentile):
+        index = max(0, int(round(percentile / 100 * len(ordered) + 0.5)) - 1)
+        return ordered[min(index, len(ordered) - 1)] * 1000
+
+    # end def
+
+    return {
+        "count": len(ordered),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": ordered[-1] * 1000,
+    }
+
+
+# end def
+
+
+def threadTimes() -> Dict[int, float]:
+    """CPU seconds used by every thread of the process, by native thread id."""
+    ticks = os.sysconf("SC_CLK_TCK")
+    times = {}
+
+    for task in os.listdir("/proc/self/task"):
+        try:
+            with open(f"/proc/self/task/{task}/stat") as file:
+                # the thread name may contain spaces, the fields start after it
+                fields = file.read().rsplit(")", 1)[1].split()
+            # end with
+        except OSError:
+            continue
+        # end try-except
+
+        times[int(task)] = (int(fields[11]) + int(fields[12])) / ticks
+    # end for
+
+    return times
+
+
+# end def
+
+
+def threadName(tid: int) -> str:
+    for thread in threading.enumerate():
+        if thread.native_id == tid:
+            return thread.name
+        # end if
+    # end for
+
+    try:
+        with open(f"/proc/self/task/{tid}/comm") as file:
+            return file.read().strip()
+        # end with
+    except OSError:
+        return str(tid)
+    # end try-except
+
+
+# end def
+
+
+def createStation(args, nextion: fakeNextion, pcb: fakePcb, results=None):
+    with open(os.path.join(ROOT, "appsettings.json")) as file:
+        config = json.load(file)
+    # end with
+
+    # openocd looks for its cfg files from the working directory
+    workDirectory = tempfile.mkdtemp(prefix="benchmark")
+    os.makedirs(os.path.join(workDirectory, "Resources", "openocd"))
+
+    for name in ["TestConfiguration.cfg", "firmwareConfig.cfg"]:
+        open(os.path.join(workDirectory, "Resources", "openocd", name), "w").close()
+    # end for
+
+    if args.capture:
+        # the work directory is the current one from here on
+        captureDirectory = os.path.abspath(args.capture)
+        config["displayConfig"]["capture"] = {
+            "path": os.path.join(captureDirectory, "display.scap")
+        }
+        config["pcbConfig"]["capture"] = {
+            "path": os.path.join(captureDirectory, "board.scap")
+        }
+    # end if
+
+    os.chdir(workDirectory)
+
+    config["displayConfig"].update(
+        port=nextion.port, backend=args.backend, pipelined=not args.sequential
+    )
+    config["pcbConfig"].update(port=pcb.port, backend=args.backend)
+    config["gpio"]["backend"] = "rpi"
+    config["openocd"] = {
+        "path": "Resources/openocd/",
+        "testProgram": "TestConfiguration.cfg",
+        "firmware": "firmwareConfig.cfg",
+        "command": [
+            sys.executable,
+            os.path.join(BENCHMARKS, "openocdShim.py"),
+            "--delay",
+            str(args.flash_time),
+            "--failure-rate",
+            str(args.flash_failure_rate),
+        ],
+    }
+
+    # same services and order as main.py
+    gpioService = gpio.GPIO(config["gpio"])
+    openOCDService = openOCD(config["openocd"])
+    boardService = board(openOCDService, config["pcbConfig"])
+
+    return display(
+        config["displayConfig"],
+        config["errorFont"],
+        boardService,
+        gpioService,
+        results,
+    )
+
+
+# end def
+
+
+def handlerRuns(command: str) -> int:
+    return (
+        getRegistry()
+        .histogram(
+            "handler_duration_seconds",
+            buckets=DURATION_BUCKETS,
+            executor="display handlers",
+            command=command,
+        )
+        .get()["count"]
+    )
+
+
+# end def
+
+
+def runCycle(
+    nextion: fakeNextion,
+    pcb: fakePcb,
+    latencies,
+    timeout: float,
+    harness: bool,
+    operatorTime: float = 0,
+):
+    start = nextion.count()
+    page5Runs = handlerRuns("page5")
+
+    if harness:
+        # the operator takes operatorTime to seat the device and again to move on to page 2
+        time.sleep(operatorTime)
+        pcb.seat([(output.value, input.value) for output, input in gpio.harnessWires()])
+        sent = nextion.send("testCable\r\n")
+        received, message, _ = nextion.waitFor(
+            lambda message: message in ["page 8", "page 9"], start, timeout
+        )
+        latencies["testCable -> result"].append(received - sent)
+
+        if message == "page 9":
+            raise RuntimeError("the harness check failed")
+        # end if
+
+        time.sleep(operatorTime)
+        start = nextion.count()
+    # end if
+
+    sent = nextion.send("page2;waveId=2\r\n")
+    received, _, index = nextion.waitFor("page 2", start)
+    latencies["page2 -> page 2"].append(received - sent)
+
+    # the test program is flashed, page 9 means every attempt failed
+    _, message, index = nextion.waitFor(
+        lambda message: message in ["page 3", "page 9"], index, timeout
+    )
+    passed = message == "page 3"
+
+    if passed:
+        pressed = pcb.pressDispense()
+        received, _, index = nextion.waitFor("page 4", index, timeout)
+        latencies["dispense button -> page 4"].append(received - pressed)
+
+        pressed = pcb.pressFill()
+        received, _, index = nextion.waitFor("page 5", index, timeout)
+        latencies["fill button -> page 5"].append(received - pressed)
+
+        # the cycle ends when the page 5 handler finishes, once the firmware is flashed. Its last
+        # page is 8, the error page 6 when the firmware was not flashed, or 9
+        deadline = time.monotonic() + timeout
+
+        while handlerRuns("page5") == page5Runs:
+            if time.monotonic() > deadline:
+                raise TimeoutError("page5 did not finish")
+            # end if
+
+            time.sleep(0.005)
+        # end while
+
+        time.sleep(0.05)
+        pages = [message for _, message in nextion.received[start:]]
+        passed = "page 8" in pages and not ("page 6" in pages or "page 9" in pages)
+    # end if
+
+    finished = nextion.received[-1][0]
+    pcb.release()
+
+    index = nextion.count()
+    sent = nextion.send("page0\r\n")
+    received, _, _ = nextion.waitFor("page 0", index)
+    latencies["page0 -> page 0"].append(received - sent)
+
+    return finished, passed
+
+
+# end def
+
+
+def outputThroughput(station: display, nextion: fakeNextion, messages: int):
+    start = nextion.count()
+    bytesBefore = nextion.bytesReceived
+    began = time.perf_counter()
+
+    # control commands are neither coalesced nor dropped
+    for i in range(messages):
+        station.sendMessage(f"ref b{i % 10}")
+    # end for
+
+    last = start
+
+    for _ in range(messages):
+        _, _, last = nextion.waitFor(lambda m: m.startswith("ref "), last, 30)
+        last += 1
+    # end for
+
+    elapsed = nextion.received[last - 1][0] - began
+
+    return {
+        "messages": messages,
+        "seconds": elapsed,
+        "messagesPerSecond": messages / elapsed,
+        "bytesPerSecond": (nextion.bytesReceived - bytesBefore) / elapsed,
+    }
+
+
+# end def
+
+
+def inputThroughput(nextion: fakeNextion, frames: int):
+    counter = getRegistry().counter(
+        "serial_frames_total", device="screen serial communication", direction="in"
+    )
+    before = counter.get()
+
+    # unknown commands are parsed, counted and discarded by the station
+    began = nextion.send(b"benchmark\r\n" * frames)
+
+    while counter.get() - before < frames:
+        if time.perf_counter() - began > 30:
+            raise TimeoutError("the station did not read every frame")
+        # end if
+
+        time.sleep(0.001)
+    # end while
+
+    elapsed = time.perf_counter() - began
+
+    return {"frames": frames, "seconds": elapsed, "framesPerSecond": frames / elapsed}
+
+
+# end def
+
+
+def idleCpu(seconds: float) -> Dict[str, float]:
+    """Percentage of a core used by every thread while the station shows page 0."""
+    before = threadTimes()
+    time.sleep(seconds)
+    after = threadTimes()
+
+    usage = {}
+
+    for tid, cpu in after.items():
+        name = threadName(tid)
+        usage[name] = usage.get(name, 0) + (cpu - before.get(tid, 0)) / seconds * 100
+    # end for
+
+    return dict(sorted(usage.items(), key=lambda item: -item[1]))
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--backend", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument(
+        "--flash-time", type=float, default=0.5, help="seconds per openocd run"
+    )
+    parser.add_argument("--flash-failure-rate", type=float, default=0.0)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds measured idle")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", help="file where the results are written")
+    parser.add_argument(
+        "--results", help="results database where the runs are recorded"
+    )
+    parser.add_argument(
+        "--harness",
+        action="store_true",
+        help="check the harness at the beginning of every cycle",
+    )
+    parser.add_argument(
+        "--operator-time",
+        type=float,
+        default=0.0,
+        help="seconds the operator takes to seat a device and to go to page 2, with --harness",
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="turn off the pipelining, nothing is flashed ahead of time or in the background",
+    )
+    parser.add_argument(
+        "--capture",
+        help="directory where the traffic of both links is captured, see replay.py",
+    )
+    args = parser.parse_args()
+
+    store = resultsStore(os.path.abspath(args.results)) if args.results else None
+
+    nextion = fakeNextion()
+    pcb = fakePcb(fakeGpio)
+
+    began = time.perf_counter()
+    station = createStation(args, nextion, pcb, store)
+
+    latencies: Dict[str, List[float]] = {
+        "page2 -> page 2": [],
+        "dispense button -> page 4": [],
+        "fill button -> page 5": [],
+        "page0 -> page 0": [],
+    }
+
+    if args.harness:
+        latencies["testCable -> result"] = []
+    # end if
+
+    cycles = []
+
+    try:
+        nextion.waitFor("page 0")
+        startup = time.perf_counter() - began
+
+        firstStart = time.perf_counter()
+
+        for _ in range(args.cycles):
+            cycleStart = time.perf_counter()
+            finished, passed = runCycle(
+                nextion,
+                pcb,
+                latencies,
+                args.timeout,
+                args.harness,
+                args.operator_time,
+            )
+            cycles.append({"seconds": finished - cycleStart, "passed": passed})
+        # end for
+
+        # a failed cycle takes the failure path, its time is not the one of a good device
+        passedCycles = [cycle["seconds"] for cycle in cycles if cycle["passed"]]
+        results: Dict[str, Any] = {
+            "backend": args.backend,
+            "pipelined": not args.sequential,
+            "harness": args.harness,
+            "startupSeconds": startup,
+            # the station is done with a device once its result is shown, the firmware flashed
+            "secondsPerDevice": (
+                (finished - firstStart) / len(cycles)
+                if len(passedCycles) == len(cycles)
+                else None
+            ),
+            "cycles": cycles,
+            "cycleTime": percentiles(passedCycles),
+            "latency": {
+                name: percentiles(values) for name, values in latencies.items()
+            },
+            "outputThroughput": outputThroughput(station, nextion, args.messages),
+            "inputThroughput": inputThroughput(nextion, args.messages),
+            "idleCpuPercent": idleCpu(args.idle),
+        }
+    finally:
+        station.dispose()
+        nextion.close()
+        pcb.close()
+
+        if store is not None:
+            store.close()
+        # end if
+    # end try-finally
+
+    results["metrics"] = getRegistry().snapshot()
+
+    print(
+        f"backend: {results['backend']}, pipelined: {results['pipelined']}, "
+        f"startup: {startup * 1000:.1f} ms"
+    )
+    passed = sum(cycle["passed"] for cycle in cycles)
+
+    if results["secondsPerDevice"] is not None:
+        print(f"seconds per device: {results['secondsPerDevice']:.3f} s")
+    else:
+        print("seconds per device: not measured, some cycles failed")
+    # end if
+
+    if passed:
+        print(
+            f"cycles: {len(cycles)}, passed: {passed}, "
+            f"cycle time of the passed ones p50 {results['cycleTime']['p50']:.0f} ms, "
+            f"max {results['cycleTime']['max']:.0f} ms"
+        )
+    else:
+        print(f"cycles: {len(cycles)}, passed: 0")
+    # end if
+
+    for name, value in results["latency"].items():
+        print(
+            f"  {name:28} p50 {value['p50']:8.2f} ms  p95 {value['p95']:8.2f} ms  "
+            f"p99 {value['p99']:8.2f} ms  max {value['max']:8.2f} ms"
+        )
+    # end for
+
+    output = results["outputThroughput"]
+    print(
+        f"output: {output['messagesPerSecond']:.0f} messages/s, "
+        f"{output['bytesPerSecond']:.0f} bytes/s"
+    )
+    print(f"input: {results['inputThroughput']['framesPerSecond']:.0f} frames/s")
+    print("idle CPU per thread:")
+
+    for name, percent in results["idleCpuPercent"].items():
+        print(f"  {name:32} {percent:6.2f} %")
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
@@ -0,0 +1,146 @@
+"""
+Starts main.py the way the station is started and measures the time until the display receives
+the first page 0. It exits with 1 when the median of the runs is above --max-seconds, so it can
+guard the startup time.
+
+    python3 benchmarks/startup.py --runs 5 --max-seconds 1.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from benchmarks.peers import fakeNextion, ptyLink
+
+
+def createWorkDirectory(nextionPort: str, pcbPort: str) -> str:
+    """Working directory with the openocd cfg files and a config that uses the given ports."""
+    with open(os.path.join(ROOT, "appsettings.json")) as file:
+        config = json.load(file)
+    # end with
+
+    workDirectory = tempfile.mkdtemp(prefix="startup")
+    os.makedirs(os.path.join(workDirectory, "Resources", "openocd"))
+
+    for name in ["TestConfiguration.cfg", "firmwareConfig.cfg"]:
+        open(os.path.join(workDirectory, "Resources", "openocd", name), "w").close()
+    # end for
+
+    config["displayConfig"]["port"] = nextionPort
+    config["pcbConfig"]["port"] = pcbPort
+    config["gpio"]["backend"] = "rpi"
+    config["openocd"] = {
+        "path": "Resources/openocd/",
+        "testProgram": "TestConfiguration.cfg",
+        "firmware": "firmwareConfig.cfg",
+        "command": [sys.executable, os.path.join(BENCHMARKS, "openocdShim.py")],
+    }
+    # nothing is served nor recorded, only the startup is measured
+    config["metrics"] = {"address": ""}
+    config.pop("results", None)
+
+    with open(os.path.join(workDirectory, "appsettings.json"), "w") as file:
+        json.dump(config, file)
+    # end with
+
+    return workDirectory
+
+
+# end def
+
+
+def measureStartup(timeout: float, profile: bool) -> float:
+    """Seconds from starting main.py until the display receives page 0."""
+    nextion = fakeNextion()
+    pcbFd, pcbPort = ptyLink()
+    workDirectory = createWorkDirectory(nextion.port, pcbPort)
+
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [os.path.join(ROOT, "fakes"), ROOT, environment.get("PYTHONPATH", "")]
+    )
+    command = [sys.executable, os.path.join(ROOT, "main.py")]
+
+    if profile:
+        command.append("--profile-startup")
+    # end if
+
+    began = time.perf_counter()
+    station = subprocess.Popen(
+        command,
+        cwd=workDirectory,
+        env=environment,
+        stdin=subprocess.PIPE,
+        text=True,
+    )
+
+    try:
+        received, _, _ = nextion.waitFor("page 0", timeout=timeout)
+
+        if profile:
+            # the report is logged a second after the display is created
+            time.sleep(1.5)
+        # end if
+    finally:
+        try:
+            station.communicate("quit\n", timeout=10)
+        except subprocess.TimeoutExpired:
+            station.kill()
+            station.wait()
+        # end try-except
+
+        nextion.close()
+        os.close(pcbFd)
+    # end try-finally
+
+    return received - began
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--profile", action="store_true", help="start main.py with --profile-startup"
+    )
+    args = parser.parse_args()
+
+    times = []
+
+    for run in range(args.runs):
+        seconds = measureStartup(args.timeout, args.profile)
+        times.append(seconds)
+        print(f"run {run + 1}: first page 0 after {seconds * 1000:.1f} ms")
+    # end for
+
+    median = statistics.median(times)
+    print(
+        f"median {median * 1000:.1f} ms, max {max(times) * 1000:.1f} ms, "
+        f"limit {args.max_seconds * 1000:.0f} ms"
+    )
+
+    if median > args.max_seconds:
+        print("startup is slower than the limit")
+        sys.exit(1)
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
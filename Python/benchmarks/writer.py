@@ -0,0 +1,194 @@
+"""
+Compares the writing thread of serialDevice with the one it replaced, both writing to a fakeNextion
+through a pty:
+
+- control: the old loop, which checks the queue size over and over while nothing is queued, then gets
+  one message at a time and writes it with its own write.
+- current: serialDevice, whose writing thread sleeps in the outbox until messages are queued and writes
+  everything queued meanwhile at once.
+
+For both it reports the percentage of a core used by the writing thread while nothing is sent, and the
+messages per second until the peer has read --messages ref commands.
+
+    python3 benchmarks/writer.py --messages 20000 --idle 2
+"""
+
+import argparse
+import json
+import os
+import serial
+import sys
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+sys.path.insert(0, ROOT)
+
+from benchmarks.peers import fakeNextion
+from benchmarks.run import threadTimes
+from libraries.cancellationToken import cancellationToken
+from libraries.loggerSetup import configure_logging, stop_logging
+from libraries.serialDevice import serialDevice
+from queue import Queue
+from typing import Callable, Dict
+
+BAUDRATE = 115200
+
+
+class controlWriter:
+    def __init__(self, port: str) -> None:
+        """The loop of serialDevice's writing thread before the outbox, errors are printed."""
+        self.__outputMessages = Queue(maxsize=100)
+        self.__serial = serial.Serial(port, BAUDRATE, timeout=0)
+        self.__token = cancellationToken()
+        self.thread = threading.Thread(
+            target=self.__write,
+            args=[self.__serial, self.__token, b"\xff\xff\xff"],
+            name="control writer",
+        )
+        self.thread.start()
+
+    # end def
+
+    def __write(self, serial, token, termination):
+        while not token.cancelled:
+            try:
+                # if there are not queued messages will remain in here
+                if self.__outputMessages.qsize() == 0:
+                    continue
+                # end if
+
+                userMessage = self.__outputMessages.get()
+                encodedMessage = userMessage.encode("utf-8") + termination
+                serial.write(encodedMessage)
+            except Exception as e:
+                print(f"writting error: {e}")
+            # end try-catch
+        # end while
+
+    # end def
+
+    def sendMessage(self, message: str) -> None:
+        self.__outputMessages.put(message)
+
+    # end def
+
+    def closeConnection(self) -> None:
+        self.__token.cancel()
+        self.thread.join(5)
+        self.__serial.close()
+
+    # end def
+
+
+# end class
+
+
+def writingThread(name: Callable[[str], bool]) -> int:
+    for thread in threading.enumerate():
+        if name(thread.name):
+            return thread.native_id
+        # end if
+    # end for
+
+    raise SystemExit("the writing thread was not found")
+
+
+# end def
+
+
+def measure(device, tid: int, nextion: fakeNextion, args) -> Dict[str, float]:
+    before = threadTimes()
+    time.sleep(args.idle)
+    idle = (threadTimes()[tid] - before[tid]) / args.idle * 100
+
+    start = nextion.count()
+    began = time.perf_counter()
+
+    for i in range(args.messages):
+        device.sendMessage(f"ref b{i % 10}")
+    # end for
+
+    received, _, _ = nextion.waitFor(
+        lambda message: True, start + args.messages - 1, 60
+    )
+    elapsed = received - began
+
+    return {
+        "idleCpuPercent": idle,
+        "messages": args.messages,
+        "seconds": elapsed,
+        "messagesPerSecond": args.messages / elapsed,
+    }
+
+
+# end def
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument(
+        "--idle", type=float, default=2, help="seconds measured with nothing sent"
+    )
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--json", help="file where the results are written")
+    args = parser.parse_args()
+
+    configure_logging({"level": args.log_level})
+    results = {}
+
+    try:
+        nextion = fakeNextion()
+        control = controlWriter(nextion.port)
+
+        try:
+            results["control"] = measure(
+                control, control.thread.native_id, nextion, args
+            )
+        finally:
+            control.closeConnection()
+            nextion.close()
+        # end try-finally
+
+        nextion = fakeNextion()
+        current = serialDevice(nextion.port, BAUDRATE, False, loggerName="writer")
+
+        try:
+            tid = writingThread(lambda name: name.endswith("(__write)"))
+            results["current"] = measure(current, tid, nextion, args)
+        finally:
+            current.closeConnection()
+            nextion.close()
+        # end try-finally
+    finally:
+        stop_logging()
+    # end try-finally
+
+    print(
+        f"{args.messages} ref commands through a pty, idle CPU measured for {args.idle:.0f} s"
+    )
+
+    for name, value in results.items():
+        print(
+            f"  {name:8} idle {value['idleCpuPercent']:6.2f} % of a core  "
+            f"{value['messagesPerSecond']:9.0f} messages/s"
+        )
+    # end for
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+        # end with
+    # end if
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
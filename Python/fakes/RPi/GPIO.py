@@ -0,0 +1,263 @@
+"""Simulated RPi.GPIO for running and testing the station off-device."""
+
+import threading
+from typing import Callable, Dict, List, Union
+
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+_lock = threading.RLock()
+_mode = None
+_directions: Dict[int, int] = {}
+_levels: Dict[int, int] = {}
+_callbacks: Dict[int, List[Callable[[int], None]]] = {}
+_edges: Dict[int, int] = {}
+_detected: Dict[int, bool] = {}
+_wiring: Dict[int, List[int]] = {}
+
+
+def _pins(channel: Union[int, List[int], tuple]) -> List[int]:
+    return list(channel) if isinstance(channel, (list, tuple)) else [channel]
+
+
+# end def
+
+
+def _change(pin: int, level: int) -> None:
+    with _lock:
+        previous = _levels.get(pin, LOW)
+        _levels[pin] = level
+
+        edge = _edges.get(pin)
+        fired = previous != level and (
+            edge == BOTH
+            or (edge == RISING and level == HIGH)
+            or (edge == FALLING and level == LOW)
+        )
+
+        if fired:
+            _detected[pin] = True
+        # end if
+
+        callbacks = list(_callbacks.get(pin, [])) if fired else []
+    # end with
+
+    for callback in callbacks:
+        callback(pin)
+    # end for
+
+
+# end def
+
+
+def _follow(inputs: List[int]) -> None:
+    # a wired input is high while any output connected to it is high
+    for inputPin in inputs:
+        with _lock:
+            driven = any(
+                _levels.get(source, LOW) == HIGH
+                for source, targets in _wiring.items()
+                if inputPin in targets
+            )
+        # end with
+
+        _change(inputPin, HIGH if driven else LOW)
+    # end for
+
+
+# end def
+
+
+def setmode(mode: int) -> None:
+    global _mode
+    _mode = mode
+
+
+# end def
+
+
+def getmode() -> Union[int, None]:
+    return _mode
+
+
+# end def
+
+
+def setwarnings(flag: bool) -> None:
+    pass
+
+
+# end def
+
+
+def setup(channel, direction: int, pull_up_down: int = PUD_OFF, initial: int = LOW):
+    if _mode is None:
+        raise RuntimeError("Please set pin numbering mode using GPIO.setmode")
+    # end if
+
+    for pin in _pins(channel):
+        with _lock:
+            _directions[pin] = direction
+        # end with
+
+        if direction == OUT:
+            output(pin, initial)
+        else:
+            _change(pin, HIGH if pull_up_down == PUD_UP else LOW)
+        # end if
+    # end for
+
+
+# end def
+
+
+def input(channel: int) -> int:
+    with _lock:
+        if channel not in _directions:
+            raise RuntimeError("You must setup() the GPIO channel first")
+        # end if
+
+        return _levels.get(channel, LOW)
+
+
+# end def
+
+
+def output(channel, state) -> None:
+    pins = _pins(channel)
+    states = _pins(state) if isinstance(state, (list, tuple)) else [state] * len(pins)
+
+    for pin, level in zip(pins, states):
+        with _lock:
+            if _directions.get(pin) != OUT:
+                raise RuntimeError("The GPIO channel has not been set up as an OUTPUT")
+            # end if
+
+            wired = list(_wiring.get(pin, []))
+        # end with
+
+        level = HIGH if level else LOW
+        _change(pin, level)
+        _follow(wired)
+    # end for
+
+
+# end def
+
+
+def add_event_detect(
+    channel: int, edge: int, callback: Callable[[int], None] = None, bouncetime=None
+) -> None:
+    with _lock:
+        if channel in _edges:
+            raise RuntimeError(
+                "Conflicting edge detection already enabled for this GPIO channel"
+            )
+        # end if
+
+        _edges[channel] = edge
+        _callbacks[channel] = [callback] if callback else []
+        _detected[channel] = False
+
+
+# end def
+
+
+def add_event_callback(channel: int, callback: Callable[[int], None]) -> None:
+    with _lock:
+        _callbacks.setdefault(channel, []).append(callback)
+
+
+# end def
+
+
+def remove_event_detect(channel: int) -> None:
+    with _lock:
+        _edges.pop(channel, None)
+        _callbacks.pop(channel, None)
+        _detected.pop(channel, None)
+
+
+# end def
+
+
+def event_detected(channel: int) -> bool:
+    with _lock:
+        detected = _detected.get(channel, False)
+        _detected[channel] = False
+
+        return detected
+
+
+# end def
+
+
+def cleanup(channel=None) -> None:
+    global _mode
+
+    with _lock:
+        pins = _pins(channel) if channel is not None else list(_directions.keys())
+
+        for pin in pins:
+            _directions.pop(pin, None)
+            _levels.pop(pin, None)
+            _edges.pop(pin, None)
+            _callbacks.pop(pin, None)
+            _detected.pop(pin, None)
+        # end for
+
+        if channel is None:
+            _mode = None
+        # end if
+
+
+# end def
+
+
+# simulation helpers, they do not exist in RPi.GPIO
+
+
+def simulateInput(pin: int, level: Union[int, bool]) -> None:
+    """Changes the level of an input pin, calling its edge callbacks."""
+    _change(pin, HIGH if level else LOW)
+
+
+# end def
+
+
+def connect(output: int, inputs: Union[int, List[int]]) -> None:
+    """
+    Wires an output pin to input pins so that they follow its level, right away like a relay closing.
+    Inputs wired to several outputs are high while any of them is high.
+    """
+    with _lock:
+        _wiring[output] = _pins(inputs)
+    # end with
+
+    _follow(_pins(inputs))
+
+
+# end def
+
+
+def disconnectAll() -> None:
+    """Removes every wire, the inputs that were wired go low."""
+    with _lock:
+        wired = [pin for targets in _wiring.values() for pin in targets]
+        _wiring.clear()
+    # end with
+
+    _follow(wired)
+
+
+# end def
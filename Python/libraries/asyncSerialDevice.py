@@ -0,0 +1,628 @@
+import asyncio
+import inspect
+import os
+import serial
+from libraries.eventLoop import getEventLoop, runOnLoop
+from libraries.frameParser import frameParser, PCB_TERMINATORS, TEXT_FRAME
+from libraries.linkSupervisor import backoff, keptLanes, RECONNECT_DEFAULTS
+from libraries.loggerSetup import setup_logger
+from libraries.metrics import getRegistry
+from libraries.nextionCommands import encodeInto
+from libraries.outbox import outbox, BLOCK, CONTROL_LANE
+from libraries.scheduler import FIXED_DELAY, FIXED_RATE
+from libraries.trafficCapture import trafficCapture, IN, OUT
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Union
+
+
+class asyncSerialDevice:
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        rtsCts: bool,
+        timeout: int = 0,
+        stopBits: int = 1,
+        byteSize: int = 8,
+        parity: str = "N",
+        loggerName: str = __name__,
+        terminators: Dict[bytes, str] = PCB_TERMINATORS,
+        coalesce: bool = False,
+        lanes: Dict[str, Dict[str, Any]] = None,
+        capture: Dict[str, Any] = None,
+        reconnect: Dict[str, Any] = None,
+        loop: asyncio.AbstractEventLoop = None,
+    ) -> None:
+        """
+        Serial device driven by a single event loop. The port is watched with loop.add_reader and
+        written with loop.add_writer, no threads are created per device or per writing task.
+
+        The methods shared with serialDevice can be called from any thread. send, receive and the
+        writing tasks' callbacks run in the event loop.
+        """
+        self.__loggingService = setup_logger(loggerName)
+        self.__loop = loop if loop else getEventLoop()
+        self.__termination = b"\xff\xff\xff"
+        # the loop cannot wait for itself to flush, lanes that would block are unbounded
+        if lanes:
+            lanes = {
+                name: lane if lane.get("policy") != BLOCK else {**lane, "maxsize": 0}
+                for name, lane in lanes.items()
+            }
+        # end if
+
+        self.__outputMessages = outbox(
+            maxsize=0,
+            coalesce=coalesce,
+            terminationSize=len(self.__termination),
+            lanes=lanes,
+        )
+        self.__writeBuffer = bytearray()
+
+        # metrics of the link, labelled with the logger name
+        registry = getRegistry()
+        self.__bytesIn = registry.counter(
+            "serial_bytes_total",
+            "Bytes read and written",
+            device=loggerName,
+            direction="in",
+        )
+        self.__bytesOut = registry.counter(
+            "serial_bytes_total", device=loggerName, direction="out"
+        )
+        self.__framesIn = registry.counter(
+            "serial_frames_total",
+            "Frames read and messages written",
+            device=loggerName,
+            direction="in",
+        )
+        self.__framesOut = registry.counter(
+            "serial_frames_total", device=loggerName, direction="out"
+        )
+        self.__writeLatency = registry.histogram(
+            "serial_write_seconds", "Time spent writing to the port", device=loggerName
+        )
+        registry.gauge(
+            "serial_queue_depth", "Messages waiting to be written", device=loggerName
+        ).setFunction(self.__outputMessages.qsize)
+        self.__reconnects = registry.counter(
+            "serial_reconnects_total", "Times the port was reopened", device=loggerName
+        )
+        registry.gauge(
+            "serial_link_up", "1 while the port is open", device=loggerName
+        ).setFunction(lambda: 1 if self.linkUp else 0)
+        self.__writerRegistered = False
+        self.__inputMessages = None
+        self.__onMessageReceivedEventSet = None
+        self.__onReturnCodeReceivedEventSet = None
+        self.__probeResponse = None
+        self.__parser = frameParser(terminators)
+        self.__tasks = {}
+
+        # when the port fails it is reopened from the loop, waiting longer after every attempt
+        reconnect = {**RECONNECT_DEFAULTS, **(reconnect or {})}
+        self.__keptLanes = keptLanes(reconnect["whileDown"])
+        self.__backoff = backoff(
+            reconnect["initialDelay"], reconnect["maxDelay"], reconnect["factor"]
+        )
+        self.__linkUp = True
+        self.__reopenHandle = None
+        self.__closed = False
+        self.lastReceived = monotonic()
+
+        # the bytes read and written are appended to a ring file when a capture is configured
+        self.__capture = None
+
+        if capture:
+            self.__capture = trafficCapture(
+                capture["path"], capture.get("size", 8 * 1024 * 1024), loggerName
+            )
+        # end if
+
+        self.serialConnection = serial.Serial(
+            port,
+            baudrate,
+            timeout=timeout,
+            rtscts=rtsCts,
+            bytesize=byteSize,
+            stopbits=stopBits,
+            parity=parity,
+        )
+        self.__fd = self.serialConnection.fileno()
+
+        runOnLoop(self.__loop, self.__start)
+
+    # end def
+
+    def __del__(self):
+        if self.serialConnection.is_open:
+            self.closeConnection()
+
+    # end def
+
+    def __start(self):
+        self.__inputMessages = asyncio.Queue(maxsize=100)
+        self.__loop.add_reader(self.__fd, self.__read)
+        self.__loggingService.info("reader registered")
+
+    # end def
+
+    def __close(self):
+        self.__closed = True
+        self.__loggingService.warning("canceling all tasks")
+
+        for identifier, task in self.__tasks.items():
+            task.cancel()
+            self.__loggingService.info(f"{identifier}Task cancelled")
+        # end for
+
+        self.__tasks.clear()
+
+        if self.__reopenHandle is not None:
+            self.__reopenHandle.cancel()
+            self.__reopenHandle = None
+        # end if
+
+        if self.__linkUp:
+            self.__loop.remove_reader(self.__fd)
+        # end if
+
+        if self.__writerRegistered:
+            self.__loop.remove_writer(self.__fd)
+            self.__writerRegistered = False
+        # end if
+
+        self.__outputMessages.close()
+        self.serialConnection.close()
+
+        if self.__capture:
+            self.__capture.close()
+        # end if
+
+        self.__loggingService.info("serial port closed")
+
+    # end def
+
+    def __fill(self) -> bool:
+        # the messages are taken from their lanes only once the port has taken the bytes before them,
+        # so the priorities and drop policies of the lanes apply while the port is slow
+        pending = self.__outputMessages.getAll(block=False)
+
+        if len(pending) == 0:
+            return False
+        # end if
+
+        for message in pending:
+            if isinstance(message, bytes):
+                self.__writeBuffer += message
+            else:
+                encodeInto(self.__writeBuffer, message)
+            # end if
+        # end for
+
+        # a frame may hold several instructions
+        self.__framesOut.inc(self.__writeBuffer.count(self.__termination))
+
+        return True
+
+    # end def
+
+    def __flush(self):
+        # while the port is reopened the messages wait in the paused outbox
+        if not self.__linkUp:
+            return
+        # end if
+
+        # bytes still waiting for the port are written first, __write refills the buffer once they are
+        if len(self.__writeBuffer) > 0:
+            return
+        # end if
+
+        self.__write()
+
+    # end def
+
+    def __getInputMessage(self):
+        if self.__inputMessages.empty():
+            return None
+        return self.__inputMessages.get_nowait()
+
+    # end def
+
+    def __queueMessage(self, message: str):
+        # the oldest message is discarded instead of blocking the event loop
+        if self.__inputMessages.full():
+            self.__inputMessages.get_nowait()
+        # end if
+
+        self.__inputMessages.put_nowait(message)
+
+    # end def
+
+    def __queueResult(self, result: Union[str, bytes, List[str], None]):
+        if isinstance(result, (str, bytes)):
+            self.__outputMessages.put(result)
+
+        elif isinstance(result, list):
+            for item in result:
+                if item != None and item.strip() != "":
+                    self.__outputMessages.put(item)
+                # end if
+            # end for
+        # end if
+
+        self.__flush()
+
+    # end def
+
+    def __linkDown(self, reason: str):
+        # the port is closed and opened again, the reader is removed so that the loop does not spin
+        if not self.__linkUp or self.__closed:
+            return
+        # end if
+
+        self.__linkUp = False
+        self.__loop.remove_reader(self.__fd)
+
+        if self.__writerRegistered:
+            self.__loop.remove_writer(self.__fd)
+            self.__writerRegistered = False
+        # end if
+
+        try:
+            self.serialConnection.close()
+        except Exception:
+            pass
+        # end try-except
+
+        # the bytes being written are lost, the queued messages are kept by the policy
+        self.__writeBuffer.clear()
+        dropped = self.__outputMessages.pause(self.__keptLanes)
+        self.__loggingService.error(
+            f"{reason}. Reopening the port, {dropped} queued messages dropped"
+        )
+        self.__backoff.reset()
+        self.__reopenHandle = self.__loop.call_soon(self.__reopen)
+
+    # end def
+
+    def __reopen(self):
+        self.__reopenHandle = None
+
+        try:
+            self.serialConnection.open()
+        except Exception as e:
+            delay = self.__backoff.next()
+            self.__loggingService.warning(
+                f"port not reopened: {e}. Retrying in {delay:.1f} s"
+            )
+            self.__reopenHandle = self.__loop.call_later(delay, self.__reopen)
+            return
+        # end try-except
+
+        # a frame cut by the failure is not completed by the bytes read from now on
+        self.__parser.reset()
+        self.__fd = self.serialConnection.fileno()
+        self.__loop.add_reader(self.__fd, self.__read)
+        self.lastReceived = monotonic()
+        self.__reconnects.inc()
+        self.__linkUp = True
+        self.__outputMessages.resume()
+        self.__loggingService.warning(
+            f"port reopened after {self.__backoff.attempts + 1} attempts"
+        )
+        self.__flush()
+
+    # end def
+
+    def __read(self):
+        try:
+            chunk = os.read(self.__fd, 4096)
+        except BlockingIOError:
+            return
+        except Exception as e:
+            self.__linkDown(f"Read error: {e}")
+            return
+        # end try-except
+
+        if chunk == b"":
+            self.__linkDown("device reports readiness to read but returned no data")
+            return
+        # end if
+
+        self.lastReceived = monotonic()
+        self.__bytesIn.inc(len(chunk))
+
+        if self.__capture:
+            self.__capture.append(IN, chunk)
+        # end if
+
+        for kind, frame in self.__parser.feed(chunk):
+            self.__framesIn.inc()
+
+            try:
+                if self.__probeResponse and self.__probeResponse[0](kind, frame):
+                    self.__probeResponse[1](frame)
+
+                elif kind == TEXT_FRAME:
+                    message = frame.decode("ascii") + "\r\n"
+
+                    if self.__onMessageReceivedEventSet:
+                        result = self.__onMessageReceivedEventSet(message)
+
+                        if inspect.iscoroutine(result):
+                            self.__loop.create_task(result)
+                        # end if
+                    else:
+                        self.__queueMessage(message)
+                    # end if
+
+                elif self.__onReturnCodeReceivedEventSet:
+                    self.__onReturnCodeReceivedEventSet(frame)
+                # end if
+            except Exception as e:
+                self.__loggingService.error(f"Read error: {e}")
+            # end try-except
+        # end for
+
+    # end def
+
+    def __write(self):
+        while len(self.__writeBuffer) > 0 or self.__fill():
+            try:
+                with self.__writeLatency.time():
+                    written = os.write(self.__fd, self.__writeBuffer)
+                # end with
+            except BlockingIOError:
+                break
+            except Exception as e:
+                self.__linkDown(f"writting error: {e}")
+                return
+            # end try-except
+
+            if self.__capture:
+                self.__capture.append(OUT, self.__writeBuffer[:written])
+            # end if
+
+            del self.__writeBuffer[:written]
+            self.__bytesOut.inc(written)
+
+            if len(self.__writeBuffer) > 0:
+                # the port took part of the bytes, it is full
+                break
+            # end if
+        # end while
+
+        # the loop calls __write again once the port accepts more bytes
+        if len(self.__writeBuffer) > 0 and not self.__writerRegistered:
+            self.__loop.add_writer(self.__fd, self.__write)
+            self.__writerRegistered = True
+        elif len(self.__writeBuffer) == 0 and self.__writerRegistered:
+            self.__loop.remove_writer(self.__fd)
+            self.__writerRegistered = False
+        # end if
+
+    # end def
+
+    async def __writingTask(self, task, identifier, wait, mode):
+        self.__loggingService.info(f"{identifier}Task started")
+        deadline = self.__loop.time()
+
+        try:
+            while True:
+                result = task()
+
+                if inspect.isawaitable(result):
+                    result = await result
+                # end if
+
+                self.__queueResult(result)
+
+                if mode == FIXED_RATE:
+                    # keeping the original grid, periods already missed are skipped
+                    now = self.__loop.time()
+                    deadline += wait
+
+                    if deadline <= now:
+                        deadline += ((now - deadline) // wait + 1) * wait
+                    # end if
+
+                    await asyncio.sleep(deadline - now)
+                else:
+                    await asyncio.sleep(wait)
+                # end if
+            # end while
+        finally:
+            self.__loggingService.warning(f"{identifier}Task finished")
+        # end try-finally
+
+    # end def
+
+    def __runWritingTask(self, callback, identifier, wait, mode):
+        if identifier in self.__tasks:
+            raise KeyError("Repeted key value")
+        # end if
+
+        if mode not in [FIXED_RATE, FIXED_DELAY]:
+            raise ValueError(f"Unknown scheduling mode: {mode}")
+        # end if
+
+        self.__tasks[identifier] = self.__loop.create_task(
+            self.__writingTask(callback, identifier, wait, mode)
+        )
+
+    # end def
+
+    def __stopTask(self, identifier):
+        if identifier in self.__tasks:
+            self.__tasks.pop(identifier).cancel()
+            self.__loggingService.warning(f"{identifier}Task cancelled")
+        else:
+            self.__loggingService.warning(f"{identifier} not in tasks")
+        # end if
+
+    # end def
+
+    def closeConnection(self):
+        if self.__loop.is_closed():
+            self.serialConnection.close()
+        else:
+            runOnLoop(self.__loop, self.__close)
+        # end if
+
+    # end def
+
+    def getInputMessage(self):
+        return runOnLoop(self.__loop, self.__getInputMessage)
+
+    # end def
+
+    def getOutboxStatistics(self) -> Dict[str, Any]:
+        """
+        Returns the state of the output messages queue.
+
+        Returns:
+            Dict[str, Any]: queued messages, messages replaced by a newer value, the bytes saved by it
+                and the depth and drops of every lane.
+        """
+        return {
+            "queued": self.__outputMessages.qsize(),
+            "coalescedMessages": self.__outputMessages.coalescedMessages,
+            "coalescedBytes": self.__outputMessages.coalescedBytes,
+            "lanes": self.__outputMessages.getStatistics(),
+        }
+
+    # end def
+
+    def onMessageReceivedEvent(
+        self, callback: Callable[[str], Union[None, Awaitable[None]]]
+    ):
+        """Sets the callback called with every text message received. Coroutines are scheduled as tasks."""
+        self.__onMessageReceivedEventSet = callback
+
+    # end def
+
+    @property
+    def linkUp(self) -> bool:
+        """False while the port is being reopened."""
+        return self.__linkUp
+
+    # end def
+
+    def onProbeResponse(
+        self,
+        isResponse: Callable[[str, bytes], bool],
+        callback: Callable[[bytes], None],
+    ):
+        """
+        Sets the callback called with the frames that answer a link supervisor's probes, instead of
+        the message and return code callbacks. Both are called from the event loop.
+        """
+        self.__probeResponse = (isResponse, callback)
+
+    # end def
+
+    def reconnect(self):
+        """Closes and reopens the port, e.g. when the link stalled. Can be called from any thread."""
+        if not self.__loop.is_closed():
+            self.__loop.call_soon_threadsafe(self.__linkDown, "reconnect requested")
+        # end if
+
+    # end def
+
+    def onReturnCodeReceivedEvent(self, callback: Callable[[bytes], None]):
+        """
+        Sets the callback called with every binary frame (e.g. nextion return codes) received.
+        The terminator is not included in the frame.
+        """
+        self.__onReturnCodeReceivedEventSet = callback
+
+    # end def
+
+    async def receive(self, timeout: float = None) -> Union[str, None]:
+        """
+        Waits for the next message received. Messages are only queued when there is no
+        onMessageReceivedEvent callback set.
+
+        Args:
+            timeout (float): seconds to wait for a message. Waits forever when None.
+
+        Returns:
+            Union[str, None]: the message received or None if the timeout expired.
+        """
+        try:
+            return await asyncio.wait_for(self.__inputMessages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        # end try-except
+
+    # end def
+
+    def runWritingTask(
+        self,
+        callback: Callable[[], Union[str, List[str], Awaitable]],
+        identifier: str,
+        wait: float = 0.2,
+        mode: str = FIXED_DELAY,
+    ) -> None:
+        """
+        Executes the given callback periodically as a task of the event loop and sends its result to the spi device
+
+        Arguments:
+            callback (Callable[[], Union[str, List[str], Awaitable]]): The callback function or coroutine function to call.
+                It runs in the event loop so it must not block.
+            identifier (str): Name of the task. *This identifier can be used later to stop the task*.
+            wait (float): time in seconds between calls.
+            mode (str): FIXED_DELAY waits after every call finishes, FIXED_RATE calls it at a fixed rate.
+
+        Returns:
+            None
+        """
+        runOnLoop(self.__loop, self.__runWritingTask, callback, identifier, wait, mode)
+
+    # end def
+
+    async def send(self, message: str) -> None:
+        self.__outputMessages.put(message)
+        self.__flush()
+
+    # end def
+
+    def sendMessage(self, message, block: bool = True) -> bool:
+        """Queues a message, block False drops it when its lane is full instead of waiting."""
+        queued = self.__outputMessages.put(message, block=block)
+        self.__loop.call_soon_threadsafe(self.__flush)
+
+        return queued
+
+    # end def
+
+    def sendFrame(
+        self, frame: bytes, lane: str = CONTROL_LANE, block: bool = True
+    ) -> bool:
+        """
+        Queues instructions already encoded with their terminators, e.g. a commandBuilder frame.
+        They are written together, in a single write.
+
+        Args:
+            frame (bytes): one or more instructions.
+            lane (str): lane of the frame, frames are not classified.
+            block (bool): False drops the frame when its lane is full instead of waiting.
+
+        Returns:
+            bool: False if the frame was dropped.
+        """
+        queued = self.__outputMessages.put(frame, lane, block)
+        self.__loop.call_soon_threadsafe(self.__flush)
+
+        return queued
+
+    # end def
+
+    def stopTask(self, identifier):
+        runOnLoop(self.__loop, self.__stopTask, identifier)
+
+    # end def
+
+
+# end class
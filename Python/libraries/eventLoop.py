@@ -0,0 +1,111 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def getEventLoop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the event loop shared by the whole process. The loop is created and started
+    in its own thread the first time this function is called.
+
+    Returns:
+        asyncio.AbstractEventLoop: the running event loop.
+    """
+    global _loop, _thread
+
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_loop.run_forever, name="eventLoopThread", daemon=True
+            )
+            _thread.start()
+        # end if
+
+        return _loop
+
+    # end with
+
+
+# end def
+
+
+def runOnLoop(
+    loop: asyncio.AbstractEventLoop, function: Callable[..., Any], *args
+) -> Any:
+    """
+    Calls the function in the loop's thread and waits for its result. If it is already called
+    from the loop's thread the function is called right away.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): loop where the function must run.
+        function (Callable[..., Any]): the function to call. It must not block.
+        *args: arguments for the function.
+
+    Returns:
+        Any: the value returned by the function.
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    # end try-except
+
+    if running is loop:
+        return function(*args)
+    # end if
+
+    future = concurrent.futures.Future()
+
+    def call():
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        # end try-except
+
+    # end def
+
+    loop.call_soon_threadsafe(call)
+
+    return future.result()
+
+
+# end def
+
+
+def stopEventLoop() -> None:
+    """Cancels every pending task, stops the shared event loop and waits for its thread."""
+    global _loop, _thread
+
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    # end with
+
+    if loop is None:
+        return
+    # end if
+
+    def cancelTasks():
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        # end for
+
+    # end def
+
+    runOnLoop(loop, cancelTasks)
+    loop.call_soon_threadsafe(loop.stop)
+
+    if thread is not threading.current_thread():
+        thread.join(5)
+        loop.close()
+    # end if
+
+
+# end def
@@ -0,0 +1,391 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, List, Tuple, Union
+
+
+class firmwareImage:
+    def __init__(self, path: str, binaryAddress: int = 0) -> None:
+        """
+        Parses an Intel HEX, ELF or raw binary image into its memory sections.
+
+        Args:
+            path (str): path of the image.
+            binaryAddress (int): address where raw binary images are loaded.
+
+        Returns:
+            None
+        """
+        with open(path, "rb") as file:
+            content = file.read()
+        # end with
+
+        self.path = path
+        self.digest = hashlib.sha256(content).hexdigest()
+
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension in [".hex", ".ihex"]:
+            sections = self.__parseHex(content)
+        elif content[:4] == b"\x7fELF":
+            sections = self.__parseElf(content)
+        else:
+            sections = [(binaryAddress, content)]
+        # end if
+
+        self.sections: List[Tuple[int, bytes]] = sections
+        self.checksums: List[int] = [zlib.crc32(data) for _, data in sections]
+        self.size = sum(len(data) for _, data in sections)
+
+    # end def
+
+    def __parseElf(self, content: bytes) -> List[Tuple[int, bytes]]:
+        is64 = content[4] == 2
+        endian = "<" if content[5] == 1 else ">"
+
+        if is64:
+            phoff, phentsize, phnum = (
+                struct.unpack_from(endian + "Q", content, 0x20)[0],
+                *struct.unpack_from(endian + "HH", content, 0x36),
+            )
+            layout = endian + "IIQQQQQQ"
+        else:
+            phoff, phentsize, phnum = (
+                struct.unpack_from(endian + "I", content, 0x1C)[0],
+                *struct.unpack_from(endian + "HH", content, 0x2A),
+            )
+            layout = endian + "IIIIIIII"
+        # end if
+
+        sections = []
+
+        for index in range(phnum):
+            fields = struct.unpack_from(layout, content, phoff + index * phentsize)
+
+            if is64:
+                pType, _, offset, _, physicalAddress, fileSize = fields[:6]
+            else:
+                pType, offset, _, physicalAddress, fileSize = fields[:5]
+            # end if
+
+            # only PT_LOAD segments with data end up in flash
+            if pType == 1 and fileSize > 0:
+                sections.append((physicalAddress, content[offset : offset + fileSize]))
+            # end if
+        # end for
+
+        return self.__merge(sections)
+
+    # end def
+
+    def __parseHex(self, content: bytes) -> List[Tuple[int, bytes]]:
+        sections = []
+        base = 0
+
+        for lineNumber, line in enumerate(content.splitlines(), 1):
+            line = line.strip()
+
+            if len(line) == 0:
+                continue
+            # end if
+
+            if line[:1] != b":":
+                raise ValueError(f"{self.path}:{lineNumber} is not an Intel HEX record")
+            # end if
+
+            record = bytes.fromhex(line[1:].decode("ascii"))
+
+            if sum(record) & 0xFF != 0:
+                raise ValueError(f"{self.path}:{lineNumber} has a wrong checksum")
+            # end if
+
+            length, address, recordType = (
+                record[0],
+                (record[1] << 8) | record[2],
+                record[3],
+            )
+            data = record[4 : 4 + length]
+
+            if recordType == 0x00:
+                sections.append((base + address, data))
+            elif recordType == 0x01:
+                break
+            elif recordType == 0x02:
+                base = int.from_bytes(data, "big") << 4
+            elif recordType == 0x04:
+                base = int.from_bytes(data, "big") << 16
+            # end if
+        # end for
+
+        return self.__merge(sections)
+
+    # end def
+
+    def __merge(self, sections: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes]]:
+        """Joins contiguous records into a single section."""
+        merged = []
+
+        for address, data in sorted(sections, key=lambda section: section[0]):
+            if len(merged) > 0 and merged[-1][0] + len(merged[-1][1]) == address:
+                merged[-1][1].extend(data)
+            else:
+                merged.append((address, bytearray(data)))
+            # end if
+        # end for
+
+        return [(address, bytes(data)) for address, data in merged]
+
+    # end def
+
+
+# end class
+
+_cache: Dict[str, Tuple[int, int, firmwareImage]] = {}
+_cacheLock = threading.Lock()
+
+
+def loadImage(path: str) -> firmwareImage:
+    """
+    Returns the parsed image, parsing the file only the first time or when it changes on disk.
+
+    Args:
+        path (str): path of the image.
+
+    Returns:
+        firmwareImage: the parsed image.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    with _cacheLock:
+        cached = _cache.get(path)
+
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        # end if
+    # end with
+
+    image = firmwareImage(path)
+
+    with _cacheLock:
+        _cache[path] = (stat.st_mtime_ns, stat.st_size, image)
+    # end with
+
+    return image
+
+
+# end def
+
+
+class pagedImage:
+    def __init__(
+        self,
+        digest: str,
+        pageSize: int,
+        addresses: List[int],
+        data: bytes,
+        checksums: List[int] = None,
+    ) -> None:
+        """
+        Image split into flash pages aligned to pageSize. The bytes of a page not covered by the
+        image hold the erased value, 0xff, like after programming the whole image.
+
+        Args:
+            digest (str): sha256 of the image file.
+            pageSize (int): bytes of every page, the unit that is compared and written.
+            addresses (List[int]): address of every page, ascending.
+            data (bytes): the pages one after the other.
+            checksums (List[int]): crc32 of every page, computed if None.
+
+        Returns:
+            None
+        """
+        self.digest = digest
+        self.pageSize = pageSize
+        self.addresses = addresses
+        self.data = data
+        self.checksums = (
+            checksums
+            if checksums is not None
+            else [
+                zlib.crc32(data[offset : offset + pageSize])
+                for offset in range(0, len(data), pageSize)
+            ]
+        )
+
+    # end def
+
+    def page(self, index: int) -> bytes:
+        return self.data[index * self.pageSize : (index + 1) * self.pageSize]
+
+    # end def
+
+    def regions(self) -> List[Tuple[int, int]]:
+        """Returns (first page index, pages) for every run of contiguous pages."""
+        regions = []
+
+        for index, address in enumerate(self.addresses):
+            if (
+                len(regions) > 0
+                and self.addresses[index - 1] + self.pageSize == address
+            ):
+                regions[-1][1] += 1
+            else:
+                regions.append([index, 1])
+            # end if
+        # end for
+
+        return [(first, count) for first, count in regions]
+
+    # end def
+
+    @classmethod
+    def fromImage(cls, image: firmwareImage, pageSize: int) -> "pagedImage":
+        pages: Dict[int, bytearray] = {}
+
+        for address, data in image.sections:
+            offset = 0
+
+            while offset < len(data):
+                pageAddress = (address + offset) // pageSize * pageSize
+                start = address + offset - pageAddress
+                length = min(pageSize - start, len(data) - offset)
+
+                page = pages.setdefault(pageAddress, bytearray(b"\xff" * pageSize))
+                page[start : start + length] = data[offset : offset + length]
+                offset += length
+            # end while
+        # end for
+
+        addresses = sorted(pages)
+
+        return cls(
+            image.digest,
+            pageSize,
+            addresses,
+            b"".join(bytes(pages[address]) for address in addresses),
+        )
+
+    # end def
+
+
+# end class
+
+_pagedCache: Dict[Tuple[str, int], Tuple[int, int, pagedImage]] = {}
+
+
+def loadPagedImage(path: str, pageSize: int, cacheDirectory: str = None) -> pagedImage:
+    """
+    Returns the image split into pages. It is kept in memory and, with a cacheDirectory, on disk
+    so that the image is not parsed again after a restart while the file does not change.
+
+    Args:
+        path (str): path of the image.
+        pageSize (int): bytes of every page.
+        cacheDirectory (str): directory where the pages and their checksums are stored.
+
+    Returns:
+        pagedImage: the paged image.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, pageSize)
+
+    with _cacheLock:
+        cached = _pagedCache.get(key)
+
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        # end if
+    # end with
+
+    paged = None
+
+    if cacheDirectory is not None:
+        name = hashlib.sha256(f"{path}:{pageSize}".encode("utf-8")).hexdigest()
+        indexPath = os.path.join(cacheDirectory, name + ".json")
+        dataPath = os.path.join(cacheDirectory, name + ".pages")
+        paged = _readPagedCache(indexPath, dataPath, stat)
+    # end if
+
+    if paged is None:
+        paged = pagedImage.fromImage(loadImage(path), pageSize)
+
+        if cacheDirectory is not None:
+            _writePagedCache(indexPath, dataPath, stat, paged)
+        # end if
+    # end if
+
+    with _cacheLock:
+        _pagedCache[key] = (stat.st_mtime_ns, stat.st_size, paged)
+    # end with
+
+    return paged
+
+
+# end def
+
+
+def _readPagedCache(indexPath: str, dataPath: str, stat) -> Union[pagedImage, None]:
+    try:
+        with open(indexPath) as file:
+            index = json.load(file)
+        # end with
+
+        if index["mtimeNs"] != stat.st_mtime_ns or index["size"] != stat.st_size:
+            return None
+        # end if
+
+        with open(dataPath, "rb") as file:
+            data = file.read()
+        # end with
+    except (OSError, ValueError, KeyError):
+        return None
+    # end try-except
+
+    if len(data) != len(index["addresses"]) * index["pageSize"]:
+        return None
+    # end if
+
+    return pagedImage(
+        index["digest"], index["pageSize"], index["addresses"], data, index["checksums"]
+    )
+
+
+# end def
+
+
+def _writePagedCache(indexPath: str, dataPath: str, stat, paged: pagedImage) -> None:
+    os.makedirs(os.path.dirname(indexPath), exist_ok=True)
+
+    # the data goes first and every file is replaced at once, a reader never gets half of it
+    for filePath, content in [
+        (dataPath, paged.data),
+        (
+            indexPath,
+            json.dumps(
+                {
+                    "mtimeNs": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "digest": paged.digest,
+                    "pageSize": paged.pageSize,
+                    "addresses": paged.addresses,
+                    "checksums": paged.checksums,
+                }
+            ).encode("utf-8"),
+        ),
+    ]:
+        temporaryPath = f"{filePath}.{os.getpid()}.tmp"
+
+        with open(temporaryPath, "wb") as file:
+            file.write(content)
+        # end with
+
+        os.replace(temporaryPath, filePath)
+    # end for
+
+
+# end def
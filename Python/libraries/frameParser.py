@@ -0,0 +1,111 @@
+from typing import Dict, List, Tuple
+
+TEXT_FRAME = "text"
+BINARY_FRAME = "binary"
+
+# every byte outside of the printable ascii range (32-126) is deleted from text frames
+_NON_PRINTABLE = bytes(b for b in range(256) if b < 32 or b > 126)
+
+# the PCB link only sends text lines
+PCB_TERMINATORS = {b"\r\n": TEXT_FRAME}
+
+# the nextion sends text lines from the HMI code and binary return codes ended by 0xff 0xff 0xff
+NEXTION_TERMINATORS = {b"\r\n": TEXT_FRAME, b"\xff\xff\xff": BINARY_FRAME}
+
+
+class frameParser:
+    def __init__(
+        self,
+        terminators: Dict[bytes, str] = PCB_TERMINATORS,
+        maxFrameSize: int = 1024,
+    ) -> None:
+        """
+        Splits a raw byte stream into frames.
+
+        Args:
+            terminators (Dict[bytes, str]): Maps every frame terminator to the kind of frame it closes,
+                TEXT_FRAME or BINARY_FRAME. Text frames are stripped of non printable characters.
+            maxFrameSize (int): Bytes kept without finding a terminator before the buffer is discarded.
+
+        Returns:
+            None
+        """
+        if len(terminators) == 0:
+            raise ValueError("at least one terminator is required")
+        # end if
+
+        self.__terminators = list(terminators.items())
+        self.__maxFrameSize = maxFrameSize
+        self.__buffer = bytearray()
+        self.discardedBytes = 0
+
+    # end def
+
+    def feed(self, data: bytes) -> List[Tuple[str, bytes]]:
+        """
+        Appends the received bytes and returns every complete frame found.
+
+        Args:
+            data (bytes): bytes read from the device.
+
+        Returns:
+            List[Tuple[str, bytes]]: (frame kind, payload) pairs. Payloads do not include the terminator.
+                Empty text frames are not returned.
+        """
+        buffer = self.__buffer
+        buffer += data
+        frames = []
+        start = 0
+
+        while True:
+            # looking for the terminator that appears first
+            end = -1
+            kind = None
+            size = 0
+
+            for terminator, terminatorKind in self.__terminators:
+                index = buffer.find(terminator, start)
+
+                if index >= 0 and (end < 0 or index < end):
+                    end = index
+                    kind = terminatorKind
+                    size = len(terminator)
+                # end if
+            # end for
+
+            if end < 0:
+                break
+            # end if
+
+            payload = bytes(buffer[start:end])
+            start = end + size
+
+            if kind == TEXT_FRAME:
+                payload = payload.translate(None, _NON_PRINTABLE)
+
+                if payload == b"":
+                    continue
+                # end if
+            # end if
+
+            frames.append((kind, payload))
+        # end while
+
+        del buffer[:start]
+
+        if len(buffer) > self.__maxFrameSize:
+            self.discardedBytes += len(buffer)
+            buffer.clear()
+        # end if
+
+        return frames
+
+    # end def
+
+    def reset(self) -> None:
+        self.__buffer.clear()
+
+    # end def
+
+
+# end class
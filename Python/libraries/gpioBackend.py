@@ -0,0 +1,269 @@
+import mmap
+import os
+import stat
+from typing import Callable, List
+
+# BCM2835 to BCM2711 GPIO registers, as word indexes of the block mapped by /dev/gpiomem
+_GPFSEL0 = 0x00 // 4
+_GPSET0 = 0x1C // 4
+_GPCLR0 = 0x28 // 4
+_GPLEV0 = 0x34 // 4
+# the pull up/down control registers only exist on the BCM2711 (Raspberry Pi 4)
+_GPIO_PUP_PDN_CNTRL_REG0 = 0xE4 // 4
+
+_BLOCK_SIZE = 4096
+
+_COMPATIBLE_PATH = "/proc/device-tree/compatible"
+
+
+def isBcm2711(path: str = _COMPATIBLE_PATH) -> bool:
+    """
+    Tells whether the SoC is the BCM2711, from the compatible strings of the device tree.
+
+    Args:
+        path (str): file with the NUL separated compatible strings.
+
+    Returns:
+        bool: True on a BCM2711, False on another SoC or if the file can not be read.
+    """
+    try:
+        with open(path, "rb") as file:
+            compatible = file.read().split(b"\0")
+        # end with
+    except OSError:
+        return False
+    # end try-except
+
+    return b"brcm,bcm2711" in compatible
+
+
+# end def
+
+
+def pinsToMask(pins: List[int]) -> int:
+    mask = 0
+
+    for pin in pins:
+        mask |= 1 << pin
+    # end for
+
+    return mask
+
+
+# end def
+
+
+class rpiGpioBackend:
+    def __init__(self) -> None:
+        """Backend using the RPi.GPIO library. It reads and writes the pins one by one."""
+        import RPi.GPIO as gpio
+
+        self.__gpio = gpio
+        gpio.setmode(gpio.BCM)
+
+    # end def
+
+    def addEdgeCallback(self, pin: int, callback: Callable[[int], None]) -> None:
+        self.__gpio.add_event_detect(pin, self.__gpio.BOTH, callback=callback)
+
+    # end def
+
+    def cleanup(self) -> None:
+        self.__gpio.cleanup()
+
+    # end def
+
+    def readMask(self, mask: int) -> int:
+        level = 0
+        pin = 0
+
+        while mask >> pin:
+            if (mask >> pin) & 1 and self.__gpio.input(pin):
+                level |= 1 << pin
+            # end if
+
+            pin += 1
+        # end while
+
+        return level
+
+    # end def
+
+    def setupInput(self, pin: int) -> None:
+        self.__gpio.setup(pin, self.__gpio.IN, pull_up_down=self.__gpio.PUD_DOWN)
+
+    # end def
+
+    def setupOutput(self, pin: int) -> None:
+        self.__gpio.setup(pin, self.__gpio.OUT, initial=self.__gpio.LOW)
+
+    # end def
+
+    def writeMask(self, setMask: int, clearMask: int) -> None:
+        pins = []
+        levels = []
+
+        for pin in range(max(setMask | clearMask, 1).bit_length()):
+            if (setMask >> pin) & 1:
+                pins.append(pin)
+                levels.append(self.__gpio.HIGH)
+            elif (clearMask >> pin) & 1:
+                pins.append(pin)
+                levels.append(self.__gpio.LOW)
+            # end if
+        # end for
+
+        if len(pins) > 0:
+            self.__gpio.output(pins, levels)
+        # end if
+
+    # end def
+
+
+# end class
+
+
+class gpioMemBackend:
+    def __init__(self, path: str = "/dev/gpiomem") -> None:
+        """
+        Backend mapping the GPIO registers of bank 0 (pins 0 to 31). Every input is read with a single
+        register read and several outputs are set or cleared with a single register write.
+
+        If path is a regular file instead of the character device, it is used as a fake register map:
+        writes to the set and clear registers are applied to the level register.
+
+        The pull-downs of the inputs are set through the registers only on the BCM2711, the older SoCs
+        set them with a clocked sequence and RPi.GPIO is used to set them up instead.
+
+        Args:
+            path (str): /dev/gpiomem or a file of at least 4096 bytes.
+
+        Returns:
+            None
+        """
+        self.__fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        self.__emulated = not stat.S_ISCHR(os.fstat(self.__fd).st_mode)
+
+        if self.__emulated and os.fstat(self.__fd).st_size < _BLOCK_SIZE:
+            os.ftruncate(self.__fd, _BLOCK_SIZE)
+        # end if
+
+        self.__map = mmap.mmap(self.__fd, _BLOCK_SIZE)
+        self.__registers = memoryview(self.__map).cast("I")
+        self.__pullGpio = None
+
+        if not self.__emulated and not isBcm2711():
+            import RPi.GPIO as gpio
+
+            gpio.setmode(gpio.BCM)
+            self.__pullGpio = gpio
+        # end if
+
+    # end def
+
+    def __setFunction(self, pin: int, function: int) -> None:
+        index = _GPFSEL0 + pin // 10
+        shift = (pin % 10) * 3
+        registers = self.__registers
+        registers[index] = (registers[index] & ~(0b111 << shift)) | (function << shift)
+
+    # end def
+
+    def __setPull(self, pin: int, pull: int) -> None:
+        index = _GPIO_PUP_PDN_CNTRL_REG0 + pin // 16
+        shift = (pin % 16) * 2
+        registers = self.__registers
+        registers[index] = (registers[index] & ~(0b11 << shift)) | (pull << shift)
+
+    # end def
+
+    def addEdgeCallback(self, pin: int, callback: Callable[[int], None]) -> None:
+        raise RuntimeError("edge detection is not available with the gpiomem backend")
+
+    # end def
+
+    def cleanup(self) -> None:
+        if self.__map is None:
+            return
+        # end if
+
+        self.__registers.release()
+        self.__map.close()
+        os.close(self.__fd)
+        self.__map = None
+
+        if self.__pullGpio is not None:
+            self.__pullGpio.cleanup()
+        # end if
+
+    # end def
+
+    def readMask(self, mask: int) -> int:
+        return self.__registers[_GPLEV0] & mask
+
+    # end def
+
+    def setupInput(self, pin: int) -> None:
+        if self.__pullGpio is not None:
+            self.__pullGpio.setup(
+                pin, self.__pullGpio.IN, pull_up_down=self.__pullGpio.PUD_DOWN
+            )
+            return
+        # end if
+
+        self.__setFunction(pin, 0b000)
+        self.__setPull(pin, 0b10)
+
+    # end def
+
+    def setupOutput(self, pin: int) -> None:
+        self.writeMask(0, 1 << pin)
+        self.__setFunction(pin, 0b001)
+
+    # end def
+
+    def writeMask(self, setMask: int, clearMask: int) -> None:
+        registers = self.__registers
+
+        if self.__emulated:
+            registers[_GPLEV0] = (
+                (registers[_GPLEV0] | setMask) & ~clearMask & 0xFFFFFFFF
+            )
+            return
+        # end if
+
+        if setMask:
+            registers[_GPSET0] = setMask
+        # end if
+
+        if clearMask:
+            registers[_GPCLR0] = clearMask
+        # end if
+
+    # end def
+
+
+# end class
+
+
+def createGpioBackend(backend: str = "rpi", path: str = "/dev/gpiomem"):
+    """
+    Creates the GPIO backend.
+
+    Args:
+        backend (str): "rpi" for RPi.GPIO or "gpiomem" for the mapped registers.
+        path (str): register map used by the gpiomem backend.
+
+    Returns:
+        Union[rpiGpioBackend, gpioMemBackend]: the backend.
+    """
+    if backend == "rpi":
+        return rpiGpioBackend()
+    elif backend == "gpiomem":
+        return gpioMemBackend(path)
+    # end if
+
+    raise ValueError(f"Unknown gpio backend: {backend}")
+
+
+# end def
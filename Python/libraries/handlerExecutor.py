@@ -0,0 +1,272 @@
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+import time
+from libraries.loggerSetup import setup_logger
+from libraries.metrics import getRegistry, DURATION_BUCKETS
+from typing import Any, Callable, Dict, Union
+
+CONCURRENT = "concurrent"
+SERIALIZED = "serialized"
+PREEMPT = "preempt"
+
+
+def _closeCoroutine(call: concurrent.futures.Future) -> None:
+    if call.cancelled() or call.exception() is not None:
+        return
+    # end if
+
+    if inspect.iscoroutine(call.result()):
+        call.result().close()
+    # end if
+
+
+# end def
+
+
+async def _waitForCall(
+    call: concurrent.futures.Future, loop: asyncio.AbstractEventLoop
+):
+    # a function running in the pool can not be interrupted, it is waited for even if the waiting task
+    # is cancelled again
+    finished = asyncio.wrap_future(call, loop=loop)
+
+    while not finished.done():
+        try:
+            await asyncio.wait([finished])
+        except asyncio.CancelledError:
+            pass
+        # end try-except
+    # end while
+
+
+# end def
+
+
+class handlerExecutor:
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        rules: Dict[str, str] = None,
+        maxWorkers: int = 4,
+        maxPending: int = 16,
+        name: str = "handlerExecutor",
+    ) -> None:
+        """
+        Runs command handlers outside of the thread that receives the commands.
+
+        Coroutine handlers run in the loop and plain functions in a pool of maxWorkers threads, submit
+        never waits for them. The rule of every command tells how it runs alongside the others:
+            CONCURRENT: runs as soon as there is a free worker (default).
+            SERIALIZED: runs after every SERIALIZED handler submitted before it has finished.
+            PREEMPT: cancels the running and waiting SERIALIZED handlers, waits for them to finish and runs.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): loop where the handlers are scheduled.
+            rules (Dict[str, str]): rule of every command.
+            maxWorkers (int): handlers running at the same time.
+            maxPending (int): handlers submitted and not finished yet, more commands are rejected.
+            name (str): name of the logger and prefix of the worker threads.
+
+        Returns:
+            None
+        """
+        for command, rule in (rules or {}).items():
+            if rule not in [CONCURRENT, SERIALIZED, PREEMPT]:
+                raise ValueError(f"Unknown rule for {command}: {rule}")
+            # end if
+        # end for
+
+        self.__loggingService = setup_logger(name)
+        self.__loop = loop
+        self.__rules = dict(rules) if rules else {}
+        self.__maxPending = maxPending
+        self.__pool = concurrent.futures.ThreadPoolExecutor(
+            maxWorkers, thread_name_prefix=name
+        )
+        self.__workers = asyncio.Semaphore(maxWorkers)
+        self.__serialLock = asyncio.Lock()
+        self.__serialTasks = set()
+        self.__lock = threading.Lock()
+        self.__pending = 0
+
+        self.__name = name
+        self.__registry = getRegistry()
+        self.__dispatchLatency = self.__registry.histogram(
+            "handler_dispatch_seconds",
+            "Time from a command being submitted to its handler starting",
+            executor=name,
+        )
+        self.__rejected = self.__registry.counter(
+            "handler_rejected_total",
+            "Commands rejected by a full executor",
+            executor=name,
+        )
+        self.__preempted = self.__registry.counter(
+            "handler_preempted_total",
+            "Handlers cancelled by a preempting command",
+            executor=name,
+        )
+
+    # end def
+
+    async def __preempt(self):
+        current = asyncio.current_task()
+        tasks = [task for task in self.__serialTasks if task is not current]
+
+        for task in tasks:
+            task.cancel()
+        # end for
+
+        self.__preempted.inc(len(tasks))
+
+        # the cancelled handlers clean up before the preempting one runs
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # end def
+
+    async def __call(self, command, function, args, submitted):
+        async with self.__workers:
+            start = time.perf_counter()
+            self.__dispatchLatency.observe(start - submitted)
+            duration = self.__registry.histogram(
+                "handler_duration_seconds",
+                "Time spent by the handler of every command",
+                DURATION_BUCKETS,
+                executor=self.__name,
+                command=command,
+            )
+            try:
+                if inspect.iscoroutinefunction(function):
+                    result = await function(*args)
+                else:
+                    call = self.__pool.submit(function, *args)
+
+                    try:
+                        result = await asyncio.wrap_future(call, loop=self.__loop)
+                    except asyncio.CancelledError:
+                        # the coroutine returned once the handler was cancelled is closed, not leaked
+                        call.add_done_callback(_closeCoroutine)
+
+                        # a function already running keeps going, the preempting handler runs once it
+                        # has returned instead of alongside it, e.g. after the page it shows
+                        await _waitForCall(call, self.__loop)
+                        raise
+                    # end try-except
+                # end if
+
+                # a function may return a coroutine, e.g. a dispatcher calling a coroutine handler
+                if inspect.isawaitable(result):
+                    result = await result
+                # end if
+
+                return result
+            finally:
+                duration.observe(time.perf_counter() - start)
+            # end try-finally
+
+        # end with
+
+    # end def
+
+    async def __run(self, command, function, args, submitted):
+        rule = self.__rules.get(command, CONCURRENT)
+
+        if rule == PREEMPT:
+            await self.__preempt()
+            return await self.__call(command, function, args, submitted)
+        # end if
+
+        if rule == CONCURRENT:
+            return await self.__call(command, function, args, submitted)
+        # end if
+
+        task = asyncio.current_task()
+        self.__serialTasks.add(task)
+
+        try:
+            async with self.__serialLock:
+                return await self.__call(command, function, args, submitted)
+            # end with
+        finally:
+            self.__serialTasks.discard(task)
+        # end try-finally
+
+    # end def
+
+    def __finished(self, command: str, future: concurrent.futures.Future):
+        with self.__lock:
+            self.__pending -= 1
+        # end with
+
+        if future.cancelled():
+            self.__loggingService.warning(f"{command} handler cancelled")
+        elif future.exception():
+            self.__loggingService.error(
+                f"{command} handler failed: {future.exception()}"
+            )
+        # end if
+
+    # end def
+
+    def getStatistics(self) -> Dict[str, int]:
+        """
+        Returns the handlers submitted and not finished yet, the commands rejected because there were
+        too many of them and the SERIALIZED handlers cancelled by a PREEMPT command.
+        """
+        with self.__lock:
+            pending = self.__pending
+        # end with
+
+        return {
+            "pending": pending,
+            "rejectedCommands": int(self.__rejected.get()),
+            "preemptedCommands": int(self.__preempted.get()),
+        }
+
+    # end def
+
+    def shutdown(self) -> None:
+        """Stops the worker threads. Running functions are not interrupted, waiting ones are cancelled."""
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+
+    # end def
+
+    def submit(
+        self, command: str, function: Callable[..., Any], *args
+    ) -> Union[concurrent.futures.Future, None]:
+        """
+        Schedules the handler of a command and returns right away.
+
+        Args:
+            command (str): command whose rule applies.
+            function (Callable[..., Any]): the handler, a function or a coroutine function.
+            *args: arguments for the handler.
+
+        Returns:
+            Union[concurrent.futures.Future, None]: the handler's result, None if it was rejected.
+        """
+        with self.__lock:
+            if self.__pending >= self.__maxPending:
+                self.__rejected.inc()
+                self.__loggingService.error(
+                    f"{command} rejected, {self.__pending} handlers pending"
+                )
+                return None
+            # end if
+
+            self.__pending += 1
+        # end with
+
+        future = asyncio.run_coroutine_threadsafe(
+            self.__run(command, function, args, time.perf_counter()), self.__loop
+        )
+        future.add_done_callback(lambda f: self.__finished(command, f))
+
+        return future
+
+    # end def
+
+
+# end class
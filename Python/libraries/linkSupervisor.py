@@ -0,0 +1,228 @@
+import threading
+import time
+from libraries.loggerSetup import setup_logger
+from libraries.metrics import getRegistry
+from libraries.outbox import CONTROL_LANE
+from libraries.scheduler import getScheduler
+from typing import Any, Callable, Dict, List, Union
+
+# what happens to the queued messages while the port is reopened
+KEEP = "keep"
+DROP = "drop"
+KEEP_CONTROL = "keepControl"
+
+# the serial devices reopen their port with these settings unless configured otherwise
+RECONNECT_DEFAULTS = {
+    "initialDelay": 0.5,
+    "maxDelay": 30,
+    "factor": 2,
+    "whileDown": KEEP_CONTROL,
+}
+
+RTT_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+
+def keptLanes(policy: str) -> Union[List[str], None]:
+    """
+    Lanes whose messages are kept while the port is reopened, see outbox.pause.
+
+    Args:
+        policy (str): KEEP, every message is written once the port is open again. DROP, the messages
+            queued are dropped, and so are the ones queued until then. KEEP_CONTROL, only page changes
+            and other commands of the control lane are kept, values and waveform points are stale by
+            then.
+
+    Returns:
+        Union[List[str], None]: the lanes kept, None for every lane.
+    """
+    if policy == KEEP:
+        return None
+    elif policy == DROP:
+        return []
+    elif policy == KEEP_CONTROL:
+        return [CONTROL_LANE]
+    # end if
+
+    raise ValueError(f"Unknown policy for the queued messages: {policy}")
+
+
+# end def
+
+
+class backoff:
+    def __init__(
+        self, initialDelay: float = 0.5, maxDelay: float = 30, factor: float = 2
+    ) -> None:
+        """Delays between attempts to reopen a port, growing by factor up to maxDelay."""
+        self.initialDelay = initialDelay
+        self.maxDelay = maxDelay
+        self.factor = factor
+        self.attempts = 0
+
+    # end def
+
+    def next(self) -> float:
+        delay = min(self.maxDelay, self.initialDelay * self.factor**self.attempts)
+        self.attempts += 1
+
+        return delay
+
+    # end def
+
+    def reset(self) -> None:
+        self.attempts = 0
+
+    # end def
+
+
+# end class
+
+
+class linkSupervisor:
+    def __init__(
+        self,
+        device,
+        name: str,
+        probe: Union[str, bytes],
+        isResponse: Callable[[str, bytes], bool],
+        interval: float = 1,
+        stallWindow: float = 5,
+    ) -> None:
+        """
+        Watches the health of a serial link. Every interval the probe is sent and the time until its
+        response is the round trip time of the link. When a probe is not answered and nothing at all
+        is received for stallWindow seconds the link is stalled, and the device reopens its port.
+
+        Args:
+            device (Union[serialDevice, asyncSerialDevice]): the device watched.
+            name (str): device label of the metrics and name of the logger.
+            probe (Union[str, bytes]): message or encoded frame that the device answers.
+            isResponse (Callable[[str, bytes], bool]): True for the frame, of the given kind, that
+                answers the probe. The frames answering probes are not handed to the device's callbacks.
+            interval (float): seconds between probes.
+            stallWindow (float): seconds without an answer nor any frame before reconnecting.
+
+        Returns:
+            None
+        """
+        self.__loggingService = setup_logger(f"{name} supervisor")
+        self.__device = device
+        self.__probe = probe
+        self.__interval = interval
+        self.__stallWindow = stallWindow
+        self.__lock = threading.Lock()
+        self.__probeSent = None
+        self.lastRtt = None
+
+        registry = getRegistry()
+        self.__rtt = registry.histogram(
+            "serial_rtt_seconds",
+            "Time until a probe is answered",
+            RTT_BUCKETS,
+            device=name,
+        )
+        self.__stalls = registry.counter(
+            "serial_stalls_total",
+            "Probes not answered while nothing was received",
+            device=name,
+        )
+        self.__lostProbes = registry.counter(
+            "serial_lost_probes_total",
+            "Probes not answered while other frames were received",
+            device=name,
+        )
+
+        device.onProbeResponse(isResponse, self.__answered)
+
+        self.__identifier = f"{name} link supervisor"
+        getScheduler().schedule(self.__identifier, self.__check, interval)
+
+    # end def
+
+    def __answered(self, frame: bytes):
+        now = time.monotonic()
+
+        with self.__lock:
+            if self.__probeSent is None:
+                return
+            # end if
+
+            self.lastRtt = now - self.__probeSent
+            self.__probeSent = None
+        # end with
+
+        self.__rtt.observe(self.lastRtt)
+
+    # end def
+
+    def __check(self):
+        # runs in the scheduler's thread
+        now = time.monotonic()
+
+        with self.__lock:
+            if not self.__device.linkUp:
+                # the device is reopening its port, probes start again once it is open
+                self.__probeSent = None
+                return
+            # end if
+
+            if self.__probeSent is not None:
+                if now - self.__probeSent < self.__stallWindow:
+                    return
+                # end if
+
+                self.__probeSent = None
+
+                if now - self.__device.lastReceived >= self.__stallWindow:
+                    self.__stalls.inc()
+                    self.__loggingService.warning(
+                        f"nothing received for {self.__stallWindow} s, reconnecting"
+                    )
+                    self.__device.reconnect()
+                    return
+                # end if
+
+                self.__lostProbes.inc()
+            # end if
+
+            self.__probeSent = now
+        # end with
+
+        # the scheduler's other jobs must not wait for a stalled link, a probe that does not fit in
+        # its lane is dropped. It counts as unanswered, a link whose lane stays full is stalled too
+        if isinstance(self.__probe, bytes):
+            self.__device.sendFrame(self.__probe, block=False)
+        else:
+            self.__device.sendMessage(self.__probe, block=False)
+        # end if
+
+    # end def
+
+    def stop(self) -> None:
+        getScheduler().cancel(self.__identifier)
+
+    # end def
+
+
+# end class
+
+
+def createSupervisor(
+    device,
+    name: str,
+    settings: Dict[str, Any],
+    probe: Union[str, bytes],
+    isResponse: Callable[[str, bytes], bool],
+) -> linkSupervisor:
+    """Creates the supervisor of the device with the interval and stallWindow of the settings."""
+    return linkSupervisor(
+        device,
+        name,
+        probe,
+        isResponse,
+        settings.get("interval", 1),
+        settings.get("stallWindow", 5),
+    )
+
+
+# end def
@@ -1,13 +1,243 @@
+import atexit
+import collections
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Any, Deque, Dict, Tuple
+
+_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# settings of every logger, changed by configure_logging
+_settings: Dict[str, Any] = {
+    "level": "INFO",
+    "queueSize": 10000,
+    "rate": 5,
+    "burst": 20,
+    "repeatWindow": 10,
+    "ringBufferSize": 2000,
+    "dumpDirectory": "logs",
+}
+
+_lock = threading.Lock()
+_queueHandler = None
+_listener = None
+_rateLimit = None
+_ringBuffer = None
+
+
+class rateLimitFilter(logging.Filter):
+    def __init__(self, rate: float, burst: int, repeatWindow: float) -> None:
+        """
+        Limits the records of every call site, the file and line of the log call, with a token bucket
+        of burst records refilled at rate records per second. A site logging the same message again
+        within repeatWindow seconds is dropped too. The next record of the site tells how many were
+        dropped.
+
+        Args:
+            rate (float): records per second of every site.
+            burst (int): records a site may log at once.
+            repeatWindow (float): seconds during which a repeated message is dropped.
+
+        Returns:
+            None
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.repeatWindow = repeatWindow
+        # site: tokens, time of the last refill, last message, time it was logged, dropped records
+        self.__sites: Dict[Tuple[str, int], list] = {}
+        self.__lock = threading.Lock()
+
+    # end def
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        message = record.getMessage()
+
+        with self.__lock:
+            site = self.__sites.get((record.pathname, record.lineno))
+
+            if site is None:
+                site = [self.burst, now, None, 0.0, 0]
+                self.__sites[(record.pathname, record.lineno)] = site
+            # end if
+
+            site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+
+            repeated = message == site[2] and now - site[3] < self.repeatWindow
+
+            if repeated or site[0] < 1:
+                site[4] += 1
+                return False
+            # end if
+
+            site[0] -= 1
+            site[2] = message
+            site[3] = now
+            dropped = site[4]
+            site[4] = 0
+        # end with
+
+        if dropped:
+            record.msg = f"{message} ({dropped} similar records dropped)"
+            record.args = None
+        # end if
+
+        return True
+
+    # end def
+
+
+# end class
+
+
+class ringBufferHandler(logging.Handler):
+    def __init__(self, capacity: int) -> None:
+        """
+        Keeps the last capacity records, debug ones included, in memory. They are only formatted and
+        written when dump is called, e.g. after a failed test.
+        """
+        super().__init__(logging.DEBUG)
+        self.records: Deque[logging.LogRecord] = collections.deque(maxlen=capacity)
+
+    # end def
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # appending to a deque is thread safe, no lock is taken in the logging thread
+        self.records.append(record)
+
+    # end def
+
+    def dump(self, path: str) -> int:
+        """Writes the records kept so far to the file and returns how many were written."""
+        records = list(self.records)
+        formatter = logging.Formatter(_FORMAT)
+
+        with open(path, "w") as file:
+            for record in records:
+                file.write(formatter.format(record) + "\n")
+            # end for
+        # end with
+
+        return len(records)
+
+    # end def
+
+
+# end class
+
+
+class nonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the logging thread: records that do not fit in the queue are counted and dropped."""
+
+    def __init__(self, logQueue: queue.Queue) -> None:
+        super().__init__(logQueue)
+        self.dropped = 0
+
+    # end def
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.dropped:
+            dropped = self.dropped
+            notice = logging.makeLogRecord(
+                {
+                    "name": __name__,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": f"{dropped} records dropped, the log queue was full",
+                }
+            )
+
+            try:
+                self.queue.put_nowait(notice)
+                self.dropped -= dropped
+            except queue.Full:
+                pass
+            # end try-except
+        # end if
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        # end try-except
+
+    # end def
+
+
+# end class
+
+
+def _start() -> None:
+    # a single listener thread writes every record to the console
+    global _queueHandler, _listener, _rateLimit, _ringBuffer
+
+    consoleHandler = logging.StreamHandler()
+    consoleHandler.setFormatter(logging.Formatter(_FORMAT))
+
+    _rateLimit = rateLimitFilter(
+        _settings["rate"], _settings["burst"], _settings["repeatWindow"]
+    )
+    _queueHandler = nonBlockingQueueHandler(queue.Queue(_settings["queueSize"]))
+    _queueHandler.setLevel(_settings["level"])
+    _queueHandler.addFilter(_rateLimit)
+    _ringBuffer = ringBufferHandler(_settings["ringBufferSize"])
+
+    _listener = logging.handlers.QueueListener(_queueHandler.queue, consoleHandler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+# end def
+
+
+def configure_logging(settings: Dict[str, Any]) -> None:
+    """
+    Changes the settings of every logger, the ones already created included.
+
+    Args:
+        settings (Dict[str, Any]): optional keys level, the lowest level written to the console,
+            queueSize, rate and burst of every call site, repeatWindow in seconds, ringBufferSize,
+            the debug records kept in memory, and dumpDirectory, where they are written by
+            dump_recent_logs.
+
+    Returns:
+        None
+    """
+    with _lock:
+        _settings.update(settings)
+
+        if _queueHandler is not None:
+            _queueHandler.setLevel(_settings["level"])
+            _rateLimit.rate = _settings["rate"]
+            _rateLimit.burst = _settings["burst"]
+            _rateLimit.repeatWindow = _settings["repeatWindow"]
+
+            if _ringBuffer.records.maxlen != _settings["ringBufferSize"]:
+                _ringBuffer.records = collections.deque(
+                    _ringBuffer.records, maxlen=_settings["ringBufferSize"]
+                )
+            # end if
+        # end if
+    # end with
+
+
+# end def
 
 
 def setup_logger(name: str) -> logging.Logger:
     """
     Set up a logger with the specified name.
 
-    This function creates a logger with the given name, sets its logging level to INFO,
-    and attaches a StreamHandler with a specific formatter. If the logger already has handlers,
-    it avoids adding dupplicate handlers.
+    This function creates a logger with the given name, logging every level. The records are kept in
+    the ring buffer of recent records and, from the configured level on, queued to the listener
+    thread that writes them to the console, so logging never waits for the console. If the logger
+    already has handlers, it avoids adding dupplicate handlers.
 
     Args:
         name (str): The name of the logger.
@@ -15,18 +245,19 @@ def setup_logger(name: str) -> logging.Logger:
     Returns:
         logging.Logger: THe configured logger.
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    with _lock:
+        if _queueHandler is None:
+            _start()
+        # end if
+    # end with
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
-    console_handler.setFormatter(formatter)
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
 
     if not logger.handlers:
-        logger.addHandler(console_handler)
+        logger.addHandler(_queueHandler)
+        logger.addHandler(_ringBuffer)
 
     # end if
 
@@ -34,3 +265,44 @@ def setup_logger(name: str) -> logging.Logger:
 
 
 # end def
+
+
+def dump_recent_logs(reason: str) -> str:
+    """
+    Writes the recent records, debug ones included, to a file of the dump directory.
+
+    Args:
+        reason (str): why they are dumped, part of the file name, e.g. the failed run.
+
+    Returns:
+        str: path of the file, None when no logger was set up.
+    """
+    if _ringBuffer is None:
+        return None
+    # end if
+
+    directory = _settings["dumpDirectory"]
+    os.makedirs(directory, exist_ok=True)
+    safeReason = "".join(c if c.isalnum() or c in "-_" else "_" for c in reason)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{safeReason}.log")
+    _ringBuffer.dump(path)
+
+    return path
+
+
+# end def
+
+
+def stop_logging() -> None:
+    """Writes the records still queued and stops the listener thread."""
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        # end if
+    # end with
+
+
+# end def
@@ -0,0 +1,455 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from libraries.loggerSetup import setup_logger
+from typing import Any, Callable, Dict, List, Tuple
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+# seconds, from a serial write to a whole test step
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+DURATION_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+
+class counter:
+    def __init__(self) -> None:
+        """Value that only goes up. inc can be called from any thread."""
+        self.__lock = threading.Lock()
+        self.__value = 0
+
+    # end def
+
+    def inc(self, amount: float = 1) -> None:
+        with self.__lock:
+            self.__value += amount
+
+    # end def
+
+    def get(self) -> float:
+        return self.__value
+
+    # end def
+
+
+# end class
+
+
+class gauge:
+    def __init__(self) -> None:
+        """Value that goes up and down, or is read from a function when collected."""
+        self.__lock = threading.Lock()
+        self.__value = 0
+        self.__function = None
+
+    # end def
+
+    def inc(self, amount: float = 1) -> None:
+        with self.__lock:
+            self.__value += amount
+
+    # end def
+
+    def set(self, value: float) -> None:
+        self.__value = value
+
+    # end def
+
+    def setFunction(self, function: Callable[[], float]) -> None:
+        """The gauge reports what the function returns, e.g. the length of a queue."""
+        self.__function = function
+
+    # end def
+
+    def get(self) -> float:
+        function = self.__function
+
+        if function is not None:
+            try:
+                return function()
+            except Exception:
+                return math.nan
+            # end try-except
+        # end if
+
+        return self.__value
+
+    # end def
+
+
+# end class
+
+
+class histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Counts observations by upper bound. observe can be called from any thread."""
+        self.__lock = threading.Lock()
+        self.__bounds = tuple(sorted(buckets))
+        self.__counts = [0] * (len(self.__bounds) + 1)
+        self.__sum = 0.0
+
+    # end def
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.__bounds, value)
+
+        with self.__lock:
+            self.__counts[index] += 1
+            self.__sum += value
+
+    # end def
+
+    def time(self) -> "_timer":
+        """Context manager observing the seconds spent inside it."""
+        return _timer(self)
+
+    # end def
+
+    def get(self) -> Dict[str, Any]:
+        """Returns the cumulative count of every bucket, the count and the sum of the observations."""
+        with self.__lock:
+            counts = list(self.__counts)
+            total = self.__sum
+        # end with
+
+        cumulative = []
+        running = 0
+
+        for bound, count in zip(self.__bounds + (math.inf,), counts):
+            running += count
+            cumulative.append((bound, running))
+        # end for
+
+        return {"buckets": cumulative, "count": running, "sum": total}
+
+    # end def
+
+
+# end class
+
+
+class _timer:
+    def __init__(self, target: histogram) -> None:
+        self.__target = target
+        self.__start = 0.0
+
+    # end def
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    # end def
+
+    def __exit__(self, *args):
+        self.__target.observe(time.perf_counter() - self.__start)
+
+    # end def
+
+
+# end class
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# end def
+
+
+def _labelText(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+
+    if extra:
+        parts.append(extra)
+    # end if
+
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# end def
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    # end if
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# end def
+
+
+class metricsRegistry:
+    def __init__(self) -> None:
+        """
+        Metrics of the process by name and labels. Asking twice for the same name and labels returns
+        the same metric, so the services look them up once and keep them.
+        """
+        self.__lock = threading.Lock()
+        self.__families: Dict[str, Dict[str, Any]] = {}
+
+    # end def
+
+    def __get(self, kind, name, description, labels, factory):
+        key = tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+        with self.__lock:
+            family = self.__families.get(name)
+
+            if family is None:
+                family = {"type": kind, "help": description, "children": {}}
+                self.__families[name] = family
+            elif family["type"] != kind:
+                raise ValueError(f"{name} is already a {family['type']}")
+            # end if
+
+            metric = family["children"].get(key)
+
+            if metric is None:
+                metric = factory()
+                family["children"][key] = metric
+            # end if
+
+            return metric
+
+    # end def
+
+    def counter(self, name: str, description: str = "", **labels) -> counter:
+        return self.__get(COUNTER, name, description, labels, counter)
+
+    # end def
+
+    def gauge(self, name: str, description: str = "", **labels) -> gauge:
+        return self.__get(GAUGE, name, description, labels, gauge)
+
+    # end def
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+        **labels,
+    ) -> histogram:
+        return self.__get(
+            HISTOGRAM, name, description, labels, lambda: histogram(buckets)
+        )
+
+    # end def
+
+    def __collect(self) -> List[Tuple[str, Dict[str, Any], List[Tuple[Any, Any]]]]:
+        with self.__lock:
+            return [
+                (name, family, list(family["children"].items()))
+                for name, family in sorted(self.__families.items())
+            ]
+
+    # end def
+
+    def exposition(self) -> str:
+        """Returns every metric in the Prometheus text format."""
+        lines = []
+
+        for name, family, children in self.__collect():
+            if family["help"]:
+                lines.append(f"# HELP {name} {_escape(family['help'])}")
+            # end if
+
+            lines.append(f"# TYPE {name} {family['type']}")
+
+            for labels, metric in children:
+                if family["type"] != HISTOGRAM:
+                    lines.append(f"{name}{_labelText(labels)} {_number(metric.get())}")
+                    continue
+                # end if
+
+                value = metric.get()
+
+                for bound, count in value["buckets"]:
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{name}_bucket{_labelText(labels, le)} {count}")
+                # end for
+
+                lines.append(f"{name}_sum{_labelText(labels)} {_number(value['sum'])}")
+                lines.append(f"{name}_count{_labelText(labels)} {value['count']}")
+            # end for
+        # end for
+
+        return "\n".join(lines) + "\n"
+
+    # end def
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns every metric as a dictionary that can be dumped as JSON."""
+        metrics = {}
+
+        for name, family, children in self.__collect():
+            values = []
+
+            for labels, metric in children:
+                value = metric.get()
+
+                if family["type"] == HISTOGRAM:
+                    value = {
+                        "buckets": [
+                            [_number(bound), count] for bound, count in value["buckets"]
+                        ],
+                        "count": value["count"],
+                        "sum": value["sum"],
+                    }
+                elif isinstance(value, float) and math.isnan(value):
+                    value = None
+                # end if
+
+                values.append({"labels": dict(labels), "value": value})
+            # end for
+
+            metrics[name] = {"type": family["type"], "values": values}
+        # end for
+
+        return {"timestamp": time.time(), "metrics": metrics}
+
+    # end def
+
+
+# end class
+
+
+class metricsExporter:
+    def __init__(
+        self,
+        registry: metricsRegistry,
+        address: str = "127.0.0.1:9464",
+        snapshotPath: str = None,
+        snapshotPeriod: float = 60,
+    ) -> None:
+        """
+        Serves the registry in the Prometheus text format and writes JSON snapshots of it.
+
+        Args:
+            registry (metricsRegistry): metrics to export.
+            address (str): "host:port" for HTTP over TCP or "unix:/path" for HTTP over a unix socket.
+                Nothing is served if it is empty.
+            snapshotPath (str): file rewritten with a JSON snapshot every snapshotPeriod seconds.
+                No snapshots are written if it is None.
+            snapshotPeriod (float): seconds between snapshots.
+
+        Returns:
+            None
+        """
+        self.__loggingService = setup_logger("metrics")
+        self.__registry = registry
+        self.__server = None
+        self.__thread = None
+        self.__snapshotPath = snapshotPath
+        self.__snapshotThread = None
+        self.__stopSnapshots = threading.Event()
+
+        if address:
+            self.__server = self.__createServer(address)
+            self.__server.registry = registry
+            self.__thread = threading.Thread(
+                target=self.__server.serve_forever, name="metricsServer", daemon=True
+            )
+            self.__thread.start()
+            self.__loggingService.info(f"serving metrics at {address}")
+        # end if
+
+        if snapshotPath:
+            # written from a thread of its own, a slow SD card does not delay the scheduler's jobs
+            self.__snapshotThread = threading.Thread(
+                target=self.__writeSnapshots,
+                args=[snapshotPeriod],
+                name="metricsSnapshot",
+                daemon=True,
+            )
+            self.__snapshotThread.start()
+        # end if
+
+    # end def
+
+    def __writeSnapshots(self, period: float):
+        while not self.__stopSnapshots.wait(period):
+            self.writeSnapshot()
+        # end while
+
+    # end def
+
+    def __createServer(self, address: str):
+        # http.server is only imported by the stations that serve the metrics
+        from libraries.metricsServer import metricsHandler, tcpServer, unixServer
+
+        if address.startswith("unix:"):
+            path = address[len("unix:") :]
+
+            if os.path.exists(path):
+                os.unlink(path)
+            # end if
+
+            return unixServer(path, metricsHandler)
+        # end if
+
+        host, _, port = address.rpartition(":")
+
+        return tcpServer((host or "127.0.0.1", int(port)), metricsHandler)
+
+    # end def
+
+    def close(self) -> None:
+        """Stops the server and writes a last snapshot."""
+        if self.__snapshotThread is not None:
+            self.__stopSnapshots.set()
+            self.__snapshotThread.join(10)
+            self.writeSnapshot()
+            self.__snapshotThread = None
+        # end if
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__thread.join(5)
+
+            # unix sockets are bound to a path, TCP sockets to a (host, port) tuple
+            if isinstance(self.__server.server_address, str):
+                os.unlink(self.__server.server_address)
+            # end if
+
+            self.__server = None
+        # end if
+
+    # end def
+
+    def writeSnapshot(self) -> None:
+        """Writes the snapshot to a temporary file and renames it, readers never see half a file."""
+        temporary = f"{self.__snapshotPath}.tmp"
+
+        try:
+            with open(temporary, "w") as file:
+                json.dump(self.__registry.snapshot(), file)
+            # end with
+
+            os.replace(temporary, self.__snapshotPath)
+        except OSError as e:
+            self.__loggingService.error(f"metrics snapshot failed: {e}")
+        # end try-except
+
+    # end def
+
+
+# end class
+
+_registry = metricsRegistry()
+
+
+def getRegistry() -> metricsRegistry:
+    """Returns the registry shared by the whole process."""
+    return _registry
+
+
+# end def
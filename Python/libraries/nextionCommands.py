@@ -0,0 +1,133 @@
+from typing import Dict, Tuple
+
+# every nextion instruction ends with three 0xff bytes
+TERMINATOR = b"\xff\xff\xff"
+
+
+def _frame(command: str) -> bytes:
+    return command.encode("utf-8") + TERMINATOR
+
+
+# end def
+
+
+# instructions sent all the time, encoded once when the module is imported. PAGE[n] shows page n
+PAGE: Tuple[bytes, ...] = tuple(_frame(f"page {number}") for number in range(11))
+CLEAR_WAVEFORM = _frame("cle 2,255")
+HANDSHAKE = _frame("timeoutTMR.en=1")
+CLEAR_ERROR_MESSAGE = _frame('errorMsg.txt=""')
+ERROR_TITLE = _frame('xstr 34,19,250,35,0,WHITE,0,1,1,0,"Error"')
+# the nextion answers get with the numeric data return code, 0x71, and the value in 4 bytes
+GET_PAGE = _frame("get dp")
+NUMERIC_DATA = 0x71
+
+# the string api looks the constants up instead of encoding them again
+_ENCODED: Dict[str, bytes] = {
+    frame[: -len(TERMINATOR)].decode("utf-8"): frame
+    for frame in PAGE
+    + (CLEAR_WAVEFORM, HANDSHAKE, CLEAR_ERROR_MESSAGE, ERROR_TITLE, GET_PAGE)
+}
+
+
+def encodeInto(buffer: bytearray, command: str) -> None:
+    """Appends the command and its terminator to the buffer, without encoding the constants again."""
+    frame = _ENCODED.get(command)
+
+    if frame is not None:
+        buffer += frame
+    else:
+        buffer += command.encode("utf-8")
+        buffer += TERMINATOR
+    # end if
+
+
+# end def
+
+
+class commandBuilder:
+    def __init__(self) -> None:
+        """
+        Writes nextion instructions, terminators included, into a bytearray that is reused after
+        every frame. The frame of several instructions is queued and written at once, e.g.
+
+            builder.page(6).text(b"errorMsg.txt", "").raw(ERROR_TITLE)
+            device.sendFrame(builder.frame())
+
+        It is not thread safe, every thread needs its own builder.
+        """
+        self.__buffer = bytearray()
+        self.__commands = 0
+
+    # end def
+
+    def __len__(self) -> int:
+        return self.__commands
+
+    # end def
+
+    def command(self, command: str) -> "commandBuilder":
+        """Any instruction given as a string."""
+        encodeInto(self.__buffer, command)
+        self.__commands += 1
+
+        return self
+
+    # end def
+
+    def frame(self) -> bytes:
+        """Returns the instructions written so far and empties the builder."""
+        frame = bytes(self.__buffer)
+        self.__buffer.clear()
+        self.__commands = 0
+
+        return frame
+
+    # end def
+
+    def page(self, number: int) -> "commandBuilder":
+        return self.raw(PAGE[number])
+
+    # end def
+
+    def raw(self, frame: bytes) -> "commandBuilder":
+        """An instruction already encoded with its terminator, e.g. one of the constants."""
+        self.__buffer += frame
+        self.__commands += 1
+
+        return self
+
+    # end def
+
+    def text(self, attribute: bytes, value: str) -> "commandBuilder":
+        """Text attribute assignment, e.g. text(b"t0.txt", "1") writes t0.txt="1"."""
+        self.__buffer += attribute
+        self.__buffer += b'="'
+        self.__buffer += value.encode("utf-8")
+        self.__buffer += b'"'
+        self.__buffer += TERMINATOR
+        self.__commands += 1
+
+        return self
+
+    # end def
+
+    def value(self, attribute: bytes, value: int) -> "commandBuilder":
+        """Numeric attribute assignment, e.g. value(b"n0.val", 3) writes n0.val=3."""
+        self.__buffer += b"%b=%d\xff\xff\xff" % (attribute, value)
+        self.__commands += 1
+
+        return self
+
+    # end def
+
+    def waveform(self, waveId: int, channel: int, value: int) -> "commandBuilder":
+        """Adds a point to a waveform channel, the add instruction."""
+        self.__buffer += b"add %d,%d,%d\xff\xff\xff" % (waveId, channel, value)
+        self.__commands += 1
+
+        return self
+
+    # end def
+
+
+# end class
@@ -0,0 +1,137 @@
+from collections import Counter
+from typing import Any, Callable, Dict, List, NamedTuple, Union
+
+# parameters holding the id of a nextion component, 0 to 255, e.g. the waveform of the loading animation
+_COMPONENT_ID_PARAMS = {"waveid"}
+
+
+class commandEvent(NamedTuple):
+    """
+    Frame sent by the HMI, e.g. "page2;waveId=2\\r\\n".
+
+    command: text before the first ";".
+    params: key=value parameters, keys in lower case. Component ids, e.g. waveid, are ints.
+    args: parameters without "=" and malformed ones.
+    raw: the frame as received.
+    """
+
+    command: str
+    params: Dict[str, Union[str, int]]
+    args: List[str]
+    raw: str
+
+
+# end class
+
+
+def parseFrame(raw: str) -> commandEvent:
+    """
+    Parses a frame into a command event. It never raises, malformed parameters are kept in args.
+
+    Args:
+        raw (str): frame received, with or without its terminator.
+
+    Returns:
+        commandEvent: the parsed frame. command is empty if the frame is empty.
+    """
+    parts = raw.strip().split(";")
+    params = {}
+    args = []
+
+    for part in parts[1:]:
+        key, separator, value = part.partition("=")
+        key = key.strip()
+
+        if separator and key:
+            key = key.lower()
+            value = value.strip()
+
+            if key in _COMPONENT_ID_PARAMS:
+                value = _componentId(value)
+
+                if value is None:
+                    # e.g. "waveId=" or "waveId=b2", ignored instead of failing in the handler
+                    args.append(part.strip())
+                    continue
+                # end if
+            # end if
+
+            params[key] = value
+        elif part.strip():
+            args.append(part.strip())
+        # end if
+    # end for
+
+    return commandEvent(parts[0].strip(), params, args, raw)
+
+
+# end def
+
+
+def _componentId(value: str) -> Union[int, None]:
+    # the id of a nextion component, None when the value is not one
+    if not (value.isascii() and value.isdigit()):
+        return None
+    # end if
+
+    componentId = int(value)
+
+    return componentId if componentId <= 255 else None
+
+
+# end def
+
+
+class dispatcher:
+    def __init__(self, handlers: Dict[str, Callable[[commandEvent], Any]] = None):
+        """
+        Table mapping every command to its handler.
+
+        Args:
+            handlers (Dict[str, Callable[[commandEvent], Any]]): handler of every command.
+
+        Returns:
+            None
+        """
+        self.__handlers = dict(handlers) if handlers else {}
+        self.unknownCommands = Counter()
+        self.dispatchedCommands = Counter()
+
+    # end def
+
+    def __contains__(self, command: str) -> bool:
+        return command in self.__handlers
+
+    # end def
+
+    def dispatch(self, frame: Union[str, commandEvent]) -> Any:
+        """
+        Calls the handler of the frame's command with the parsed event.
+
+        Args:
+            frame (Union[str, commandEvent]): raw frame or already parsed event.
+
+        Returns:
+            Any: what the handler returned, None for unknown commands.
+        """
+        event = frame if isinstance(frame, commandEvent) else parseFrame(frame)
+        handler = self.__handlers.get(event.command)
+
+        if handler is None:
+            self.unknownCommands[event.command] += 1
+            return None
+        # end if
+
+        self.dispatchedCommands[event.command] += 1
+
+        return handler(event)
+
+    # end def
+
+    def register(self, command: str, handler: Callable[[commandEvent], Any]) -> None:
+        self.__handlers[command] = handler
+
+    # end def
+
+
+# end class
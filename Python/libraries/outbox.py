@@ -0,0 +1,355 @@
+import re
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Union
+
+# component attribute assignments (e.g. hourTxt.txt="12") are idempotent, only the latest value matters
+_ASSIGNMENT = re.compile(r"^([A-Za-z_][\w.]*\.\w+)=")
+
+# lanes, written in this order
+CONTROL_LANE = "control"
+TEXT_LANE = "text"
+WAVEFORM_LANE = "waveform"
+
+# what put does when the lane is full
+BLOCK = "block"
+DROP_OLDEST = "dropOldest"
+DROP_NEWEST = "dropNewest"
+
+# page changes and other commands go first, component values next and waveform points last.
+# Points are cosmetic so they are dropped instead of blocking the caller. The display queues the
+# points of an animation step as a single frame, 8 frames are the 32 points of 8 steps
+NEXTION_LANES = {
+    CONTROL_LANE: {"maxsize": 100, "policy": BLOCK},
+    TEXT_LANE: {"maxsize": 100, "policy": DROP_OLDEST},
+    WAVEFORM_LANE: {"maxsize": 8, "policy": DROP_OLDEST},
+}
+
+
+def nextionLane(message: str) -> str:
+    """Returns the lane of a nextion instruction."""
+    if message.startswith("add "):
+        return WAVEFORM_LANE
+    elif _ASSIGNMENT.match(message):
+        return TEXT_LANE
+    # end if
+
+    return CONTROL_LANE
+
+
+# end def
+
+
+class _lane:
+    def __init__(self, maxsize: int, policy: str) -> None:
+        if policy not in [BLOCK, DROP_OLDEST, DROP_NEWEST]:
+            raise ValueError(f"Unknown lane policy: {policy}")
+        # end if
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.messages = deque()
+        self.pendingKeys = {}
+        self.maxDepth = 0
+        self.dropped = 0
+        self.blocked = 0
+
+    # end def
+
+    def full(self) -> bool:
+        return self.maxsize > 0 and len(self.messages) >= self.maxsize
+
+    # end def
+
+
+# end class
+
+
+class outbox:
+    def __init__(
+        self,
+        maxsize: int = 100,
+        coalesce: bool = False,
+        terminationSize: int = 0,
+        lanes: Dict[str, Dict[str, Any]] = None,
+        classify: Callable[[str], str] = nextionLane,
+    ) -> None:
+        """
+        Queue of messages waiting to be written to a serial device. A message is either a string or
+        a frame already encoded with its terminators, see sendFrame.
+
+        Without lanes every message goes to a single lane of maxsize messages that blocks when full.
+        With lanes the messages are written by strict priority: all the messages of a lane before the
+        ones of the next lane, keeping their order inside the lane.
+
+        Args:
+            maxsize (int): Pending messages allowed before put blocks the caller. Unbounded if lower than 1.
+                Not used when there are lanes.
+            coalesce (bool): When True an assignment to a component attribute replaces the value still unsent
+                for the same attribute. Ordering is kept for every other command, assignments are never
+                coalesced across them.
+            terminationSize (int): Bytes appended to every message when written. Used for the statistics.
+            lanes (Dict[str, Dict[str, Any]]): maxsize and policy (BLOCK, DROP_OLDEST or DROP_NEWEST) of
+                every lane, by priority. e.g. NEXTION_LANES.
+            classify (Callable[[str], str]): returns the lane of a message. Only used when there are lanes.
+
+        Returns:
+            None
+        """
+        if lanes:
+            self.__lanes = {
+                name: _lane(lane.get("maxsize", 0), lane.get("policy", BLOCK))
+                for name, lane in lanes.items()
+            }
+            self.__classify = classify
+        else:
+            self.__lanes = {CONTROL_LANE: _lane(maxsize, BLOCK)}
+            self.__classify = lambda message: CONTROL_LANE
+        # end if
+
+        self.__hasLanes = bool(lanes)
+
+        self.__coalesce = coalesce
+        self.__terminationSize = terminationSize
+        self.__size = 0
+        self.__condition = threading.Condition()
+        self.__closed = False
+        # while the link is down nothing is written, the lanes not kept drop their messages
+        self.__paused = False
+        self.__discarding = set()
+
+        self.coalescedMessages = 0
+        self.coalescedBytes = 0
+
+    # end def
+
+    def __key(self, message: Union[str, bytes]) -> Union[str, None]:
+        # encoded frames are never coalesced
+        if not self.__coalesce or isinstance(message, bytes):
+            return None
+        # end if
+
+        match = _ASSIGNMENT.match(message)
+
+        return match.group(1) if match else None
+
+    # end def
+
+    def __dropOldest(self, lane: _lane):
+        entry = lane.messages.popleft()
+        lane.dropped += 1
+        self.__size -= 1
+
+        if entry[0] is not None and lane.pendingKeys.get(entry[0]) is entry:
+            del lane.pendingKeys[entry[0]]
+        # end if
+
+    # end def
+
+    def close(self) -> None:
+        """Wakes up every thread waiting on the outbox. Following gets return an empty list."""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    # end def
+
+    def getAll(self, block: bool = True) -> List[Union[str, bytes]]:
+        """
+        Blocks until there are messages queued and returns all of them in writing order.
+
+        Args:
+            block (bool): when False returns right away even if there are no messages.
+
+        Returns:
+            List[Union[str, bytes]]: queued messages. Empty if the outbox was closed, or paused and
+                block is False.
+        """
+        with self.__condition:
+            while block and (self.__size == 0 or self.__paused) and not self.__closed:
+                self.__condition.wait()
+            # end while
+
+            if self.__paused:
+                return []
+            # end if
+
+            messages = []
+
+            for lane in self.__lanes.values():
+                messages.extend(entry[1] for entry in lane.messages)
+                lane.messages.clear()
+                lane.pendingKeys.clear()
+            # end for
+
+            self.__size = 0
+            self.__condition.notify_all()
+
+            return messages
+
+    # end def
+
+    def getStatistics(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns, for every lane, the messages queued, the most ever queued, the messages dropped
+        and how many times put had to wait for room.
+        """
+        with self.__condition:
+            return {
+                name: {
+                    "queued": len(lane.messages),
+                    "maxDepth": lane.maxDepth,
+                    "dropped": lane.dropped,
+                    "blocked": lane.blocked,
+                }
+                for name, lane in self.__lanes.items()
+            }
+
+    # end def
+
+    def pause(self, keep: List[str] = None) -> int:
+        """
+        Stops handing messages to the writer, e.g. while the port is reopened. The messages of the
+        lanes not kept are dropped, and so are the ones queued to them until resume is called.
+
+        Args:
+            keep (List[str]): lanes whose messages are kept and written after resume. Every lane
+                when None.
+
+        Returns:
+            int: messages dropped.
+        """
+        with self.__condition:
+            self.__paused = True
+            dropped = 0
+
+            for name, lane in self.__lanes.items():
+                if keep is None or name in keep:
+                    continue
+                # end if
+
+                self.__discarding.add(name)
+                dropped += len(lane.messages)
+                lane.dropped += len(lane.messages)
+                self.__size -= len(lane.messages)
+                lane.messages.clear()
+                lane.pendingKeys.clear()
+            # end for
+
+            # callers waiting for room in a lane now dropped go on
+            self.__condition.notify_all()
+
+            return dropped
+
+    # end def
+
+    def resume(self) -> None:
+        """Hands the messages kept while paused to the writer."""
+        with self.__condition:
+            self.__paused = False
+            self.__discarding.clear()
+            self.__condition.notify_all()
+
+    # end def
+
+    def put(
+        self, message: Union[str, bytes], lane: str = None, block: bool = True
+    ) -> bool:
+        """
+        Queues a message.
+
+        Args:
+            message (Union[str, bytes]): instruction, or encoded frame of one or more instructions.
+            lane (str): lane of the message, classified when None. Frames can not be classified, they
+                go to the control lane unless given. Ignored when the outbox has no lanes.
+            block (bool): False drops the message instead of waiting for room in a BLOCK lane.
+
+        Returns:
+            bool: False if the message was dropped, either by its lane's DROP_NEWEST policy, because
+                its BLOCK lane was full and block is False, because the outbox was closed while waiting
+                for room or because the lane is not kept while paused.
+        """
+        with self.__condition:
+            if not self.__hasLanes:
+                name = CONTROL_LANE
+            elif lane is not None:
+                name = lane
+            elif isinstance(message, bytes):
+                name = CONTROL_LANE
+            else:
+                name = self.__classify(message)
+            # end if
+
+            lane = self.__lanes.get(name)
+
+            if lane is None:
+                raise KeyError(f"No lane {name} for message: {message}")
+            # end if
+
+            if name in self.__discarding:
+                lane.dropped += 1
+                return False
+            # end if
+
+            key = self.__key(message)
+
+            if key is not None and key in lane.pendingKeys:
+                entry = lane.pendingKeys[key]
+                self.coalescedMessages += 1
+                self.coalescedBytes += (
+                    len(entry[1].encode("utf-8")) + self.__terminationSize
+                )
+                entry[1] = message
+                return True
+            # end if
+
+            if lane.full():
+                if lane.policy == DROP_NEWEST or (lane.policy == BLOCK and not block):
+                    lane.dropped += 1
+                    return False
+                elif lane.policy == DROP_OLDEST:
+                    self.__dropOldest(lane)
+                else:
+                    lane.blocked += 1
+
+                    while (
+                        lane.full()
+                        and not self.__closed
+                        and name not in self.__discarding
+                    ):
+                        self.__condition.wait()
+                    # end while
+
+                    if self.__closed or name in self.__discarding:
+                        lane.dropped += 1
+                        return False
+                    # end if
+                # end if
+            # end if
+
+            entry = [key, message]
+            lane.messages.append(entry)
+            lane.maxDepth = max(lane.maxDepth, len(lane.messages))
+            self.__size += 1
+
+            if key is None:
+                # nothing queued before a non idempotent command can be replaced after it
+                lane.pendingKeys.clear()
+            else:
+                lane.pendingKeys[key] = entry
+            # end if
+
+            self.__condition.notify_all()
+
+            return True
+
+    # end def
+
+    def qsize(self) -> int:
+        with self.__condition:
+            return self.__size
+
+    # end def
+
+
+# end class
@@ -0,0 +1,382 @@
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from libraries.loggerSetup import setup_logger
+from typing import Any, Dict, List, Tuple, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    runId TEXT PRIMARY KEY,
+    dut TEXT,
+    started REAL NOT NULL,
+    finished REAL,
+    passed INTEGER,
+    failedStep TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    runId TEXT NOT NULL,
+    step TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    passed INTEGER NOT NULL,
+    detail TEXT
+);
+CREATE TABLE IF NOT EXISTS gpioSnapshots (
+    runId TEXT NOT NULL,
+    step TEXT NOT NULL,
+    taken REAL NOT NULL,
+    levels INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flashes (
+    runId TEXT,
+    program TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL,
+    stderr TEXT
+);
+CREATE INDEX IF NOT EXISTS runsByStart ON runs (started);
+CREATE INDEX IF NOT EXISTS runsByFailedStep ON runs (failedStep) WHERE passed = 0;
+CREATE INDEX IF NOT EXISTS stepsByRun ON steps (runId);
+CREATE INDEX IF NOT EXISTS stepsByDuration ON steps (step, duration, started);
+CREATE INDEX IF NOT EXISTS snapshotsByRun ON gpioSnapshots (runId);
+CREATE INDEX IF NOT EXISTS flashesByRun ON flashes (runId);
+"""
+
+_STOP = None
+
+# runs the device under test did not finish, left out of the yield and the failures. Before the
+# harness check became a step of the device's run it was recorded as a run with "harness" as dut
+_TESTED_RUNS = """
+    passed IS NOT NULL
+    AND COALESCE(failedStep, '') NOT IN ('abandoned', 'cancelled')
+    AND COALESCE(dut, '') != 'harness'
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=10)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+
+    return connection
+
+
+# end def
+
+
+class resultsStore:
+    def __init__(
+        self, path: str, batchSize: int = 200, flushInterval: float = 0.5
+    ) -> None:
+        """
+        Append only store of the test runs, kept in a SQLite database in WAL mode.
+
+        The record methods only queue the rows and return, a background thread writes them in
+        batches of up to batchSize rows per commit, waiting at most flushInterval seconds for a
+        batch to fill up. The test never waits for the disk.
+
+        Args:
+            path (str): database file, created if it does not exist.
+            batchSize (int): rows written per transaction at most.
+            flushInterval (float): seconds a row may wait for more rows before being written.
+
+        Returns:
+            None
+        """
+        self.__loggingService = setup_logger("results")
+        self.__path = path
+        self.__batchSize = batchSize
+        self.__flushInterval = flushInterval
+        self.__rows = queue.SimpleQueue()
+
+        # the schema is created before returning so that queries work right away
+        connection = _connect(path)
+        connection.executescript(_SCHEMA)
+        connection.close()
+
+        self.__thread = threading.Thread(
+            target=self.__write, name="resultsWriter", daemon=True
+        )
+        self.__thread.start()
+
+    # end def
+
+    def __write(self):
+        connection = _connect(self.__path)
+        running = True
+
+        while running:
+            batch = [self.__rows.get()]
+            deadline = time.monotonic() + self.__flushInterval
+
+            while len(batch) < self.__batchSize:
+                remaining = deadline - time.monotonic()
+
+                try:
+                    batch.append(
+                        self.__rows.get(timeout=remaining)
+                        if remaining > 0
+                        else self.__rows.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                # end try-except
+            # end while
+
+            if _STOP in batch:
+                running = False
+                batch = [row for row in batch if row is not _STOP]
+            # end if
+
+            try:
+                with connection:
+                    for statement, parameters in batch:
+                        connection.execute(statement, parameters)
+                    # end for
+                # end with
+            except sqlite3.Error as e:
+                self.__loggingService.error(
+                    f"{len(batch)} results were not written: {e}"
+                )
+            # end try-except
+        # end while
+
+        connection.close()
+
+    # end def
+
+    def close(self) -> None:
+        """Writes the rows still queued and stops the writer."""
+        self.__rows.put(_STOP)
+        self.__thread.join(10)
+
+    # end def
+
+    def finishRun(
+        self, runId: str, passed: bool, failedStep: Union[str, None] = None
+    ) -> None:
+        self.__rows.put(
+            (
+                "UPDATE runs SET finished = ?, passed = ?, failedStep = ? WHERE runId = ?",
+                (time.time(), int(passed), failedStep, runId),
+            )
+        )
+
+    # end def
+
+    def recordFlash(
+        self,
+        runId: Union[str, None],
+        program: str,
+        attempt: int,
+        started: float,
+        duration: float,
+        success: bool,
+        stderr: str = "",
+    ) -> None:
+        self.__rows.put(
+            (
+                "INSERT INTO flashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (runId, program, attempt, started, duration, int(success), stderr),
+            )
+        )
+
+    # end def
+
+    def recordGpio(self, runId: str, step: str, levels: int) -> None:
+        self.__rows.put(
+            (
+                "INSERT INTO gpioSnapshots VALUES (?, ?, ?, ?)",
+                (runId, step, time.time(), levels),
+            )
+        )
+
+    # end def
+
+    def recordStep(
+        self,
+        runId: str,
+        step: str,
+        started: float,
+        duration: float,
+        passed: bool,
+        detail: Union[str, None] = None,
+    ) -> None:
+        """
+        Records a test step.
+
+        Args:
+            runId (str): run returned by startRun.
+            step (str): name of the step, e.g. the page.
+            started (float): epoch seconds when the step started.
+            duration (float): seconds the step took.
+            passed (bool): result of the step.
+            detail (str): optional description, e.g. why it failed.
+
+        Returns:
+            None
+        """
+        self.__rows.put(
+            (
+                "INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?)",
+                (runId, step, started, duration, int(passed), detail),
+            )
+        )
+
+    # end def
+
+    def startRun(self, dut: Union[str, None] = None) -> str:
+        """Records a new run of a device under test and returns its id."""
+        runId = uuid.uuid4().hex
+        self.__rows.put(
+            (
+                "INSERT INTO runs (runId, dut, started) VALUES (?, ?, ?)",
+                (runId, dut, time.time()),
+            )
+        )
+
+        return runId
+
+    # end def
+
+
+# end class
+
+
+class resultsQuery:
+    def __init__(self, path: str) -> None:
+        """Read only queries over a results database, they can run while the station writes it."""
+        self.__connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    # end def
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    # end def
+
+    def failurePareto(
+        self, since: float = 0, limit: int = 10
+    ) -> List[Tuple[str, int, float]]:
+        """
+        Returns the steps that failed the most runs, from the most to the least. Runs cancelled by
+        the operator or abandoned are not failures.
+
+        Returns:
+            List[Tuple[str, int, float]]: step, failed runs and cumulative percentage of the failures.
+        """
+        rows = self.__connection.execute(
+            f"""
+            SELECT failedStep, COUNT(*) AS failures
+            FROM runs
+            WHERE passed = 0 AND started >= ? AND {_TESTED_RUNS}
+            GROUP BY failedStep
+            ORDER BY failures DESC
+            """,
+            (since,),
+        ).fetchall()
+
+        total = sum(failures for _, failures in rows)
+        pareto = []
+        cumulative = 0
+
+        for step, failures in rows[:limit]:
+            cumulative += failures
+            pareto.append((step, failures, 100 * cumulative / total))
+        # end for
+
+        return pareto
+
+    # end def
+
+    def runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Returns the latest runs."""
+        cursor = self.__connection.execute(
+            "SELECT * FROM runs ORDER BY started DESC LIMIT ?", (limit,)
+        )
+        names = [column[0] for column in cursor.description]
+
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    # end def
+
+    def stepDurations(
+        self, since: float = 0, percentiles: Tuple[int, ...] = (50, 95)
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the duration percentiles of every step in seconds, by nearest rank.
+
+        Returns:
+            Dict[str, Dict[str, float]]: e.g. {"page2": {"count": 120, "p50": 3.1, "p95": 4.0}}.
+        """
+        durations = {}
+        steps = self.__connection.execute("SELECT DISTINCT step FROM steps").fetchall()
+
+        # every rank is read walking the covering (step, duration, started) index in order
+        for (step,) in steps:
+            (count,) = self.__connection.execute(
+                "SELECT COUNT(*) FROM steps WHERE step = ? AND started >= ?",
+                (step, since),
+            ).fetchone()
+
+            if count == 0:
+                continue
+            # end if
+
+            durations[step] = {"count": count}
+
+            for percentile in percentiles:
+                rank = max(1, (count * percentile + 99) // 100)
+                (durations[step][f"p{percentile}"],) = self.__connection.execute(
+                    """
+                    SELECT duration FROM steps
+                    WHERE step = ? AND started >= ?
+                    ORDER BY duration
+                    LIMIT 1 OFFSET ?
+                    """,
+                    (step, since, rank - 1),
+                ).fetchone()
+            # end for
+        # end for
+
+        return durations
+
+    # end def
+
+    def yieldRate(self, since: float = 0) -> Dict[str, Any]:
+        """
+        Returns the runs that tested a device, the ones that passed and the percentage that passed.
+        Runs cancelled by the operator or abandoned are only counted as interrupted.
+        """
+        total, passed = self.__connection.execute(
+            f"""
+            SELECT COUNT(*), COALESCE(SUM(passed), 0)
+            FROM runs
+            WHERE started >= ? AND {_TESTED_RUNS}
+            """,
+            (since,),
+        ).fetchone()
+        (interrupted,) = self.__connection.execute(
+            """
+            SELECT COUNT(*)
+            FROM runs
+            WHERE passed = 0 AND started >= ? AND failedStep IN ('abandoned', 'cancelled')
+            """,
+            (since,),
+        ).fetchone()
+
+        return {
+            "runs": total,
+            "passed": passed,
+            "yield": 100 * passed / total if total > 0 else 0.0,
+            "interrupted": interrupted,
+        }
+
+    # end def
+
+
+# end class
@@ -0,0 +1,266 @@
+import heapq
+import threading
+import time
+from libraries.loggerSetup import setup_logger
+from typing import Any, Callable, Dict, Union
+
+FIXED_RATE = "fixedRate"
+FIXED_DELAY = "fixedDelay"
+
+
+class scheduler:
+    def __init__(self, name: str = "scheduler") -> None:
+        """
+        Runs periodic callbacks from a single thread.
+
+        Callbacks are kept in a heap ordered by deadline and the thread sleeps until the nearest one,
+        adding or cancelling a callback wakes it up. Callbacks run in the scheduler's thread so they
+        must not block.
+
+        Args:
+            name (str): name of the thread and the logger.
+
+        Returns:
+            None
+        """
+        self.__loggingService = setup_logger(name)
+        self.__condition = threading.Condition()
+        self.__heap = []
+        self.__entries: Dict[str, Dict[str, Any]] = {}
+        self.__sequence = 0
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__thread.start()
+
+    # end def
+
+    def __run(self):
+        self.__loggingService.info("scheduler started")
+
+        while True:
+            with self.__condition:
+                while self.__running:
+                    if len(self.__heap) == 0:
+                        self.__condition.wait()
+                        continue
+                    # end if
+
+                    deadline, _, identifier, entry = self.__heap[0]
+
+                    # the entry was cancelled or rescheduled, its heap item is stale
+                    if self.__entries.get(identifier) is not entry or (
+                        entry["deadline"] != deadline
+                    ):
+                        heapq.heappop(self.__heap)
+                        continue
+                    # end if
+
+                    remaining = deadline - time.monotonic()
+
+                    if remaining <= 0:
+                        heapq.heappop(self.__heap)
+                        break
+                    # end if
+
+                    self.__condition.wait(remaining)
+                # end while
+
+                if not self.__running:
+                    break
+                # end if
+            # end with
+
+            start = time.monotonic()
+            self.__record(entry, start - deadline)
+
+            try:
+                entry["callback"]()
+            except Exception as e:
+                self.__loggingService.error(f"{identifier} failed: {e}")
+            # end try-except
+
+            finished = time.monotonic()
+
+            with self.__condition:
+                # the callback may have been cancelled while running
+                if self.__entries.get(identifier) is entry:
+                    if entry["mode"] == FIXED_RATE:
+                        # keeping the original grid, periods already missed are skipped
+                        nextDeadline = deadline + entry["period"]
+
+                        if nextDeadline <= finished:
+                            missed = int((finished - deadline) // entry["period"])
+                            entry["statistics"]["overruns"] += missed
+                            nextDeadline = deadline + (missed + 1) * entry["period"]
+                        # end if
+                    else:
+                        nextDeadline = finished + entry["period"]
+                    # end if
+
+                    self.__push(identifier, entry, nextDeadline)
+                # end if
+            # end with
+        # end while
+
+        self.__loggingService.warning("scheduler finished")
+
+    # end def
+
+    def __push(self, identifier: str, entry: Dict[str, Any], deadline: float):
+        entry["deadline"] = deadline
+        self.__sequence += 1
+        heapq.heappush(self.__heap, (deadline, self.__sequence, identifier, entry))
+        self.__condition.notify()
+
+    # end def
+
+    def __record(self, entry: Dict[str, Any], jitter: float):
+        statistics = entry["statistics"]
+        statistics["runs"] += 1
+        statistics["totalJitter"] += jitter
+        statistics["maxJitter"] = max(statistics["maxJitter"], jitter)
+
+    # end def
+
+    def cancel(self, identifier: str) -> bool:
+        """
+        Cancels the callback. It is not called again even if its deadline already passed.
+
+        Returns:
+            bool: False if there was no callback with the identifier.
+        """
+        with self.__condition:
+            entry = self.__entries.pop(identifier, None)
+            self.__condition.notify()
+
+        return entry is not None
+
+    # end def
+
+    def getStatistics(self, identifier: str) -> Union[Dict[str, float], None]:
+        """
+        Returns how many times the callback ran, how late it was in average and at most in seconds
+        and how many periods were skipped because it ran late.
+        """
+        with self.__condition:
+            entry = self.__entries.get(identifier)
+
+            if entry is None:
+                return None
+            # end if
+
+            statistics = entry["statistics"]
+            runs = statistics["runs"]
+
+            return {
+                "runs": runs,
+                "meanJitter": statistics["totalJitter"] / runs if runs > 0 else 0,
+                "maxJitter": statistics["maxJitter"],
+                "overruns": statistics["overruns"],
+            }
+
+    # end def
+
+    def schedule(
+        self,
+        identifier: str,
+        callback: Callable[[], Any],
+        period: float,
+        mode: str = FIXED_DELAY,
+        delay: float = 0,
+    ) -> None:
+        """
+        Calls the callback periodically.
+
+        Args:
+            identifier (str): name of the callback. *This identifier can be used later to cancel it*.
+            callback (Callable[[], Any]): the function to call.
+            period (float): seconds between calls.
+            mode (str): FIXED_RATE keeps the calls on a fixed grid no matter how long they take.
+                FIXED_DELAY waits the period after every call finishes.
+            delay (float): seconds to wait before the first call.
+
+        Returns:
+            None
+        """
+        if mode not in [FIXED_RATE, FIXED_DELAY]:
+            raise ValueError(f"Unknown scheduling mode: {mode}")
+        # end if
+
+        if period <= 0:
+            raise ValueError("period must be greater than 0")
+        # end if
+
+        with self.__condition:
+            if identifier in self.__entries:
+                raise KeyError("Repeted key value")
+            # end if
+
+            entry = {
+                "callback": callback,
+                "period": period,
+                "mode": mode,
+                "deadline": 0,
+                "statistics": {
+                    "runs": 0,
+                    "totalJitter": 0.0,
+                    "maxJitter": 0.0,
+                    "overruns": 0,
+                },
+            }
+            self.__entries[identifier] = entry
+            self.__push(identifier, entry, time.monotonic() + delay)
+
+    # end def
+
+    def stop(self) -> None:
+        with self.__condition:
+            self.__running = False
+            self.__entries.clear()
+            self.__condition.notify()
+        # end with
+
+        if self.__thread is not threading.current_thread():
+            self.__thread.join(5)
+        # end if
+
+    # end def
+
+
+# end class
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def getScheduler() -> scheduler:
+    """Returns the scheduler shared by the whole process, it is created the first time."""
+    global _scheduler
+
+    with _lock:
+        if _scheduler is None:
+            _scheduler = scheduler()
+        # end if
+
+        return _scheduler
+
+    # end with
+
+
+# end def
+
+
+def stopScheduler() -> None:
+    """Stops the shared scheduler and waits for its thread."""
+    global _scheduler
+
+    with _lock:
+        current, _scheduler = _scheduler, None
+    # end with
+
+    if current is not None:
+        current.stop()
+    # end if
+
+
+# end def
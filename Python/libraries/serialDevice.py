@@ -1,12 +1,22 @@
+import asyncio
 import serial
+import os
+import select
+import selectors
 import threading
-import traceback
-import sys
+from libraries.asyncSerialDevice import asyncSerialDevice
 from libraries.cancellationToken import cancellationToken
+from libraries.frameParser import frameParser, PCB_TERMINATORS, TEXT_FRAME
+from libraries.linkSupervisor import backoff, keptLanes, RECONNECT_DEFAULTS
 from libraries.loggerSetup import setup_logger
+from libraries.metrics import getRegistry
+from libraries.nextionCommands import encodeInto
+from libraries.outbox import outbox, CONTROL_LANE
+from libraries.scheduler import getScheduler, FIXED_DELAY
+from libraries.trafficCapture import trafficCapture, IN, OUT
 from queue import Queue
-from time import sleep
-from typing import Callable, Union, List
+from time import monotonic
+from typing import Any, Callable, Dict, Union, List
 
 
 class serialDevice:
@@ -20,10 +30,82 @@ class serialDevice:
         byteSize: int = 8,
         parity: str = "N",
         loggerName: str = __name__,
+        terminators: Dict[bytes, str] = PCB_TERMINATORS,
+        coalesce: bool = False,
+        lanes: Dict[str, Dict[str, Any]] = None,
+        capture: Dict[str, Any] = None,
+        reconnect: Dict[str, Any] = None,
     ) -> None:
         self.__loggingService = setup_logger(loggerName)
-        self.__outputMessages = Queue(maxsize=100)
+        self.__termination = b"\xff\xff\xff"
+        self.__outputMessages = outbox(
+            maxsize=100,
+            coalesce=coalesce,
+            terminationSize=len(self.__termination),
+            lanes=lanes,
+        )
         self.__inputMessages = Queue(maxsize=100)
+        # (loop, future) of the coroutines waiting in receive, woken when a message is queued
+        self.__receivers = []
+        self.__receiversLock = threading.Lock()
+
+        # metrics of the link, labelled with the logger name
+        registry = getRegistry()
+        self.__bytesIn = registry.counter(
+            "serial_bytes_total",
+            "Bytes read and written",
+            device=loggerName,
+            direction="in",
+        )
+        self.__bytesOut = registry.counter(
+            "serial_bytes_total", device=loggerName, direction="out"
+        )
+        self.__framesIn = registry.counter(
+            "serial_frames_total",
+            "Frames read and messages written",
+            device=loggerName,
+            direction="in",
+        )
+        self.__framesOut = registry.counter(
+            "serial_frames_total", device=loggerName, direction="out"
+        )
+        self.__writeLatency = registry.histogram(
+            "serial_write_seconds", "Time spent writing to the port", device=loggerName
+        )
+        registry.gauge(
+            "serial_queue_depth", "Messages waiting to be written", device=loggerName
+        ).setFunction(self.__outputMessages.qsize)
+        self.__reconnects = registry.counter(
+            "serial_reconnects_total", "Times the port was reopened", device=loggerName
+        )
+        registry.gauge(
+            "serial_link_up", "1 while the port is open", device=loggerName
+        ).setFunction(lambda: 1 if self.linkUp else 0)
+        self.__onMessageReceivedEventSet = None
+        self.__onReturnCodeReceivedEventSet = None
+        self.__probeResponse = None
+        self.__parser = frameParser(terminators)
+        self.__scheduledTasks = {}
+
+        # when the port fails it is reopened by the reading thread, waiting longer after every attempt
+        reconnect = {**RECONNECT_DEFAULTS, **(reconnect or {})}
+        self.__keptLanes = keptLanes(reconnect["whileDown"])
+        self.__backoff = backoff(
+            reconnect["initialDelay"], reconnect["maxDelay"], reconnect["factor"]
+        )
+        self.__linkUp = threading.Event()
+        self.__linkUp.set()
+        self.__reconnectRequested = threading.Event()
+        self.lastReceived = monotonic()
+
+        # the bytes read and written are appended to a ring file when a capture is configured
+        self.__capture = None
+
+        if capture:
+            self.__capture = trafficCapture(
+                capture["path"], capture.get("size", 8 * 1024 * 1024), loggerName
+            )
+        # end if
 
         self.serialConnection = serial.Serial(
             port,
@@ -36,12 +118,20 @@ class serialDevice:
         )
         self.token = cancellationToken()
 
+        # the reading thread sleeps until the port or the wake up pipe are ready to be read
+        self.__wakeUpReader, self.__wakeUpWriter = os.pipe()
+        os.set_blocking(self.__wakeUpReader, False)
+        self.__selector = selectors.DefaultSelector()
+        self.__portFd = self.serialConnection.fileno()
+        self.__selector.register(self.__portFd, selectors.EVENT_READ)
+        self.__selector.register(self.__wakeUpReader, selectors.EVENT_READ)
+
         readingThread = threading.Thread(
             target=self.__read, args=[self.serialConnection, self.token]
         )
         writingThread = threading.Thread(
             target=self.__write,
-            args=[self.serialConnection, self.token, b"\xff\xff\xff"],
+            args=[self.serialConnection, self.token, self.__termination],
         )
 
         readingThread.start()
@@ -52,8 +142,6 @@ class serialDevice:
             "writingTask": self.__createTask(writingThread),
         }
 
-        self.__onMessageReceivedEventSet = None
-
     # end def
 
     def __del__(self):
@@ -63,29 +151,72 @@ class serialDevice:
     # end def
 
     def __read(self, serial: serial.Serial, token):
-        m = b""
         self.__loggingService.info("readingThread started started")
 
         while not token.cancelled:
             try:
-                m = serial.readline()  # is blocking
-                m = bytes(filter(lambda x: x in range(32, 127), m))
+                # is blocking until there is something to read, closeConnection or reconnect is called
+                self.__selector.select()
 
-                if m != b"":
-                    m += b"\r\n"
-                    message = m.decode("utf-8", errors="ignore")
+                if token.cancelled:
+                    break
+                # end if
 
-                    if self.__onMessageReceivedEventSet:
-                        self.__onMessageReceivedEventSet(message)
-                    else:
-                        self.__inputMessages.put(message)
+                if self.__reconnectRequested.is_set():
+                    self.__reconnectRequested.clear()
+                    self.__reopen(serial, token, "reconnect requested")
+                    continue
+                # end if
+
+                chunk = os.read(self.__portFd, 4096)
 
+                if chunk == b"":
+                    raise IOError(
+                        "device reports readiness to read but returned no data"
+                    )
+                # end if
+            except BlockingIOError:
+                # only the wake up pipe was ready
+                self.__drainWakeUp()
+                continue
             except Exception as e:
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                traceback_details = traceback.extract_tb(exc_traceback)
+                # the port failed, it is closed and opened again
+                self.__reopen(serial, token, f"Read error: {e}")
+                continue
+            # end try-except
 
-                for tb in traceback_details:
-                    self.__loggingService.error(f"Read error: Line {tb.line}. {e}")
+            try:
+                self.lastReceived = monotonic()
+                self.__bytesIn.inc(len(chunk))
+
+                if self.__capture:
+                    self.__capture.append(IN, chunk)
+                # end if
+
+                for kind, frame in self.__parser.feed(chunk):
+                    self.__framesIn.inc()
+
+                    if self.__probeResponse and self.__probeResponse[0](kind, frame):
+                        self.__probeResponse[1](frame)
+
+                    elif kind == TEXT_FRAME:
+                        message = frame.decode("ascii") + "\r\n"
+
+                        if self.__onMessageReceivedEventSet:
+                            self.__onMessageReceivedEventSet(message)
+                        else:
+                            self.__inputMessages.put(message)
+                            self.__wakeReceivers()
+                        # end if
+
+                    elif self.__onReturnCodeReceivedEventSet:
+                        self.__onReturnCodeReceivedEventSet(frame)
+                    # end if
+                # end for
+
+            except Exception as e:
+                # one record with the traceback, repeated errors are dropped by the rate limit
+                self.__loggingService.error(f"Read error: {e}", exc_info=True)
             # end try-except
 
         # end while
@@ -93,6 +224,90 @@ class serialDevice:
 
     # end def
 
+    def __wakeReceivers(self):
+        with self.__receiversLock:
+            receivers, self.__receivers = self.__receivers, []
+        # end with
+
+        for loop, waiter in receivers:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # the loop of the receiver was closed
+                pass
+            # end try-except
+        # end for
+
+    # end def
+
+    def __drainWakeUp(self):
+        try:
+            while os.read(self.__wakeUpReader, 64):
+                pass
+            # end while
+        except BlockingIOError:
+            pass
+        # end try-except
+
+    # end def
+
+    def __reopen(self, serial: serial.Serial, token: cancellationToken, reason: str):
+        # runs in the reading thread. The writing thread waits in the paused outbox meanwhile
+        self.__linkUp.clear()
+        self.__drainWakeUp()
+        dropped = self.__outputMessages.pause(self.__keptLanes)
+        self.__loggingService.error(
+            f"{reason}. Reopening the port, {dropped} queued messages dropped"
+        )
+
+        try:
+            self.__selector.unregister(self.__portFd)
+        except (KeyError, ValueError):
+            pass
+        # end try-except
+
+        try:
+            serial.close()
+        except Exception:
+            pass
+        # end try-except
+
+        self.__backoff.reset()
+
+        while not token.cancelled:
+            try:
+                serial.open()
+                break
+            except Exception as e:
+                delay = self.__backoff.next()
+                self.__loggingService.warning(
+                    f"port not reopened: {e}. Retrying in {delay:.1f} s"
+                )
+
+                # closeConnection wakes the thread up
+                select.select([self.__wakeUpReader], [], [], delay)
+                self.__drainWakeUp()
+            # end try-except
+        # end while
+
+        if token.cancelled:
+            return
+        # end if
+
+        # a frame cut by the failure is not completed by the bytes read from now on
+        self.__parser.reset()
+        self.__portFd = serial.fileno()
+        self.__selector.register(self.__portFd, selectors.EVENT_READ)
+        self.lastReceived = monotonic()
+        self.__reconnects.inc()
+        self.__linkUp.set()
+        self.__outputMessages.resume()
+        self.__loggingService.warning(
+            f"port reopened after {self.__backoff.attempts + 1} attempts"
+        )
+
+    # end def
+
     def __write(
         self,
         serial: serial.Serial,
@@ -100,50 +315,67 @@ class serialDevice:
         termination: bytes = b"\n",
     ):
         self.__loggingService.info("writingThread started")
+        # reused by every write, the strings are encoded straight into it
+        encodedMessage = bytearray()
+
         while not token.cancelled:
             try:
-                # if there are not queued messages will remain in here
-                if self.__outputMessages.qsize() == 0:
-                    continue
-                # end if
+                # blocks until messages are queued or closeConnection wakes the thread up.
+                # Everything queued meanwhile is drained so it goes out in a single write
+                pending = self.__outputMessages.getAll()
+                encodedMessage.clear()
+
+                # enter t0.txt="1" to set text to 1, b't0.txt="1"\xff\xff\xff'
+                for userMessage in pending:
+                    if isinstance(userMessage, bytes):
+                        encodedMessage += userMessage
+                    else:
+                        encodeInto(encodedMessage, userMessage)
+                    # end if
+                # end for
+
+                if encodedMessage:
+                    with self.__writeLatency.time():
+                        serial.write(encodedMessage)  # sendig message to spi device
+                    # end with
 
-                userMessage = self.__outputMessages.get()
+                    self.__bytesOut.inc(len(encodedMessage))
 
-                # enter t0.txt="1" to set text to 1
-                encodedMessage = (
-                    userMessage.encode("utf-8") + termination
-                )  # b't0.txt="1"\xff\xff\xff'
+                    if self.__capture:
+                        self.__capture.append(OUT, encodedMessage)
+                    # end if
 
-                serial.write(encodedMessage)  # sendig message to spi device
+                    # a frame may hold several instructions
+                    self.__framesOut.inc(encodedMessage.count(termination))
+                # end if
             except Exception as e:
                 self.__loggingService.error(f"writting error: {e}")
+
+                # the reading thread reopens the port, the messages being written are lost
+                if self.__linkUp.is_set() and not token.cancelled:
+                    self.reconnect()
+                # end if
             # end try-catch
         # end while
         self.__loggingService.warning("WritingThread finished")
 
     # end def
 
-    def __writingTaskAux(self, task, token, identifier, wait):
-        self.__loggingService.info(f"{identifier}Thread started")
-
-        while not self.token.cancelled and not token.cancelled:
+    def __writingTaskAux(self, task):
+        res = task()
 
-            res = task()
+        # it runs in the shared scheduler thread, a full lane drops the result instead of blocking
+        # every other job, e.g. while the device stopped reading and the link is being reopened
+        if isinstance(res, (str, bytes)):
+            self.__outputMessages.put(res, block=False)
 
-            if isinstance(res, str):
-                self.__outputMessages.put(res)
-
-            elif isinstance(res, list):
-                for item in res:
-                    if item != None and item.strip() != "":
-                        self.__outputMessages.put(item)
-                    # end if
-                # end for
-            # end if
-            sleep(wait)
-        # end while
-
-        self.__loggingService.warning(f"{identifier}Thread finished")
+        elif isinstance(res, list):
+            for item in res:
+                if item != None and item.strip() != "":
+                    self.__outputMessages.put(item, block=False)
+                # end if
+            # end for
+        # end if
 
     # end def
 
@@ -160,6 +392,16 @@ class serialDevice:
         self.token.cancel()
         self.__loggingService.warning("canceling all tasks")
 
+        # waking up the writing thread, it is blocked until something is queued
+        self.__outputMessages.close()
+
+        for identifier in list(self.__scheduledTasks.keys()):
+            self.stopTask(identifier)
+        # end for
+
+        # waking up the reading thread, it is blocked until the port is ready to be read
+        os.write(self.__wakeUpWriter, b"\0")
+
         for taskName, task in self.__tasks.items():
             self.__loggingService.info(f"joining {taskName}Thread")
             task["task"].join(5)
@@ -167,7 +409,15 @@ class serialDevice:
         # end for
 
         self.__tasks.clear()
+        self.__selector.close()
+        os.close(self.__wakeUpReader)
+        os.close(self.__wakeUpWriter)
         self.serialConnection.close()
+
+        if self.__capture:
+            self.__capture.close()
+        # end if
+
         self.__loggingService.info(f"serial port closed")
 
     # end def
@@ -179,55 +429,202 @@ class serialDevice:
 
     # end def
 
+    def getOutboxStatistics(self) -> Dict[str, Any]:
+        """
+        Returns the state of the output messages queue.
+
+        Returns:
+            Dict[str, Any]: queued messages, messages replaced by a newer value, the bytes saved by it
+                and the depth and drops of every lane.
+        """
+        return {
+            "queued": self.__outputMessages.qsize(),
+            "coalescedMessages": self.__outputMessages.coalescedMessages,
+            "coalescedBytes": self.__outputMessages.coalescedBytes,
+            "lanes": self.__outputMessages.getStatistics(),
+        }
+
+    # end def
+
     def onMessageReceivedEvent(self, callback):
         self.__onMessageReceivedEventSet = callback
 
     # end def
 
+    @property
+    def linkUp(self) -> bool:
+        """False while the port is being reopened."""
+        return self.__linkUp.is_set()
+
+    # end def
+
+    def onProbeResponse(
+        self,
+        isResponse: Callable[[str, bytes], bool],
+        callback: Callable[[bytes], None],
+    ):
+        """
+        Sets the callback called with the frames that answer a link supervisor's probes, instead of
+        the message and return code callbacks. isResponse is called with the kind and the payload
+        of every frame received.
+        """
+        self.__probeResponse = (isResponse, callback)
+
+    # end def
+
+    def reconnect(self):
+        """Closes and reopens the port from the reading thread, e.g. when the link stalled."""
+        if self.token.cancelled:
+            return
+        # end if
+
+        self.__reconnectRequested.set()
+        os.write(self.__wakeUpWriter, b"\0")
+
+    # end def
+
+    def onReturnCodeReceivedEvent(self, callback: Callable[[bytes], None]):
+        """
+        Sets the callback called with every binary frame (e.g. nextion return codes) received.
+        The terminator is not included in the frame.
+        """
+        self.__onReturnCodeReceivedEventSet = callback
+
+    # end def
+
+    async def receive(self, timeout: float = None) -> Union[str, None]:
+        """
+        Waits for the next message received without blocking the event loop. The reading thread
+        wakes the waiting coroutines when it queues a message.
+
+        Args:
+            timeout (float): seconds to wait for a message. Waits forever when None.
+
+        Returns:
+            Union[str, None]: the message received or None if the timeout expired.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while True:
+            # registered before the queue is read, a message queued in between wakes it
+            receiver = (loop, loop.create_future())
+
+            with self.__receiversLock:
+                self.__receivers.append(receiver)
+            # end with
+
+            try:
+                message = self.getInputMessage()
+
+                if message is not None:
+                    return message
+                # end if
+
+                remaining = None if deadline is None else deadline - monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    return None
+                # end if
+
+                try:
+                    await asyncio.wait_for(receiver[1], remaining)
+                except asyncio.TimeoutError:
+                    return None
+                # end try-except
+            finally:
+                with self.__receiversLock:
+                    if receiver in self.__receivers:
+                        self.__receivers.remove(receiver)
+                    # end if
+                # end with
+            # end try-finally
+        # end while
+
+    # end def
+
+    def getTaskStatistics(self, identifier: str) -> Union[Dict[str, float], None]:
+        """Returns the scheduling statistics of a writing task, None if it is not running."""
+        if identifier not in self.__scheduledTasks:
+            return None
+        # end if
+
+        return getScheduler().getStatistics(self.__scheduledTasks[identifier])
+
+    # end def
+
     def runWritingTask(
         self,
         callback: Callable[[], Union[str, List[str]]],
         identifier: str,
         wait: float = 0.2,
+        mode: str = FIXED_DELAY,
     ) -> None:
         """
-        Executes the given callback in a new thread and sends it result to the spi device
+        Executes the given callback periodically and sends its result to the spi device.
+        Every writing task of the process runs in the same scheduler thread.
 
         Arguments:
-            callback (Callable[[], Union[str, List[str]]]): The callback function to call.
-            identifier (str): Name of the thread. *This identifier can be used later to stop the thread*.
-            wait (float): time for the thread to sleep in seconds after executing the call.
+            callback (Callable[[], Union[str, List[str]]]): The callback function to call. It must not block.
+            identifier (str): Name of the task. *This identifier can be used later to stop the task*.
+            wait (float): time in seconds between calls.
+            mode (str): FIXED_DELAY waits after every call finishes, FIXED_RATE calls it at a fixed rate.
 
         Returns:
             None
         """
-        if identifier in self.__tasks:
+        if identifier in self.__scheduledTasks:
             raise KeyError("Repeted key value")
         # end if
-        token = cancellationToken()
-        t = threading.Thread(
-            target=self.__writingTaskAux,
-            args=[callback, token, identifier, wait],
+
+        # the scheduler is shared, the identifier must be unique in the whole process
+        schedulerIdentifier = f"{id(self)}.{identifier}"
+        getScheduler().schedule(
+            schedulerIdentifier,
+            lambda: self.__writingTaskAux(callback),
+            wait,
+            mode,
         )
-        t.start()
 
-        self.__tasks[identifier] = self.__createTask(t, token)
+        self.__scheduledTasks[identifier] = schedulerIdentifier
+        self.__loggingService.info(f"{identifier}Task scheduled")
 
     # end def
 
-    def sendMessage(self, message):
+    async def send(self, message: str) -> None:
         self.__outputMessages.put(message)
 
     # end def
 
+    def sendMessage(self, message, block: bool = True) -> bool:
+        """Queues a message, block False drops it when its lane is full instead of waiting."""
+        return self.__outputMessages.put(message, block=block)
+
+    # end def
+
+    def sendFrame(
+        self, frame: bytes, lane: str = CONTROL_LANE, block: bool = True
+    ) -> bool:
+        """
+        Queues instructions already encoded with their terminators, e.g. a commandBuilder frame.
+        They are written together, in a single write.
+
+        Args:
+            frame (bytes): one or more instructions.
+            lane (str): lane of the frame, frames are not classified.
+            block (bool): False drops the frame when its lane is full instead of waiting.
+
+        Returns:
+            bool: False if the frame was dropped.
+        """
+        return self.__outputMessages.put(frame, lane, block)
+
+    # end def
+
     def stopTask(self, identifier):
-        if identifier in self.__tasks:
-            self.__tasks[identifier]["cancellationToken"].cancel()
-            self.__loggingService.warning(f"cancelling {identifier}Thread")
-            self.__tasks[identifier]["task"].join()
-            self.__loggingService.info(f"{identifier}Thread joined")
-            del self.__tasks[identifier]
-            self.__loggingService.warning(f"{identifier}Thread deleted from tasks")
+        if identifier in self.__scheduledTasks:
+            getScheduler().cancel(self.__scheduledTasks.pop(identifier))
+            self.__loggingService.warning(f"{identifier}Task cancelled")
         else:
             self.__loggingService.warning(f"{identifier} not in tasks")
 
@@ -241,3 +638,38 @@ class serialDevice:
 
 
 # end class
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    # runs in the receiver's loop, the future may have been cancelled by a timeout
+    if not waiter.done():
+        waiter.set_result(None)
+    # end if
+
+
+# end def
+
+
+def createSerialDevice(
+    backend: str, *args, **kwargs
+) -> Union[serialDevice, asyncSerialDevice]:
+    """
+    Creates the serial device for the given backend.
+
+    Args:
+        backend (str): "threads" for serialDevice or "asyncio" for asyncSerialDevice.
+        *args, **kwargs: arguments for the device's constructor.
+
+    Returns:
+        Union[serialDevice, asyncSerialDevice]: the serial device.
+    """
+    if backend == "threads":
+        return serialDevice(*args, **kwargs)
+    elif backend == "asyncio":
+        return asyncSerialDevice(*args, **kwargs)
+    # end if
+
+    raise ValueError(f"Unknown serial backend: {backend}")
+
+
+# end def
@@ -0,0 +1,141 @@
+import builtins
+import contextlib
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+_started = time.perf_counter()
+_imports: Dict[str, float] = {}
+_steps: List[Tuple[str, float]] = []
+_firstFrame = None
+_originalImport = None
+_lock = threading.Lock()
+
+
+def _timedImport(name, *args, **kwargs):
+    # only the first import of a module costs time, the rest are dictionary lookups
+    if name in sys.modules:
+        return _originalImport(name, *args, **kwargs)
+    # end if
+
+    began = time.perf_counter()
+
+    try:
+        return _originalImport(name, *args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - began
+
+        with _lock:
+            # nested imports are included in the time of the module importing them
+            if name not in _imports:
+                _imports[name] = elapsed
+            # end if
+        # end with
+    # end try-finally
+
+
+# end def
+
+
+def enable() -> None:
+    """Starts timing every module imported from now on. It has to be called before the imports."""
+    global _originalImport
+
+    if _originalImport is None:
+        _originalImport = builtins.__import__
+        builtins.__import__ = _timedImport
+    # end if
+
+
+# end def
+
+
+def disable() -> None:
+    """Stops timing the imports."""
+    global _originalImport
+
+    if _originalImport is not None:
+        builtins.__import__ = _originalImport
+        _originalImport = None
+    # end if
+
+
+# end def
+
+
+@contextlib.contextmanager
+def measure(name: str):
+    """Times the block, e.g. the initialization of a service."""
+    began = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        _steps.append((name, time.perf_counter() - began))
+    # end try-finally
+
+
+# end def
+
+
+def watchFirstFrame(
+    written: Callable[[], float], timeout: float = 30, interval: float = 0.001
+) -> None:
+    """
+    Records when the first frame is written, polling the given counter in the background.
+
+    Args:
+        written (Callable[[], float]): frames written so far, e.g. a metrics counter get.
+        timeout (float): seconds after which it stops waiting.
+        interval (float): seconds between reads of the counter.
+
+    Returns:
+        None
+    """
+
+    def watch():
+        global _firstFrame
+        deadline = time.perf_counter() + timeout
+
+        while time.perf_counter() < deadline:
+            if written() > 0:
+                _firstFrame = time.perf_counter() - _started
+                return
+            # end if
+
+            time.sleep(interval)
+        # end while
+
+    # end def
+
+    threading.Thread(target=watch, name="firstFrameWatcher", daemon=True).start()
+
+
+# end def
+
+
+def report(top: int = 15) -> str:
+    """Slowest imports, every measured step and the time to the first frame, in milliseconds."""
+    with _lock:
+        imports = sorted(_imports.items(), key=lambda item: -item[1])[:top]
+    # end with
+
+    lines = [
+        f"startup profile, {(time.perf_counter() - _started) * 1000:.1f} ms so far"
+    ]
+    lines.append("slowest imports (including the modules they import):")
+    lines.extend(f"  {name:40} {seconds * 1000:8.1f} ms" for name, seconds in imports)
+    lines.append("initialization:")
+    lines.extend(f"  {name:40} {seconds * 1000:8.1f} ms" for name, seconds in _steps)
+
+    if _firstFrame is not None:
+        lines.append(f"first frame written after {_firstFrame * 1000:.1f} ms")
+    else:
+        lines.append("no frame written yet")
+    # end if
+
+    return "\n".join(lines)
+
+
+# end def
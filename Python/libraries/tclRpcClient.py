@@ -0,0 +1,95 @@
+import socket
+from typing import Union
+
+
+class tclRpcClient:
+    __SEPARATOR = b"\x1a"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6666, timeout: float = 30):
+        """
+        Client for openocd's Tcl RPC server. Commands and responses are ended by 0x1a.
+
+        Args:
+            host (str): address where openocd listens.
+            port (int): openocd's tcl_port.
+            timeout (float): seconds to wait for a response before raising socket.timeout.
+
+        Returns:
+            None
+        """
+        self.__host = host
+        self.__port = port
+        self.__timeout = timeout
+        self.__socket: Union[socket.socket, None] = None
+        self.__buffer = bytearray()
+
+    # end def
+
+    def call(self, command: str) -> str:
+        """
+        Sends a command and waits for its response.
+
+        Args:
+            command (str): tcl command, e.g. "halt".
+
+        Returns:
+            str: the result of the command.
+        """
+        if self.__socket is None:
+            self.connect()
+        # end if
+
+        try:
+            self.__socket.sendall(command.encode("utf-8") + self.__SEPARATOR)
+
+            while True:
+                index = self.__buffer.find(self.__SEPARATOR)
+
+                if index >= 0:
+                    response = bytes(self.__buffer[:index])
+                    del self.__buffer[: index + 1]
+                    return response.decode("utf-8", errors="ignore")
+                # end if
+
+                chunk = self.__socket.recv(4096)
+
+                if chunk == b"":
+                    raise ConnectionError("openocd closed the tcl connection")
+                # end if
+
+                self.__buffer += chunk
+            # end while
+        except Exception:
+            # the connection can not be trusted anymore after a failed call
+            self.close()
+            raise
+        # end try-except
+
+    # end def
+
+    def close(self) -> None:
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+        # end if
+
+        self.__buffer.clear()
+
+    # end def
+
+    def connect(self) -> None:
+        self.close()
+        self.__socket = socket.create_connection(
+            (self.__host, self.__port), self.__timeout
+        )
+        self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    # end def
+
+    def isConnected(self) -> bool:
+        return self.__socket is not None
+
+    # end def
+
+
+# end class
@@ -0,0 +1,130 @@
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+
+class textLayout:
+    def __init__(self, fontPath: str, fontSize: int, cacheSize: int = 128) -> None:
+        """
+        Wraps text into lines for the given font. The font is loaded once and the advance width
+        and vertical extent of every character are kept in tables so that wrapping does not
+        render anything.
+
+        Args:
+            fontPath (str): path of the truetype font.
+            fontSize (int): size of the font.
+            cacheSize (int): wrapped texts kept in the LRU cache.
+
+        Returns:
+            None
+        """
+        # PIL is imported by the first layout, not when the module is loaded
+        from PIL import ImageFont
+
+        self.fontSize = fontSize
+        self.__font = ImageFont.truetype(fontPath, fontSize)
+        self.__advances = {}
+        self.__extents = {}
+
+        for code in range(32, 256):
+            self.__measure(chr(code))
+        # end for
+
+        self.__spaceWidth = self.__advances[" "]
+        self.wrap = lru_cache(maxsize=cacheSize)(self.__wrap)
+
+    # end def
+
+    def __measure(self, character: str) -> float:
+        self.__advances[character] = self.__font.getlength(character)
+        box = self.__font.getbbox(character)
+
+        # characters without ink (e.g. spaces) do not change the height of a line
+        self.__extents[character] = (box[1], box[3]) if box[3] > box[1] else None
+
+        return self.__advances[character]
+
+    # end def
+
+    def __textWidth(self, text: str) -> float:
+        advances = self.__advances
+        width = 0
+
+        for character in text:
+            advance = advances.get(character)
+
+            if advance is None:
+                advance = self.__measure(character)
+            # end if
+
+            width += advance
+        # end for
+
+        return width
+
+    # end def
+
+    def __textExtent(self, text: str, top: int, bottom: int) -> Tuple[int, int]:
+        for character in text:
+            extent = self.__extents[character]
+
+            if extent is not None:
+                top = min(top, extent[0])
+                bottom = max(bottom, extent[1])
+            # end if
+        # end for
+
+        return (top, bottom)
+
+    # end def
+
+    def __wrap(self, text: str, width: int) -> Tuple[List[str], int]:
+        words = text.split()
+        lines = []
+        current_line = []
+        current_width = 0
+        top, bottom = (float("inf"), float("-inf"))
+
+        # every word is measured once, the line width is accumulated
+        for word in words:
+            word_width = self.__textWidth(word)
+
+            # the line height is the one of the first line including the word that overflows it
+            if len(lines) == 0:
+                top, bottom = self.__textExtent(word, top, bottom)
+            # end if
+
+            test_width = (
+                current_width + self.__spaceWidth + word_width
+                if current_line
+                else word_width
+            )
+
+            if test_width <= width:
+                current_line.append(word)
+                current_width = test_width
+            else:
+                lines.append(" ".join(current_line))
+                current_line = [word]
+                current_width = word_width
+            # end if
+        # end for
+
+        if current_line:
+            lines.append(" ".join(current_line))
+
+        line_height = bottom - top if bottom > top else 0
+
+        return (lines, line_height)
+
+    # end def
+
+    def prewarm(self, texts: Iterable[str], width: int) -> None:
+        """Wraps the given texts so that they are already cached when they are needed."""
+        for text in texts:
+            self.wrap(text, width)
+        # end for
+
+    # end def
+
+
+# end class
@@ -0,0 +1,280 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Iterator, List, NamedTuple, Tuple
+
+# bytes read from the device and bytes written to it
+IN = 0
+OUT = 1
+# fills the end of the ring that is too short for the next record, the records go on at its start
+_PAD = 0xFF
+
+_MAGIC = b"SCAP"
+_VERSION = 1
+# magic, version, capacity, head, tail, records, records overwritten, device name
+_HEADER = struct.Struct("<4sHxxQQQQQ32s")
+_HEADER_SIZE = 128
+# offset of head, tail, records and records overwritten in the header
+_POSITIONS = struct.Struct("<QQQQ")
+_POSITIONS_OFFSET = 16
+# time.time_ns(), direction, length
+_RECORD = struct.Struct("<qBxH")
+_MAX_CHUNK = 0xFFFF
+
+
+class captureRecord(NamedTuple):
+    timestamp: float
+    direction: int
+    data: bytes
+
+
+# end class
+
+
+class trafficCapture:
+    def __init__(self, path: str, size: int = 8 * 1024 * 1024, name: str = "") -> None:
+        """
+        Ring file of the bytes read from and written to a serial port. Every chunk is appended with
+        its time and direction to a memory mapped file of a fixed size, overwriting the oldest chunks
+        once it is full. Appending is a copy into the mapping, the kernel writes it to disk, so the
+        capture survives a crash of the station. An existing capture of the same size is appended
+        to, e.g. after a restart.
+
+        Args:
+            path (str): file of the capture.
+            size (int): bytes of the ring, the file is 128 bytes bigger.
+            name (str): device captured, stored in the file.
+
+        Returns:
+            None
+        """
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # end if
+
+        self.path = path
+        self.__capacity = size
+        self.__lock = threading.Lock()
+        self.__file = open(path, "a+b")
+        fileSize = os.fstat(self.__file.fileno()).st_size
+        reuse = False
+
+        if fileSize == _HEADER_SIZE + size:
+            self.__file.seek(0)
+            magic, version, capacity = _HEADER.unpack(self.__file.read(_HEADER.size))[
+                :3
+            ]
+            reuse = magic == _MAGIC and version == _VERSION and capacity == size
+        # end if
+
+        if not reuse:
+            self.__file.truncate(0)
+            self.__file.truncate(_HEADER_SIZE + size)
+        # end if
+
+        self.__map = mmap.mmap(self.__file.fileno(), _HEADER_SIZE + size)
+
+        if reuse:
+            self.__head, self.__tail, self.__count, self.__overwritten = (
+                _POSITIONS.unpack_from(self.__map, _POSITIONS_OFFSET)
+            )
+        else:
+            self.__head = self.__tail = self.__count = self.__overwritten = 0
+            _HEADER.pack_into(
+                self.__map,
+                0,
+                _MAGIC,
+                _VERSION,
+                size,
+                0,
+                0,
+                0,
+                0,
+                name.encode("utf-8")[:32],
+            )
+        # end if
+
+    # end def
+
+    def append(self, direction: int, data: bytes) -> None:
+        """Appends the chunk read or written, IN or OUT, with the current time. Thread safe."""
+        timestamp = time.time_ns()
+        view = memoryview(data)
+
+        with self.__lock:
+            if self.__map is None:
+                return
+            # end if
+
+            # longer chunks are split, their length has to fit in the record and the ring
+            limit = min(_MAX_CHUNK, self.__capacity // 4)
+
+            for offset in range(0, len(view), limit):
+                chunk = view[offset : offset + limit]
+                position = self.__reserve(_RECORD.size + len(chunk))
+                _RECORD.pack_into(
+                    self.__map, position, timestamp, direction, len(chunk)
+                )
+                start = position + _RECORD.size
+                self.__map[start : start + len(chunk)] = chunk
+                self.__count += 1
+            # end for
+
+            _POSITIONS.pack_into(
+                self.__map,
+                _POSITIONS_OFFSET,
+                self.__head,
+                self.__tail,
+                self.__count,
+                self.__overwritten,
+            )
+        # end with
+
+    # end def
+
+    def __reserve(self, size: int) -> int:
+        # returns where the record of the given size is written, dropping the oldest records until
+        # it fits. Records are never split between the end and the start of the ring
+        if self.__count == 0:
+            self.__head = self.__tail = 0
+        # end if
+
+        if self.__head + size > self.__capacity:
+            # the records from the tail to the end of the ring are the oldest ones
+            while self.__count > 0 and self.__tail >= self.__head:
+                self.__dropOldest()
+            # end while
+
+            if self.__capacity - self.__head >= _RECORD.size:
+                _RECORD.pack_into(self.__map, _HEADER_SIZE + self.__head, 0, _PAD, 0)
+            # end if
+
+            self.__head = 0
+        # end if
+
+        while self.__count > 0 and self.__head <= self.__tail < self.__head + size:
+            self.__dropOldest()
+        # end while
+
+        position = _HEADER_SIZE + self.__head
+        self.__head += size
+
+        return position
+
+    # end def
+
+    def __dropOldest(self) -> None:
+        self.__tail = _next(self.__map, self.__capacity, self.__tail)[1]
+        self.__count -= 1
+        self.__overwritten += 1
+
+        # the tail always points at a record, never at the padding before the start of the ring
+        if self.__count > 0:
+            self.__tail = _resolve(self.__map, self.__capacity, self.__tail)
+        # end if
+
+    # end def
+
+    def records(self) -> List[captureRecord]:
+        """The records in the ring, the oldest first."""
+        with self.__lock:
+            return list(
+                _records(self.__map, self.__capacity, self.__tail, self.__count)
+            )
+        # end with
+
+    # end def
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__map is not None:
+                self.__map.flush()
+                self.__map.close()
+                self.__map = None
+                self.__file.close()
+            # end if
+        # end with
+
+    # end def
+
+
+# end class
+
+
+def _resolve(buffer, capacity: int, offset: int) -> int:
+    # the record at the offset, or the first one of the ring when the end of the ring is padding
+    if capacity - offset < _RECORD.size:
+        return 0
+    elif _RECORD.unpack_from(buffer, _HEADER_SIZE + offset)[1] == _PAD:
+        return 0
+    # end if
+
+    return offset
+
+
+# end def
+
+
+def _next(buffer, capacity: int, offset: int) -> Tuple[int, int]:
+    # offset of the record at or after the given offset and offset of the record after it
+    offset = _resolve(buffer, capacity, offset)
+    length = _RECORD.unpack_from(buffer, _HEADER_SIZE + offset)[2]
+
+    return offset, offset + _RECORD.size + length
+
+
+# end def
+
+
+def _records(buffer, capacity: int, tail: int, count: int) -> Iterator[captureRecord]:
+    offset = tail
+
+    for _ in range(count):
+        offset, following = _next(buffer, capacity, offset)
+        timestamp, direction, length = _RECORD.unpack_from(
+            buffer, _HEADER_SIZE + offset
+        )
+        start = _HEADER_SIZE + offset + _RECORD.size
+        yield captureRecord(
+            timestamp / 1e9, direction, bytes(buffer[start : start + length])
+        )
+        offset = following
+    # end for
+
+
+# end def
+
+
+def readCapture(path: str) -> Tuple[str, int, List[captureRecord]]:
+    """
+    Reads a capture file, e.g. to replay it.
+
+    Args:
+        path (str): file written by a trafficCapture.
+
+    Returns:
+        Tuple[str, int, List[captureRecord]]: device captured, records overwritten since the capture
+        started and the records in the ring, the oldest first.
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+    # end with
+
+    magic, version, capacity, _, tail, count, overwritten, name = _HEADER.unpack_from(
+        content
+    )
+
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"{path} is not a traffic capture")
+    # end if
+
+    name = name.rstrip(b"\0").decode("utf-8")
+
+    return name, overwritten, list(_records(content, capacity, tail, count))
+
+
+# end def
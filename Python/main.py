@@ -1,13 +1,25 @@
+import argparse
 import json
+import sys
+import threading
+from libraries import startupProfiler
+
+# the imports are timed only when they happen after enabling it
+if "--profile-startup" in sys.argv:
+    startupProfiler.enable()
+# end if
+
 from services.openOCD import openOCD
 from services.board import board
 from services.display import display
 import services.gpio as gpio
-from libraries.loggerSetup import setup_logger
+from libraries.loggerSetup import configure_logging, setup_logger
+from libraries.metrics import getRegistry, metricsExporter
+from libraries.resultsStore import resultsStore
 
 
-def loadConfig():
-    with open("appsettings.json", "r") as file:
+def loadConfig(path="appsettings.json"):
+    with open(path, "r") as file:
         config = json.load(file)
     return config
 
@@ -15,23 +27,83 @@ def loadConfig():
 # end def
 
 
-def main(config):
+def main(config, profileStartup=False):
+    # the settings apply to the loggers of every service, they are created after this
+    configure_logging(config.get("logging", {}))
+
+    if profileStartup:
+        startupProfiler.disable()
+        startupProfiler.watchFirstFrame(
+            getRegistry()
+            .counter(
+                "serial_frames_total",
+                device="screen serial communication",
+                direction="out",
+            )
+            .get
+        )
+    # end if
 
     # initializing gpio service
-    gpioService = gpio.GPIO()
+    with startupProfiler.measure("gpio"):
+        gpioService = gpio.GPIO(config.get("gpio", {}))
+    # end with
 
     # initializing openocd service
-    openOCDService = openOCD(config["openocd"])
-
-    boardService = board(openOCDService, config["pcbConfig"])
+    with startupProfiler.measure("openocd"):
+        openOCDService = openOCD(config["openocd"])
+    # end with
+
+    with startupProfiler.measure("board"):
+        boardService = board(openOCDService, config["pcbConfig"])
+    # end with
+
+    # every test run is recorded when there is a results section
+    results = None
+
+    if "results" in config:
+        with startupProfiler.measure("results"):
+            results = resultsStore(
+                config["results"]["path"],
+                config["results"].get("batchSize", 200),
+                config["results"].get("flushInterval", 0.5),
+            )
+        # end with
+    # end if
 
     # initializing screen service
-    screen = display(
-        config["displayConfig"], config["errorFont"], boardService, gpioService
-    )
+    with startupProfiler.measure("display"):
+        screen = display(
+            config["displayConfig"],
+            config["errorFont"],
+            boardService,
+            gpioService,
+            results,
+        )
+    # end with
+
+    # serving the metrics of the services, nothing is served without a metrics section. It starts
+    # after the display so that page 0 is not delayed
+    metricsConfig = config.get("metrics", {})
+
+    with startupProfiler.measure("metrics"):
+        exporter = metricsExporter(
+            getRegistry(),
+            metricsConfig.get("address", ""),
+            metricsConfig.get("snapshotPath"),
+            metricsConfig.get("snapshotPeriod", 60),
+        )
+    # end with
 
     logger = setup_logger(__name__)
 
+    if profileStartup:
+        # the first frame is written by the display's own threads, shortly after
+        reportTimer = threading.Timer(1, lambda: logger.info(startupProfiler.report()))
+        reportTimer.daemon = True
+        reportTimer.start()
+    # end if
+
     # main loop for sending messages and exit the program
     loadAnimationVisible = False
 
@@ -55,17 +127,31 @@ def main(config):
     # end try-catch
 
     # cleaning up
+    exporter.close()
     screen.dispose()
 
+    if results is not None:
+        results.close()
+    # end if
+
     logger.info("bye")
 
 
 # end def
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="appsettings.json")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="log the import and initialization times and the time to the first frame",
+    )
+    args = parser.parse_args()
+
     try:
-        config = loadConfig()
-        main(config)
+        config = loadConfig(args.config)
+        main(config, args.profile_startup)
     except Exception as s:
         print(s)
 # end if
@@ -0,0 +1,80 @@
+"""
+Reports over the results database written by the station.
+
+    python3 results.py --db results.db yield --days 7
+    python3 results.py --db results.db steps
+    python3 results.py --db results.db pareto --limit 5
+    python3 results.py --db results.db runs --limit 20
+"""
+
+import argparse
+import json
+import time
+from libraries.resultsStore import resultsQuery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="results.db")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    # the reports over a period take --days after their name
+    period = argparse.ArgumentParser(add_help=False)
+    period.add_argument("--days", type=float, help="only the runs of the last days")
+    subparsers = parser.add_subparsers(dest="report", required=True)
+    subparsers.add_parser("yield", parents=[period], help="runs that passed")
+    subparsers.add_parser(
+        "steps", parents=[period], help="p50 and p95 duration of every step"
+    )
+    subparsers.add_parser(
+        "pareto", parents=[period], help="steps that failed the most runs"
+    ).add_argument("--limit", type=int, default=10)
+    subparsers.add_parser("runs", help="latest runs").add_argument(
+        "--limit", type=int, default=20
+    )
+    args = parser.parse_args()
+
+    days = getattr(args, "days", None)
+    since = time.time() - days * 86400 if days else 0
+    query = resultsQuery(args.db)
+
+    try:
+        if args.report == "yield":
+            result = query.yieldRate(since)
+            text = (
+                f"{result['passed']}/{result['runs']} runs passed, yield {result['yield']:.1f} %, "
+                f"{result['interrupted']} interrupted runs left out"
+            )
+        elif args.report == "steps":
+            result = query.stepDurations(since)
+            text = "\n".join(
+                f"{step:12} {value['count']:8} runs  p50 {value['p50']:8.3f} s  p95 {value['p95']:8.3f} s"
+                for step, value in result.items()
+            )
+        elif args.report == "pareto":
+            result = query.failurePareto(since, args.limit)
+            text = "\n".join(
+                f"{step or 'unknown':12} {failures:8} failures  {cumulative:6.1f} %"
+                for step, failures, cumulative in result
+            )
+        else:
+            result = query.runs(args.limit)
+            text = "\n".join(
+                f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started']))}  "
+                f"{run['runId']}  "
+                f"{'passed' if run['passed'] else 'failed' if run['passed'] == 0 else 'running'}"
+                f"{'  ' + run['failedStep'] if run['failedStep'] else ''}"
+                for run in result
+            )
+        # end if
+    finally:
+        query.close()
+    # end try-finally
+
+    print(json.dumps(result, indent=4) if args.json else text)
+
+
+# end def
+
+if __name__ == "__main__":
+    main()
+# end if
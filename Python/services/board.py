@@ -1,6 +1,8 @@
-from typing import Dict, Any
+from typing import Dict, Any, Union
 from services.openOCD import openOCD
-from libraries.serialDevice import serialDevice
+from libraries.frameParser import TEXT_FRAME
+from libraries.linkSupervisor import createSupervisor
+from libraries.serialDevice import createSerialDevice
 
 
 class board:
@@ -18,7 +20,8 @@ class board:
             # end if
         # end for
 
-        self.__serial = serialDevice(
+        self.__serial = createSerialDevice(
+            communicationInfoJson.get("backend", "threads"),
             communicationInfoJson["port"],
             communicationInfoJson["baudrate"],
             communicationInfoJson["rtscts"],
@@ -27,14 +30,31 @@ class board:
             byteSize=communicationInfoJson["byteSize"],
             parity=communicationInfoJson["parity"],
             loggerName="board serial communication",
+            capture=communicationInfoJson.get("capture"),
+            reconnect=communicationInfoJson.get("reconnect"),
         )
 
+        # the board answers the probe command of the health section, e.g. an echo
+        self.__supervisor = None
+
+        if "health" in communicationInfoJson:
+            health = communicationInfoJson["health"]
+            response = health["response"].encode("ascii")
+            self.__supervisor = createSupervisor(
+                self.__serial,
+                "board serial communication",
+                health,
+                health["probe"],
+                lambda kind, frame: kind == TEXT_FRAME and frame == response,
+            )
+        # end if
+
         self._openOCD_service = openocdSerivce
 
     # end def
 
     def LoadTestProgram(self) -> bool:
-        result = self._openOCD_service.burn_test_program()
+        result = self.flashTestProgram()
 
         if not result["Success"]:
             print(result)
@@ -43,19 +63,43 @@ class board:
 
     # end def
     def LoadFirmware(self):
-        return self._openOCD_service.burn_firmware()["Success"]
+        return self.flashFirmware()["Success"]
+
+    # end def
+    def flashTestProgram(self) -> Dict[str, Any]:
+        """Flashes the test program and returns openocd's output, errors and result."""
+        return self._openOCD_service.burn_test_program()
+
+    # end def
+    def flashFirmware(self) -> Dict[str, Any]:
+        """Flashes the firmware and returns openocd's output, errors and result."""
+        return self._openOCD_service.burn_firmware()
 
     # end def
     def getMessage(self) -> str:
         return self.__serial.getInputMessage()
 
+    # end def
+    async def receive(self, timeout: float = None) -> Union[str, None]:
+        """Waits for the next message sent by the board. Returns None if the timeout expires."""
+        return await self.__serial.receive(timeout)
+
+    # end def
+    async def send(self, message: str) -> None:
+        await self.__serial.send(message)
+
     # end def
     def writeMessage(self, message: str) -> None:
         self.__serial.sendMessage(message)
 
     # end def
     def dispose(self) -> None:
+        if self.__supervisor is not None:
+            self.__supervisor.stop()
+        # end if
+
         self.__serial.closeConnection()
+        self._openOCD_service.dispose()
 
     # end def
 
@@ -1,12 +1,34 @@
 from services.board import board
-from PIL import ImageFont, ImageDraw, Image
-from numpy import sin, pi
 from datetime import datetime
 from typing import Dict, Any
+import asyncio
+import concurrent.futures
+import math
 import os
 import threading
 import time
 import libraries.serialDevice as serialDisplay
+from libraries.eventLoop import getEventLoop, stopEventLoop
+from libraries.frameParser import BINARY_FRAME, NEXTION_TERMINATORS
+from libraries.handlerExecutor import handlerExecutor, PREEMPT, SERIALIZED
+from libraries.linkSupervisor import createSupervisor
+from libraries.loggerSetup import dump_recent_logs, setup_logger
+from libraries.metrics import getRegistry
+from libraries.nextionCommands import (
+    commandBuilder,
+    CLEAR_ERROR_MESSAGE,
+    CLEAR_WAVEFORM,
+    ERROR_TITLE,
+    GET_PAGE,
+    HANDSHAKE,
+    NUMERIC_DATA,
+    PAGE,
+)
+from libraries.nextionProtocol import commandEvent, dispatcher, parseFrame
+from libraries.outbox import NEXTION_LANES, WAVEFORM_LANE
+from libraries.resultsStore import resultsStore
+from libraries.scheduler import FIXED_RATE, stopScheduler
+from libraries.textLayout import textLayout
 import services.gpio as gpio
 from enum import Enum
 
@@ -20,12 +42,30 @@ class firmware(Enum):
 
 
 class display:
+    __ERROR_WIDTH = 250
+    __LED_TIMEOUT = 0.5
+    __RELAY_TIMEOUT = 0.5
+    __BUTTON_NOT_DETECTED = "No se detectó el botón.\n PRUEBA NO APROBADA"
+    __FIRMWARE_NOT_LOADED = "No se pudo cargar el firmware.\n PRUEBA NO APROBADA"
+
+    # test steps run one after the other, going back to the main page cancels the running step
+    __COMMAND_RULES = {
+        "page2": SERIALIZED,
+        "page3": SERIALIZED,
+        "page4": SERIALIZED,
+        "page5": SERIALIZED,
+        "testCable": SERIALIZED,
+        "page0": PREEMPT,
+        "cancel": PREEMPT,
+    }
+
     def __init__(
         self,
         communicationInfoJson: Dict[str, Any],
         errorFont: Dict[str, Any],
         boardService: board,
         gpioService: gpio.GPIO,
+        results: resultsStore = None,
     ) -> None:
         """
         Initialize a new instance for the serial display device.
@@ -34,9 +74,13 @@ class display:
             communicationInfoJson (Dict[str, Any]): JSON object containing the serial communication settings.
                 Must contain the following keys: port, baudrate, rtscts, and timeout.
             logger (logging.Logger): instance of logger service.
+            results (resultsStore): optional store where every test run is recorded.
 
             Returs:
                 None
+
+        The optional pipelined key of communicationInfoJson, True by default, overlaps the flashing
+        of the test program with the operator's steps.
         """
         # Validate the required keys in communicationInfoJson
 
@@ -50,6 +94,8 @@ class display:
             raise ValueError("boardService must not be None")
         # end if
 
+        self.__loggingService = setup_logger("display")
+
         # saving font values
         path = os.path.dirname(os.path.realpath(__file__))
         path = path[: path.rfind("services")]
@@ -60,14 +106,57 @@ class display:
         self.__font_path = path + errorFont["path"]
         self.__font_size = errorFont["fontSize"]
 
-        screen = serialDisplay.serialDevice(
+        # the font is loaded once and the known error messages are wrapped ahead of time. It is done in
+        # the background, the display does not wait for PIL to show page 0
+        self.__errorLayout = concurrent.futures.Future()
+        threading.Thread(
+            target=self.__loadErrorLayout,
+            args=[
+                [self.__BUTTON_NOT_DETECTED, self.__FIRMWARE_NOT_LOADED]
+                + errorFont.get("prewarm", [])
+            ],
+            name="errorFontLoader",
+            daemon=True,
+        ).start()
+
+        # page handlers run in the executor so that the serial reader is never blocked
+        self.__loop = getEventLoop()
+        self.__executor = handlerExecutor(
+            self.__loop,
+            self.__COMMAND_RULES,
+            communicationInfoJson.get("handlerWorkers", 4),
+            name="display handlers",
+        )
+
+        screen = serialDisplay.createSerialDevice(
+            communicationInfoJson.get("backend", "threads"),
             communicationInfoJson["port"],
             communicationInfoJson["baudrate"],
             communicationInfoJson["rtscts"],
             communicationInfoJson["timeout"],
             loggerName="screen serial communication",
+            terminators=NEXTION_TERMINATORS,
+            coalesce=True,
+            lanes=communicationInfoJson.get("lanes", NEXTION_LANES),
+            capture=communicationInfoJson.get("capture"),
+            reconnect=communicationInfoJson.get("reconnect"),
         )
 
+        # run of the device under test being recorded, None between runs
+        self.__results = results
+        self.__runId = None
+        # the harness check passed, page 2 goes on with the run it started
+        self.__runSeated = False
+
+        # with pipelining the test program is flashed as soon as the harness check passes. openocd
+        # never flashes two programs at once
+        self.__pipelined = communicationInfoJson.get("pipelined", True)
+        self.__flashLock = threading.Lock()
+        self.__speculativeFlash = None
+
+        # only used by the loading animation, from its writing task
+        self.__waveform = commandBuilder()
+
         self.__showLoadingAnimation_lock = threading.Lock()
         self.__showLoadingAnimation = False
         self.__waveID = 0
@@ -75,16 +164,28 @@ class display:
         self.__clock_lock = threading.Lock()
         self.__runClock = False
 
+        # the loading animation is scheduled by showLoadingAnimation, only while it is shown
         screen.runWritingTask(self.__updateTime, "datetimeUpdate", 1)
-        screen.runWritingTask(self.__processLoadingAnnimation, "loading", 1 / 60)
-        screen.runWritingTask(self.__handShake, "connectionHandShake", 5)
+        # with a health section the handshake goes with the probe of the link supervisor, the answer
+        # to get dp measures the round trip. Otherwise it is sent every 5 seconds
+        self.__supervisor = None
+
+        if "health" in communicationInfoJson:
+            self.__supervisor = createSupervisor(
+                screen,
+                "screen serial communication",
+                communicationInfoJson["health"],
+                HANDSHAKE + GET_PAGE,
+                self.__isPageResponse,
+            )
+        else:
+            screen.runWritingTask(self.__handShake, "connectionHandShake", 5)
+        # end if
 
         screen.onMessageReceivedEvent(self.__message_received)
 
         self.__screenService = screen
 
-        self.__onMessageReceivedevents = {}
-
         self.__mapEvents()
 
         self.__boardService = boardService
@@ -106,60 +207,71 @@ class display:
     # end def
 
     def __getTextWidth(self, text: str):
-        image = Image.new("RGB", (1, 1))
-        draw = ImageDraw.Draw(image)
-        font = ImageFont.truetype(self.__font_path, self.__font_size)
-
-        words = text.split()
-        lines = []
-        current_line = ""
-        line_height = 0
-
-        for word in words:
-            test_line = f"{current_line} {word}".strip()
-            txtbox = draw.textbbox((0, 0), test_line, font=font)
-            text_width = txtbox[2] - txtbox[0]
+        lines, line_height = self.__errorLayout.result().wrap(text, self.__ERROR_WIDTH)
 
-            if len(lines) == 0:
-                line_height = txtbox[3] - txtbox[1]
+        return (list(lines), line_height)
 
-            if text_width <= 250:
-                current_line = test_line
-
-            else:
-                lines.append(current_line)
-                current_line = word
-            # end if
+    # end def
 
-        # end for
+    def __handShake(self):
+        return HANDSHAKE
 
-        if current_line:
-            lines.append(current_line)
+    # end def
 
-        return (lines, line_height)
+    def __isPageResponse(self, kind: str, frame: bytes) -> bool:
+        return kind == BINARY_FRAME and frame[:1] == bytes([NUMERIC_DATA])
 
     # end def
 
-    def __handShake(self):
-        return "timeoutTMR.en=1"
+    def __flash(self, programToLoad: firmware) -> Dict[str, Any]:
+        # runs in a worker thread. The lock is held by the thread, so a flash whose step was
+        # cancelled still finishes before the next one starts
+        with self.__flashLock:
+            if programToLoad == firmware.productionProgram:
+                return self.__boardService.flashFirmware()
+            # end if
+
+            return self.__boardService.flashTestProgram()
+        # end with
 
     # end def
 
-    def __loadProgramToBoard(self, programToLoad: firmware) -> bool:
+    async def __loadProgramToBoard(self, programToLoad: firmware, runId: str) -> bool:
 
         # load test program to microcontroller
         attempts = 0
         xd = False
 
         while attempts < 3 and not xd:
-            time.sleep(1)
-            if programToLoad == firmware.productionProgram:
-                xd = self.__boardService.LoadFirmware()
-            elif programToLoad == firmware.testProgram:
-                xd = self.__boardService.LoadTestProgram()
-            else:
-                break
+            # waiting before retrying a failed attempt
+            if attempts > 0:
+                getRegistry().counter(
+                    "flash_retries_total",
+                    "Flashing attempts repeated after a failure",
+                    program=programToLoad.name,
+                ).inc()
+                await asyncio.sleep(1)
+            # end if
+
+            started = time.monotonic()
+
+            # openocd blocks until the flashing ends so it runs outside of the event loop
+            result = await asyncio.to_thread(self.__flash, programToLoad)
             attempts = attempts + 1
+            xd = result["Success"]
+
+            if self.__results is not None:
+                duration = time.monotonic() - started
+                self.__results.recordFlash(
+                    runId,
+                    programToLoad.name,
+                    attempts,
+                    time.time() - duration,
+                    duration,
+                    xd,
+                    result["Error:"],
+                )
+            # end if
 
         # end while
 
@@ -167,52 +279,135 @@ class display:
 
     # end def
 
-    def __mapEvents(self):
-        # map every command and its related function. Then at __message_received
-        # check if the message receved is in the dicctionary and execute the function asosiated with it
-        self.__onMessageReceivedevents = {
-            "page0": self.__startPage0,
-            "page1": self.__startPage1,
-            "page2": self.__startPage2,
-            "page3": self.__startPage3,
-            "page4": self.__startPage4,
-            "page5": self.__startPage5,
-            "page10": self.__startPage10,
-            "testCable": self.__testCable,
-        }
+    def __finishRun(self, passed: bool, failedStep: str = None, runId: str = None):
+        # runId is given by the steps that end a run after it stopped being the current one
+        if runId is None:
+            runId = self.__runId
+            self.__runId = None
+            self.__runSeated = False
+        # end if
+
+        if self.__results is not None and runId is not None:
+            self.__results.finishRun(runId, passed, failedStep)
+        # end if
+
+        # the recent records, debug ones included, are written to disk only when a test fails. It is
+        # done in the background so that the page handlers do not wait for the disk
+        if not passed and failedStep not in ["abandoned", "cancelled"]:
+            threading.Thread(
+                target=self.__dumpRecentLogs,
+                args=[f"{runId or 'run'}-{failedStep}"],
+                name="logDump",
+                daemon=True,
+            ).start()
+        # end if
 
     # end def
 
-    def __message_received(self, message: str):
-        function = message.split(";")[0]
-        params = message.split(";")
+    def __dumpRecentLogs(self, reason: str):
+        try:
+            path = dump_recent_logs(reason)
+            self.__loggingService.warning(f"test failed, recent logs written to {path}")
+        except Exception as e:
+            self.__loggingService.error(f"recent logs not written: {e}")
+        # end try-except
 
-        if len(params) > 1:
-            params = params[1:]
+    # end def
 
-            if params[-1].index("\r\n") > -1:
-                params[-1] = params[-1][:-2]
-        else:
-            params = []
+    def __recordStep(
+        self,
+        step: str,
+        started: float,
+        passed: bool,
+        detail: str = None,
+        runId: str = None,
+    ):
+        # started is the time.monotonic() of the beginning of the step. A failed step ends the run
+        currentRun = runId if runId is not None else self.__runId
+
+        if self.__results is not None and currentRun is not None:
+            duration = time.monotonic() - started
+            self.__results.recordStep(
+                currentRun, step, time.time() - duration, duration, passed, detail
+            )
+            self.__results.recordGpio(currentRun, step, self.__gpioService.snapshot())
         # end if
 
-        if "\r\n" in function:
-            function = function[:-2]
+        self.__loggingService.debug(
+            f"{step} {'passed' if passed else 'failed'} in {time.monotonic() - started:.3f} s"
+            + (f": {detail}" if detail else "")
+        )
+
+        if not passed:
+            self.__finishRun(False, step, runId)
         # end if
 
-        if function in self.__onMessageReceivedevents:
+    # end def
 
-            # if the command is different to page0 the clock task will stop in order to free the outputMessages queue
-            self.__runClockTask(function == "page0")
+    def __startRun(self, dut: str = None):
+        # a run left open by the previous device is closed as abandoned
+        if self.__runId is not None:
+            self.__finishRun(False, "abandoned")
+        # end if
 
-            return (
-                self.__onMessageReceivedevents[function](params)
-                if len(params) > 0
-                else self.__onMessageReceivedevents[function]()
-            )
+        if self.__results is not None:
+            self.__runId = self.__results.startRun(dut)
+        # end if
+
+    # end def
+
+    def __loadErrorLayout(self, prewarm: list):
+        try:
+            layout = textLayout(self.__font_path, self.__font_size)
+            layout.prewarm(prewarm, self.__ERROR_WIDTH)
+            self.__errorLayout.set_result(layout)
+        except Exception as e:
+            self.__loggingService.error(f"error font not loaded: {e}")
+            self.__errorLayout.set_exception(e)
+        # end try-except
+
+    # end def
+
+    def __mapEvents(self):
+        # map every command and its related function. Then at __message_received
+        # the parsed frame is dispatched to the function asosiated with its command
+        self.__onMessageReceivedevents = dispatcher(
+            {
+                "page0": self.__startPage0,
+                "cancel": self.__cancelTest,
+                "page1": self.__startPage1,
+                "page2": self.__startPage2,
+                "page3": self.__startPage3,
+                "page4": self.__startPage4,
+                "page5": self.__startPage5,
+                "page10": self.__startPage10,
+                "testCable": self.__testCable,
+            }
+        )
+
+    # end def
 
+    def __message_received(self, message: str):
+        # the frame is parsed once, handlers receive the parsed event
+        event = parseFrame(message)
+        function = event.command
+
+        if function not in self.__onMessageReceivedevents:
+            # unknown commands are only counted by the dispatcher
+            return self.__onMessageReceivedevents.dispatch(event)
         # end if
 
+        # kept in the ring buffer of recent records, dumped when the test fails
+        self.__loggingService.debug(f"received {message.strip()}")
+
+        # if the command is different to page0 the clock task will stop in order to free the outputMessages queue
+        self.__runClockTask(function in ["page0", "cancel"])
+
+        # the handler runs in the executor, the reader goes on with the next frame
+        return self.__executor.submit(
+            function, self.__onMessageReceivedevents.dispatch, event
+        )
+
     # end def
 
     def __printError(self, message: str):
@@ -230,33 +425,34 @@ class display:
             splittedMessage = splittedMessage[:2]
             splittedMessage.append(s)
 
-        self.__screenService.sendMessage("page 6")
-
-        self.__screenService.sendMessage('errorMsg.txt=""')
-
-        self.__screenService.sendMessage('xstr 34,19,250,35,0,WHITE,0,1,1,0,"Error"')
+        # the page and every line are written at once, the error never shows half drawn
+        builder = commandBuilder()
+        builder.page(6).raw(CLEAR_ERROR_MESSAGE).raw(ERROR_TITLE)
 
         y = 19 + 35
         for line in splittedMessage:
-            self.__screenService.sendMessage(
-                f'xstr 34,{y},250,{lineHeight},2,WHITE,0,1,1,0,"{line}"'
-            )
+            builder.command(f'xstr 34,{y},250,{lineHeight},2,WHITE,0,1,1,0,"{line}"')
             y += lineHeight + 5
         # end for
 
+        self.__screenService.sendFrame(builder.frame())
+
     # end def
 
     def __processLoadingAnnimation(self):
+        # the points are sent holding the lock, none of them is queued after the waveform is cleared
         with self.__showLoadingAnimation_lock:
-            show_loading = self.__showLoadingAnimation
-
-        if not hasattr(display.__processLoadingAnnimation, "i"):
-            display.__processLoadingAnnimation.i = 0  # Initialize a static variable
+            if not self.__showLoadingAnimation:
+                return None
+            # end if
 
-        if show_loading:
-            results = []
+            if not hasattr(display.__processLoadingAnnimation, "i"):
+                display.__processLoadingAnnimation.i = 0  # Initialize a static variable
 
-            val = int(100 * sin(display.__processLoadingAnnimation.i * pi / 16)) + 150
+            val = (
+                int(100 * math.sin(display.__processLoadingAnnimation.i * math.pi / 16))
+                + 150
+            )
 
             for channel in [0, 1, 2, 3]:
                 offset = channel * 10
@@ -268,27 +464,16 @@ class display:
                     channelVal = 255 - offset
                 # end if
 
-                s = f"add {self.__waveID},{channel},{channelVal}"
-
-                results.append(s)
+                self.__waveform.waveform(self.__waveID, channel, channelVal)
             # end for
 
             display.__processLoadingAnnimation.i += 1
 
-            return results
-        else:
-            ret = None
-
-            if display.__processLoadingAnnimation.i > 0:
-                ret = "cle 2,255"
-
-            # end if
-
-            display.__processLoadingAnnimation.i = 0
-            time.sleep(1)
+            # the points of every channel are queued together, they are dropped together too
+            self.__screenService.sendFrame(self.__waveform.frame(), WAVEFORM_LANE)
 
-            return ret
-        # end if
+            return None
+        # end with
 
     # end def
 
@@ -298,132 +483,223 @@ class display:
 
     # end with
 
-    def __startPage0(self):
-        self.__screenService.sendMessage("page 0")
+    def __cancelTest(self, event: commandEvent = None):
+        # the running test step was already cancelled by the executor
+        self.__loggingService.warning("test cancelled by the operator")
+
+        if self.__runId is not None:
+            self.__finishRun(False, "cancelled")
+        # end if
+
+        # the device may be replaced, the program flashed ahead of time is not trusted
+        self.__speculativeFlash = None
+
+        self.__screenService.sendFrame(PAGE[0])
+
+    # end def
+
+    def __startPage0(self, event: commandEvent = None):
+        # going back to the main page in the middle of a run cancels it
+        if self.__runId is not None:
+            self.__finishRun(False, "cancelled")
+        # end if
+
+        # the device may be replaced, the program flashed ahead of time is not trusted
+        self.__speculativeFlash = None
+
+        self.__screenService.sendFrame(PAGE[0])
 
     # end def
 
-    def __startPage1(self):
-        self.__screenService.sendMessage("page 1")
+    def __startPage1(self, event: commandEvent = None):
+        self.__screenService.sendFrame(PAGE[1])
 
     # end def
 
-    def __startPage2(self, message: str):
-        # separating command from parameters.
+    async def __startPage2(self, event: commandEvent):
+        # checking for wave id to run the loading animation
+        waveId = event.params.get("waveid")
+        animationStarted = waveId is not None
 
-        # checking for wave id to run the loading animation thread
-        animationStarted = False
+        if animationStarted:
+            self.showLoadingAnimation(True, waveId)
+        # end if
 
-        for part in message:
-            if part.lower().index("waveid=") >= 0:
-                waveId = part.split("=")
-                if len(waveId) == 2:
-                    self.showLoadingAnimation(True, waveId[1])
-                    animationStarted = True
-                # end if
-            # end if
-        # end for
+        # every step from here on is recorded in the run of the device, started by the harness check
+        # or by page 2 when it was not checked
+        if not self.__runSeated:
+            self.__startRun()
+        # end if
+
+        self.__runSeated = False
+        started = time.monotonic()
 
         # go to page 2
-        self.__screenService.sendMessage("page 2")
+        self.__screenService.sendFrame(PAGE[2])
 
-        # load test program to microcontroller
-        boardCorrectlyProgrammed = self.__loadProgramToBoard(firmware.testProgram)
+        try:
+            boardCorrectlyProgrammed = await self.__joinSpeculativeFlash()
 
-        # turn off loadiding animation
-        if animationStarted:
-            self.showLoadingAnimation(False, waveId[1])
-            self.__screenService.sendMessage("cle 2,255")  # cleaning id 2 waveform
+            # load test program to microcontroller, again if flashing it ahead of time failed
+            if not boardCorrectlyProgrammed:
+                boardCorrectlyProgrammed = await self.__loadProgramToBoard(
+                    firmware.testProgram, self.__runId
+                )
+            # end if
+        finally:
+            # turn off loadiding animation, also when the step is cancelled
+            if animationStarted:
+                self.showLoadingAnimation(False, waveId)
+                self.__screenService.sendFrame(CLEAR_WAVEFORM)  # cleaning id 2 waveform
+            # end if
+        # end try-finally
+
+        self.__recordStep("page2", started, boardCorrectlyProgrammed)
 
         # go to page 3 if succesfuly programmed
         if boardCorrectlyProgrammed:
-            self.__screenService.sendMessage("page 3")
-            self.__startPage3()
+            self.__screenService.sendFrame(PAGE[3])
+            await self.__startPage3()
         else:
-            self.__screenService.sendMessage("page 9")
+            self.__screenService.sendFrame(PAGE[9])
 
     # end def
 
-    def __startPage3(self):
-        if self.__testButton("DispBtn On\r\n", gpio.InputPin.DISPENSE_LED):
-            self.__screenService.sendMessage("page 4")
+    async def __startPage3(self, event: commandEvent = None):
+        started = time.monotonic()
+        passed = await self.__testButton("DispBtn On\r\n", gpio.InputPin.DISPENSE_LED)
+        self.__recordStep("page3", started, passed)
+
+        if passed:
+            self.__screenService.sendFrame(PAGE[4])
         else:
-            self.__printError("No se detectó el botón.\n PRUEBA NO APROBADA")
+            self.__printError(self.__BUTTON_NOT_DETECTED)
 
     # end def
 
-    def __startPage4(self):
-        if self.__testButton("fillBtn On\r\n", gpio.InputPin.FILL_LED):
-            self.__screenService.sendMessage("page 5")
+    async def __startPage4(self, event: commandEvent = None):
+        started = time.monotonic()
+        passed = await self.__testButton("fillBtn On\r\n", gpio.InputPin.FILL_LED)
+        self.__recordStep("page4", started, passed)
+
+        if passed:
+            self.__screenService.sendFrame(PAGE[5])
         else:
-            self.__printError("No se detectó el botón.\n PRUEBA NO APROBADA")
+            self.__printError(self.__BUTTON_NOT_DETECTED)
 
     # end def
 
-    def __startPage5(self, message: str):
-        animationStarted = False
-
-        for part in message:
-            if part.lower().index("waveid=") >= 0:
-                waveId = part.split("=")
-                if len(waveId) == 2:
-                    self.showLoadingAnimation(True, waveId[1])
-                    animationStarted = True
-                # end if
-            # end if
-        # end for
+    async def __startPage5(self, event: commandEvent):
+        started = time.monotonic()
+        waveId = event.params.get("waveid")
+        animationStarted = waveId is not None
 
-        time.sleep(2)
+        if animationStarted:
+            self.showLoadingAnimation(True, waveId)
+        # end if
 
-        self.__gpioService.setPin(gpio.OutputPin.FLOATING_SWITCH, True)
+        try:
+            await asyncio.sleep(2)
 
-        result = self.__testButton("FloatingSwitchOn\r\n", timeout=10)
+            self.__gpioService.setPin(gpio.OutputPin.FLOATING_SWITCH, True)
 
-        self.__gpioService.togglePin(gpio.OutputPin.FLOATING_SWITCH)
+            result = await self.__testButton("FloatingSwitchOn\r\n", timeout=10)
+        finally:
+            # the switch is released and the animation turned off, also when the step is cancelled
+            self.__gpioService.setPin(gpio.OutputPin.FLOATING_SWITCH, False)
 
-        # turn off loadiding animation
-        if animationStarted:
-            self.showLoadingAnimation(False, waveId[1])
-            self.__screenService.sendMessage("cle 2,255")  # cleaning id 2 waveform
+            if animationStarted:
+                self.showLoadingAnimation(False, waveId)
+                self.__screenService.sendFrame(CLEAR_WAVEFORM)  # cleaning id 2 waveform
+            # end if
+        # end try-finally
 
-        self.__loadProgramToBoard(firmware.productionProgram)
+        passed = False
+        flashed = None
+        relays = None
 
         if result:
-            self.__testBoardRelays()
+            # the relays are checked on the firmware that ships, the test program's last step is done
+            flashed = await self.__loadProgramToBoard(
+                firmware.productionProgram, self.__runId
+            )
+
+            if flashed:
+                relays = await asyncio.to_thread(self.__testBoardRelays)
+            # end if
+
+            passed = flashed and relays
+        # end if
+
+        self.__recordStep(
+            "page5",
+            started,
+            passed,
+            f"floatingSwitch={result}, firmware={flashed}, relays={relays}",
+        )
+
+        # the result is shown once the device can be pulled, never while it is being flashed
+        if passed:
+            self.__finishRun(True)
+            self.__screenService.sendFrame(PAGE[8])
+        elif flashed is False:
+            self.__printError(self.__FIRMWARE_NOT_LOADED)
         else:
-            self.__screenService.sendMessage("page 9")
+            self.__screenService.sendFrame(PAGE[9])
+        # end if
+
+    # end def
+
+    async def __joinSpeculativeFlash(self) -> bool:
+        """Waits for the test program flashed after the harness check, False if there is none."""
+        speculative = self.__speculativeFlash
+        self.__speculativeFlash = None
+
+        if speculative is None:
+            return False
+        # end if
+
+        try:
+            # shielded, cancelling the step does not cancel the flashing
+            return await asyncio.shield(asyncio.wrap_future(speculative))
+        except Exception as e:
+            self.__loggingService.error(f"flashing ahead of time failed: {e}")
+            return False
+        # end try-except
 
     # end def
 
-    def __startPage10(self):
-        self.__screenService.sendMessage("page 10")
+    def __startPage10(self, event: commandEvent = None):
+        self.__screenService.sendFrame(PAGE[10])
 
-    def __testButton(
+    async def __testButton(
         self,
         expectedMessage: str,
         ledInput: gpio.InputPin | None = None,
         timeout: float = 60,
     ) -> bool:
         # start a timer for 60 seconds or something
-        startTime = time.time()
-
-        isLEDActive = True
+        startTime = time.monotonic()
 
         while True:
-            if time.time() - startTime > timeout:
+            remaining = timeout - (time.monotonic() - startTime)
+
+            if remaining <= 0:
                 return False
             # end if
 
-            # check on input messages messages to check if the button was pressed
-            message = self.__boardService.getMessage()
+            # waiting for the board's message that reports the button was pressed
+            message = await self.__boardService.receive(remaining)
 
-            if ledInput:
-                isLEDActive = self.__gpioService.readPin(ledInput)
+            if not (
+                isinstance(message, str) and message.strip() == expectedMessage.strip()
+            ):
+                continue
+            # end if
 
-            if (
-                isinstance(message, str)
-                and message.strip() == expectedMessage.strip()
-                and isLEDActive
+            # the LED may light up right after the message, waiting for its edge
+            if ledInput is None or await asyncio.to_thread(
+                self.__gpioService.waitForLevel, ledInput, True, self.__LED_TIMEOUT
             ):
                 return True
             # end if
@@ -435,35 +711,59 @@ class display:
 
     # end def
 
-    def __testCable(self):
-        result = self.__testGPIO(
-            [
-                gpio.InputPin.HARNESS_BLACK,
-                gpio.InputPin.HARNESS_RED,
-                gpio.InputPin.HARNESS_WHITE,
-                gpio.InputPin.HARNESS_GREEN,
-            ],
-            [
-                gpio.OutputPin.HARNESS_BLACK,
-                gpio.OutputPin.HARNESS_RED,
-                gpio.OutputPin.HARNESS_WHITE,
-                gpio.OutputPin.HARNESS_GREEN,
-            ],
+    def __testCable(self, event: commandEvent = None):
+        # a new device under test, the harness check is the first step of its run
+        self.__startRun()
+        started = time.monotonic()
+
+        # every wire is driven on its own so opens, shorts and swapped wires are told apart
+        result = self.__gpioService.scanHarness()
+
+        self.__recordStep(
+            "testCable",
+            started,
+            result["passed"],
+            f"stuck: {result['stuck']}, opens: {result['opens']}, "
+            f"shorts: {result['shorts']}, swaps: {result['swaps']}",
         )
 
-        if result:
-            self.__screenService.sendMessage("page 8")
+        # a failed step already ended the run
+        if result["passed"]:
+            self.__runSeated = True
+
+            # the device is seated, its test program is flashed while the operator moves on
+            if self.__pipelined:
+                self.__speculativeFlash = asyncio.run_coroutine_threadsafe(
+                    self.__loadProgramToBoard(firmware.testProgram, self.__runId),
+                    self.__loop,
+                )
+            # end if
+
+            self.__screenService.sendFrame(PAGE[8])
         else:
-            self.__screenService.sendMessage(f"page 9")
+            self.__loggingService.error(
+                f"harness test failed. stuck: {result['stuck']}, opens: {result['opens']}, "
+                f"shorts: {result['shorts']}, swaps: {result['swaps']}"
+            )
+            self.__screenService.sendFrame(PAGE[9])
 
     def __testGPIO(
-        self, inputs: list[gpio.InputPin], outputs: list[gpio.OutputPin]
+        self,
+        inputs: list[gpio.InputPin],
+        outputs: list[gpio.OutputPin],
+        timeout: float = 0,
     ) -> bool:
         self.__gpioService.setPin(outputs, True)
 
         attempts = 0
         result = False
 
+        if timeout > 0:
+            # a relay closes once the board handled its command, the line is waited for
+            result = self.__gpioService.waitForLevel(inputs, True, timeout)
+            attempts = 5
+        # end if
+
         while attempts < 5 and not result:
 
             for level in self.__gpioService.readPin(inputs):
@@ -486,18 +786,27 @@ class display:
 
     # end def
 
-    def __testBoardRelays(self):
+    def __testBoardRelays(self) -> bool:
+        passed = True
+
+        # runs in a worker thread, the lines are waited for. Once the closed relay's line is high the
+        # board handled the commands written before, the other lines are read right away
+
         # testing agitator relay. Expected to return True. The rest of the relays must return False.
         self.__boardService.writeMessage("agitatorOn")
 
         if not (
-            self.__testGPIO([gpio.InputPin.AGITATOR_LINE], [gpio.OutputPin.LINE])
+            self.__testGPIO(
+                [gpio.InputPin.AGITATOR_LINE],
+                [gpio.OutputPin.LINE],
+                self.__RELAY_TIMEOUT,
+            )
             and not self.__testGPIO([gpio.InputPin.FILL_LINE], [gpio.OutputPin.LINE])
             and not self.__testGPIO(
                 [gpio.InputPin.DISPENSER_LINE], [gpio.OutputPin.LINE]
             )
         ):
-            self.__screenService.sendMessage("page 9")
+            passed = False
         # end if
 
         self.__boardService.writeMessage("agitatorOff")
@@ -506,7 +815,9 @@ class display:
         self.__boardService.writeMessage("FillOn")
 
         if not (
-            self.__testGPIO([gpio.InputPin.FILL_LINE], [gpio.OutputPin.LINE])
+            self.__testGPIO(
+                [gpio.InputPin.FILL_LINE], [gpio.OutputPin.LINE], self.__RELAY_TIMEOUT
+            )
             and not self.__testGPIO(
                 [gpio.InputPin.AGITATOR_LINE], [gpio.OutputPin.LINE]
             )
@@ -514,7 +825,7 @@ class display:
                 [gpio.InputPin.DISPENSER_LINE], [gpio.OutputPin.LINE]
             )
         ):
-            self.__screenService.sendMessage("page 9")
+            passed = False
         # end if
 
         self.__boardService.writeMessage("FillOff")
@@ -524,17 +835,22 @@ class display:
         self.__boardService.writeMessage("DispOff")
 
         if not (
-            self.__testGPIO([gpio.InputPin.DISPENSER_LINE], [gpio.OutputPin.LINE])
+            self.__testGPIO(
+                [gpio.InputPin.DISPENSER_LINE],
+                [gpio.OutputPin.LINE],
+                self.__RELAY_TIMEOUT,
+            )
             and not self.__testGPIO(
                 [gpio.InputPin.AGITATOR_LINE], [gpio.OutputPin.LINE]
             )
             and not self.__testGPIO([gpio.InputPin.FILL_LINE], [gpio.OutputPin.LINE])
         ):
-            self.__screenService.sendMessage("page 9")
+            passed = False
         # end if
 
         self.__boardService.writeMessage("DispOn")
-        self.__screenService.sendMessage("page 8")
+
+        return passed
 
     # end def
 
@@ -561,9 +877,16 @@ class display:
         Returns:
             None
         """
+        if self.__supervisor is not None:
+            self.__supervisor.stop()
+        # end if
+
         self.__screenService.closeConnection()
+        self.__executor.shutdown()
         self.__boardService.dispose()
         self.__gpioService.cleanup()
+        stopEventLoop()
+        stopScheduler()
 
     # end def
 
@@ -574,9 +897,27 @@ class display:
 
     def showLoadingAnimation(self, show: bool, waveFormObjectId: int):
         with self.__showLoadingAnimation_lock:
+            shown = self.__showLoadingAnimation
             self.__showLoadingAnimation = show
             self.__waveID = waveFormObjectId
 
+            if shown and not show:
+                display.__processLoadingAnnimation.i = 0
+            # end if
+        # end with
+
+        # the animation's task runs 60 times a second, it is only scheduled while the animation is
+        # shown. The tasks are started and stopped without holding the lock, the animation takes it
+        if show and not shown:
+            self.__screenService.runWritingTask(
+                self.__processLoadingAnnimation, "loading", 1 / 60, FIXED_RATE
+            )
+        elif shown and not show:
+            self.__screenService.stopTask("loading")
+            # after the last points, in their lane
+            self.__screenService.sendFrame(CLEAR_WAVEFORM, WAVEFORM_LANE)
+        # end if
+
     # end def
 
 
@@ -1,5 +1,8 @@
-import RPi.GPIO as gpio
+import threading
+import time
 from enum import Enum
+from libraries.gpioBackend import createGpioBackend, pinsToMask
+from typing import Any, Dict
 
 
 class OutputPin(Enum):
@@ -29,11 +32,57 @@ class InputPin(Enum):
 # end class
 
 
+class Edge(Enum):
+    RISING = 0
+    FALLING = 1
+    BOTH = 2
+
+
+# end class
+
+
+def harnessWires() -> list[tuple[OutputPin, InputPin]]:
+    """Pairs every HARNESS_* output with the input of the same name."""
+    return [
+        (output, InputPin[output.name])
+        for output in OutputPin
+        if output.name.startswith("HARNESS_") and output.name in InputPin.__members__
+    ]
+
+
+# end def
+
+
 class GPIO:
-    def __init__(self):
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        Initialize the pins.
+
+        Args:
+            config (Dict[str, Any]): optional "backend" key, "rpi" (default) to use RPi.GPIO or "gpiomem"
+                to read and write every pin at once through the registers mapped from "path"
+                (/dev/gpiomem by default).
+
+        Returns:
+            None
+        """
+        config = config if config else {}
+        harness = config.get("harness", {})
 
-        # setting gpio mode
-        gpio.setmode(gpio.BCM)
+        self.__settleTime = harness.get("settleTime", 0.001)
+        self.__debounceTime = harness.get("debounceTime", 0.0005)
+
+        # edge callbacks run in RPi.GPIO's thread, waiters are woken up through the condition
+        self.__condition = threading.Condition()
+        self.__edgeCounts = {pin.value: 0 for pin in InputPin}
+        self.__eventsEnabled = True
+
+        # setting gpio backend
+        backend = createGpioBackend(
+            config.get("backend", "rpi"), config.get("path", "/dev/gpiomem")
+        )
+        self.__backend = backend
+        self.__inputMask = pinsToMask([pin.value for pin in InputPin])
 
         # check for repeated values between input and output pins
         for output in OutputPin:
@@ -47,7 +96,7 @@ class GPIO:
         # setting output pins
         for pin in OutputPin:
             if isinstance(pin.value, int):
-                gpio.setup(pin.value, gpio.OUT, initial=gpio.LOW)
+                backend.setupOutput(pin.value)
             else:
                 raise ValueError(
                     f"The {pin.name}'s value, at OutputPin enum in {__file__}, must be an integer. Type = {type(pin.value)}"
@@ -56,40 +105,175 @@ class GPIO:
         # setting input pins
         for pin in InputPin:
             if isinstance(pin.value, int):
-                gpio.setup(pin.value, gpio.IN, pull_up_down=gpio.PUD_DOWN)
+                backend.setupInput(pin.value)
             else:
                 raise ValueError(
                     f"The {pin.name}'s value at InputPin enum in {__file__}, must be an integer. Type = {type(pin.value)}"
                 )
 
+        # detecting every edge of the input pins, waits poll the pins if it is not available
+        for pin in InputPin:
+            try:
+                backend.addEdgeCallback(pin.value, self.__onEdge)
+            except RuntimeError:
+                self.__eventsEnabled = False
+            # end try-except
+        # end for
+
     # end def
 
     def readPin(self, pin: InputPin | list[InputPin]) -> bool | list[bool]:
+        # every pin is read from a single snapshot
+        snapshot = self.snapshot()
 
         if isinstance(pin, InputPin):
-            return gpio.input(pin.value)
+            return bool(snapshot >> pin.value & 1)
         # end if
 
         result = []
 
         for p in pin:
-            result.append(gpio.input(p.value))
+            result.append(bool(snapshot >> p.value & 1))
         # end for
 
         return result
 
     # end def
 
+    def scanHarness(
+        self,
+        wires: list[tuple[OutputPin, InputPin]] | None = None,
+        settleTime: float | None = None,
+        debounceTime: float | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Drives every wire of the harness in turn and reads all of its inputs at once after each one,
+        building a connectivity matrix where row i is the driven output and column j the input read.
+
+        Args:
+            wires (list[tuple[OutputPin, InputPin]] | None): output and the input it must reach for every
+                wire. By default every HARNESS_* output is paired with the input of the same name.
+            settleTime (float | None): seconds to wait after driving a wire. Uses the config if None.
+            debounceTime (float | None): seconds between the reads that must agree. Uses the config if None.
+
+        Returns:
+            Dict[str, Any]: "wires" names, "matrix", "stuck" inputs that read high with nothing driven,
+                "opens" wires reaching no input, "shorts" pairs of wires connected together,
+                "swaps" (wire, input reached) for wires reaching another input and "passed".
+        """
+        if wires is None:
+            wires = harnessWires()
+        # end if
+
+        settleTime = self.__settleTime if settleTime is None else settleTime
+        debounceTime = self.__debounceTime if debounceTime is None else debounceTime
+
+        outputs = [output for output, _ in wires]
+        inputs = [input for _, input in wires]
+        inputMask = pinsToMask([input.value for input in inputs])
+
+        def read():
+            time.sleep(settleTime)
+            level = self.__backend.readMask(inputMask)
+
+            # reading until two consecutive snapshots agree
+            for _ in range(5):
+                if debounceTime <= 0:
+                    break
+                # end if
+
+                time.sleep(debounceTime)
+                previous, level = level, self.__backend.readMask(inputMask)
+
+                if previous == level:
+                    break
+                # end if
+            # end for
+
+            return [bool(level >> input.value & 1) for input in inputs]
+
+        # end def
+
+        self.setPin(outputs, False)
+        stuck = [wire.name for wire, high in zip(inputs, read()) if high]
+        matrix = []
+
+        try:
+            for output in outputs:
+                self.setPin(output, True)
+                matrix.append(read())
+                self.setPin(output, False)
+            # end for
+        finally:
+            self.setPin(outputs, False)
+        # end try-finally
+
+        names = [output.name for output in outputs]
+        opens = []
+        shorts = []
+        swaps = []
+
+        for i, row in enumerate(matrix):
+            if not any(row):
+                opens.append(names[i])
+            # end if
+
+            for j, connected in enumerate(row):
+                if connected and j != i:
+                    if matrix[i][i] or matrix[j][j]:
+                        # the wire reaches its own input and another one
+                        pair = tuple(sorted([names[i], names[j]]))
+
+                        if pair not in shorts:
+                            shorts.append(pair)
+                        # end if
+                    else:
+                        swaps.append((names[i], inputs[j].name))
+                    # end if
+                # end if
+            # end for
+        # end for
+
+        return {
+            "wires": names,
+            "matrix": matrix,
+            "stuck": stuck,
+            "opens": opens,
+            "shorts": shorts,
+            "swaps": swaps,
+            "passed": len(stuck) + len(opens) + len(shorts) + len(swaps) == 0
+            and all(matrix[i][i] for i in range(len(matrix))),
+        }
+
+    # end def
+
     def setPin(self, pin: OutputPin | list[OutputPin], level: bool) -> None:
         pinv = []
         if isinstance(pin, list):
             for p in pin:
                 pinv.append(p.value)
         else:
-            pinv = pin.value
+            pinv = [pin.value]
         # end if
 
-        gpio.output(pinv, level)
+        mask = pinsToMask(pinv)
+
+        if level:
+            self.__backend.writeMask(mask, 0)
+        else:
+            self.__backend.writeMask(0, mask)
+        # end if
+
+    # end def
+
+    def snapshot(self) -> int:
+        """
+        Reads every InputPin at once.
+
+        Returns:
+            int: bitmask of the input levels, bit n is the level of the pin with value n.
+        """
+        return self.__backend.readMask(self.__inputMask)
 
     # end def
 
@@ -98,13 +282,129 @@ class GPIO:
             pin = [pin]
         # end if
 
-        for p in pin:
-            level = gpio.input(p.value)
-            gpio.output(p.value, not level)
+        mask = pinsToMask([p.value for p in pin])
+        level = self.__backend.readMask(mask)
+
+        self.__backend.writeMask(mask & ~level, level)
+
+    # end def
+
+    def __onEdge(self, channel: int) -> None:
+        with self.__condition:
+            self.__edgeCounts[channel] += 1
+            self.__condition.notify_all()
+
+    # end def
+
+    def __wait(self, condition, timeout: float) -> bool:
+        """Waits until condition returns True, checking it again after every edge."""
+        deadline = time.monotonic() + timeout
+
+        with self.__condition:
+            while not condition():
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    return False
+                # end if
+
+                self.__condition.wait(
+                    remaining if self.__eventsEnabled else min(remaining, 0.001)
+                )
+            # end while
+
+        return True
 
     # end def
 
     def cleanup(self) -> None:
-        gpio.cleanup()
+        self.__backend.cleanup()
+
+    # end def
+
+    def waitForEdge(
+        self, pin: InputPin, edge: Edge = Edge.RISING, timeout: float = 60
+    ) -> bool:
+        """
+        Blocks until the pin changes its level in the given direction.
+
+        Args:
+            pin (InputPin): pin to watch.
+            edge (Edge): direction of the change.
+            timeout (float): seconds to wait.
+
+        Returns:
+            bool: False if the timeout expired.
+        """
+        with self.__condition:
+            count = self.__edgeCounts[pin.value]
+            level = self.readPin(pin)
+        # end with
+
+        def changed():
+            nonlocal count, level
+
+            if self.__eventsEnabled and self.__edgeCounts[pin.value] == count:
+                return False
+            # end if
+
+            edges = self.__edgeCounts[pin.value] - count
+            count = self.__edgeCounts[pin.value]
+            previous, level = level, self.readPin(pin)
+
+            if self.__eventsEnabled and (previous == level or edges > 1):
+                # a fast pulse can end before the pin is read, both edges were detected anyway, the
+                # one asked for among them
+                return True
+            # end if
+
+            if previous == level:
+                return False
+            # end if
+
+            return edge == Edge.BOTH or level == (edge == Edge.RISING)
+
+        # end def
+
+        return self.__wait(changed, timeout)
+
+    # end def
+
+    def waitForLevel(
+        self,
+        pins: InputPin | list[InputPin],
+        levels: bool | list[bool],
+        timeout: float = 60,
+    ) -> bool:
+        """
+        Blocks until every pin reads its level. Returns right away if they already do.
+
+        Args:
+            pins (InputPin | list[InputPin]): pins to watch.
+            levels (bool | list[bool]): expected level for every pin, a single level applies to all.
+            timeout (float): seconds to wait.
+
+        Returns:
+            bool: False if the timeout expired.
+        """
+        if isinstance(pins, InputPin):
+            pins = [pins]
+        # end if
+
+        if isinstance(levels, bool):
+            levels = [levels] * len(pins)
+        # end if
+
+        def matches():
+            snapshot = self.snapshot()
+
+            return all(
+                bool(snapshot >> pin.value & 1) == level
+                for pin, level in zip(pins, levels)
+            )
+
+        # end def
+
+        return self.__wait(matches, timeout)
 
     # end def
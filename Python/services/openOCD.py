@@ -1,32 +1,131 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
+import asyncio
+import concurrent.futures
 import os
 import subprocess
-import pathlib
+import threading
+import time
+import zlib
+from libraries.eventLoop import getEventLoop
+from libraries.firmwareImage import loadImage, loadPagedImage
+from libraries.loggerSetup import setup_logger
+from libraries.metrics import getRegistry, DURATION_BUCKETS
+from libraries.tclRpcClient import tclRpcClient
 
 
 class openOCD:
-    __COMMAND = ["sudo", "openocd", "-f", "interface/raspberrypi-native.cfg", "-f"]
+    __COMMAND = ["sudo", "openocd"]
+    __INTERFACE = "interface/raspberrypi-native.cfg"
+    __READ_CHUNK = 4096
+    # seconds openocd is given to exit after SIGTERM before it is killed
+    __STOP_GRACE = 2
 
     def __init__(self, config: Dict[str, Any]) -> None:
-        """Initialize OpenOCD with the given configuration."""
+        """
+        Initialize OpenOCD with the given configuration.
 
-        path = self.__check_for_key_in_section("path", config)
-        # changing directory so that it can look for the other keys if they exist
-        os.chdir(path)
+        The section may contain a "targets" list to flash several boards at the same time. Every
+        target needs a "name", a "testProgram" and a "firmware" and can set its own "interface" cfg.
+        If there is no list, the "testProgram" and "firmware" keys of the section are the only target.
 
-        test = self.__check_for_key_in_section("testProgram", config)
-        firmware = self.__check_for_key_in_section("firmware", config)
+        With "mode" set to "daemon" openocd is started once and the default target is flashed through
+        its Tcl RPC port. The "daemon" section needs a "config" cfg that sets up the target without
+        init or program commands, a "testImage" and a "firmwareImage". "tclPort", "startTimeout" and
+        "skipIfIdentical" are optional. When "skipIfIdentical" is true an image already programmed in
+        the target is not written again.
 
-        self.__test = test
-        self.__firmware = firmware
+        With "delta" set to true in the "daemon" section only the flash pages that differ from the
+        image are written, see program_delta. "pageSize" is 256 by default, the rows of the SAMD21,
+        and "cacheDirectory", relative to the openocd path, is where the paged images are kept.
+        """
+
+        # the other paths are relative to the openocd folder, openocd also runs inside of it
+        path = self.__check_for_key_in_section("path", config, os.getcwd())
+
+        targets = config.get(
+            "targets",
+            [
+                {
+                    "name": "default",
+                    "testProgram": config.get("testProgram"),
+                    "firmware": config.get("firmware"),
+                }
+            ],
+        )
+
+        if len(targets) == 0:
+            raise KeyError("there are no targets at openocd section")
+        # end if
+
+        self.__targets = {}
+
+        for target in targets:
+            if "name" not in target:
+                raise KeyError("there's no name for a target at openocd section")
+            # end if
+
+            self.__targets[target["name"]] = {
+                "interface": target.get("interface", self.__INTERFACE),
+                "testProgram": self.__check_for_key_in_section(
+                    "testProgram", target, path
+                ),
+                "firmware": self.__check_for_key_in_section("firmware", target, path),
+            }
+        # end for
+
+        self.__command = config.get("command", self.__COMMAND)
+        self.__maxParallel = config.get("maxParallel", len(self.__targets))
+
+        defaultTarget = next(iter(self.__targets.values()))
+
+        self.__interface = defaultTarget["interface"]
+        self.__test = defaultTarget["testProgram"]
+        self.__firmware = defaultTarget["firmware"]
         self.__path = path
 
+        self.__loggingService = setup_logger("openocd")
+        self.__mode = config.get("mode", "subprocess")
+        self.__daemon = None
+        self.__daemonLock = threading.RLock()
+
+        if self.__mode == "daemon":
+            daemonConfig = config.get("daemon", {})
+
+            self.__daemonConfig = self.__check_for_key_in_section(
+                "config", daemonConfig, path
+            )
+            self.__testImage = self.__check_for_key_in_section(
+                "testImage", daemonConfig, path
+            )
+            self.__firmwareImage = self.__check_for_key_in_section(
+                "firmwareImage", daemonConfig, path
+            )
+            self.__tclPort = daemonConfig.get("tclPort", 6666)
+            self.__startTimeout = daemonConfig.get("startTimeout", 10)
+            self.__skipIfIdentical = daemonConfig.get("skipIfIdentical", False)
+            self.__delta = daemonConfig.get("delta", False)
+            self.__pageSize = daemonConfig.get("pageSize", 256)
+            self.__cacheDirectory = os.path.join(
+                path, daemonConfig.get("cacheDirectory", ".cache")
+            )
+            self.__tcl = tclRpcClient(port=self.__tclPort)
+
+            # the images are parsed and the daemon started in the background, the station does not
+            # wait for them to start. The first call to the daemon does
+            self.__daemonPrepared = threading.Event()
+            threading.Thread(
+                target=self.__prepare_daemon, name="openocdDaemonStart", daemon=True
+            ).start()
+        elif self.__mode != "subprocess":
+            raise ValueError(f"Unknown openocd mode: {self.__mode}")
+        # end if
+
     # end def
 
-    def __check_for_key_in_section(self, key, dictionary):
-        """Check for the given key in the dictionary and verify the path exists."""
-        if key in dictionary:
-            absolutePath = os.path.abspath(os.getcwd()) + "/"
+    def __check_for_key_in_section(self, key, dictionary, base):
+        """Check for the given key in the dictionary and verify the path, relative to base, exists."""
+        if key in dictionary and dictionary[key] is not None:
+            absolutePath = os.path.abspath(base) + "/"
             path = absolutePath + dictionary[key]
 
             if not os.path.exists(path):
@@ -36,23 +135,265 @@ class openOCD:
             # end if
 
         else:
-            raise KeyError("there's no path at openocd section")
+            raise KeyError(f"there's no {key} at openocd section")
 
         # end if
 
     # end def
 
-    def _execute_command(self, file):
-        """Execute the OpenOCD command with the given file."""
-        command = self.__COMMAND.copy()
-        command.append(file)
+    def __build_command(self, file, interface=None):
+        command = self.__command.copy()
+        command.extend(["-f", interface if interface else self.__INTERFACE, "-f", file])
+
+        return command
+
+    # end def
+
+    def __daemon_call(self, command: str) -> str:
+        """Sends the command to the daemon, restarting it once if it is not answering."""
+        self.__daemonPrepared.wait()
+
+        with self.__daemonLock:
+            if self.__daemon is None or self.__daemon.poll() is not None:
+                self.__loggingService.warning("openocd daemon is not running")
+                self.__start_daemon()
+            # end if
+
+            try:
+                return self.__tcl.call(command)
+            except OSError as e:
+                self.__loggingService.error(f"openocd daemon failed: {e}")
+                getRegistry().counter(
+                    "openocd_daemon_restarts_total",
+                    "Times the openocd daemon was restarted because it stopped answering",
+                ).inc()
+                self.__start_daemon()
+                return self.__tcl.call(command)
+            # end try-except
+
+    # end def
+
+    def __daemon_check(self, command: str) -> Dict[str, Any]:
+        """Runs the command inside a tcl catch so that failures are reported instead of raised."""
+        try:
+            # "<catch code> <result>", the code is 0 when the command succeeded
+            response = self.__daemon_call(
+                f'format "%d %s" [catch {{{command}}} result] $result'
+            )
+        except (OSError, RuntimeError) as e:
+            return {"Output:": "", "Error:": str(e), "Success": False}
+        # end try-except
+
+        code, _, output = response.partition(" ")
+        success = code == "0"
+
+        return {
+            "Output:": output if success else "",
+            "Error:": "" if success else output,
+            "Success": success,
+        }
+
+    # end def
+
+    def __record_flash(
+        self, program: str, target: str, start: float, result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        registry = getRegistry()
+        registry.histogram(
+            "flash_seconds",
+            "Time spent flashing a target",
+            DURATION_BUCKETS,
+            program=program,
+            target=target,
+        ).observe(time.monotonic() - start)
+        registry.counter(
+            "flash_total",
+            "Flashing attempts by result",
+            program=program,
+            target=target,
+            result="success" if result["Success"] else "failure",
+        ).inc()
+
+        return result
+
+    # end def
+
+    def __prepare_daemon(self):
+        try:
+            # parsing and hashing the images once, loadImage keeps them cached
+            for image in [self.__testImage, self.__firmwareImage]:
+                parsedImage = loadImage(image)
+                self.__loggingService.info(
+                    f"{os.path.basename(image)}: {parsedImage.size} bytes, "
+                    f"{len(parsedImage.sections)} sections, sha256 {parsedImage.digest}"
+                )
+
+                if self.__delta:
+                    loadPagedImage(image, self.__pageSize, self.__cacheDirectory)
+                # end if
+            # end for
+
+            self.__start_daemon()
+        except Exception as e:
+            # the next call tries to start it again
+            self.__loggingService.error(f"openocd daemon not started: {e}")
+        finally:
+            self.__daemonPrepared.set()
+        # end try-except
+
+    # end def
+
+    def __start_daemon(self):
+        with self.__daemonLock:
+            self.__stop_daemon()
 
-        path = pathlib.Path(__file__).parent.resolve()
-        path = path.parent / self.__path
+            command = self.__command.copy()
+            command.extend(
+                [
+                    "-f",
+                    self.__interface,
+                    "-c",
+                    f"tcl_port {self.__tclPort}",
+                    "-c",
+                    "gdb_port disabled",
+                    "-c",
+                    "telnet_port disabled",
+                    "-f",
+                    self.__daemonConfig,
+                    "-c",
+                    "init",
+                ]
+            )
 
-        # os.chdir(path)
+            self.__loggingService.info("starting openocd daemon")
+            self.__daemon = subprocess.Popen(
+                command,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                cwd=self.__path,
+            )
 
-        result = subprocess.run(command, capture_output=True, text=True)
+            # waiting for the tcl server to accept connections
+            deadline = time.monotonic() + self.__startTimeout
+
+            while True:
+                if self.__daemon.poll() is not None:
+                    raise RuntimeError(
+                        f"openocd daemon exited with code {self.__daemon.returncode}"
+                    )
+                # end if
+
+                try:
+                    self.__tcl.connect()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        self.__stop_daemon()
+                        raise TimeoutError("openocd daemon did not open its tcl port")
+                    # end if
+
+                    time.sleep(0.05)
+                # end try-except
+            # end while
+
+            self.__loggingService.info("openocd daemon started")
+
+    # end def
+
+    def __stop_daemon(self):
+        if self.__daemon is None:
+            return
+        # end if
+
+        if self.__daemon.poll() is None:
+            try:
+                self.__tcl.call("shutdown")
+            except OSError:
+                pass
+            # end try-except
+
+            try:
+                self.__daemon.wait(2)
+            except subprocess.TimeoutExpired:
+                self.__daemon.terminate()
+                self.__daemon.wait()
+            # end try-except
+        # end if
+
+        self.__tcl.close()
+        self.__daemon = None
+
+    # end def
+
+    async def __flash_target(self, name, program, file, interface, timeout, semaphore):
+        async with semaphore:
+            start = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                *self.__build_command(file, interface),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=self.__path,
+            )
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+                success = process.returncode == 0
+            except asyncio.TimeoutError:
+                stdout, stderr = await self.__stop_process(process)
+                stderr = stderr + f"\ntimeout after {timeout} s".encode()
+                success = False
+            except asyncio.CancelledError:
+                # the flashing session must not outlive the cancelled request
+                await self.__stop_process(process)
+                raise
+            # end try-except
+
+            return self.__record_flash(
+                program,
+                name,
+                start,
+                {
+                    "Target": name,
+                    "Output:": stdout.decode(errors="ignore"),
+                    "Error:": stderr.decode(errors="ignore"),
+                    "Success": success,
+                    "Duration": time.monotonic() - start,
+                },
+            )
+
+    # end def
+
+    async def __stop_process(self, process):
+        """
+        Stops an openocd process and returns its output. sudo forwards SIGTERM to openocd but it can
+        not forward SIGKILL, a killed sudo would leave openocd holding the adapter. The process is
+        only killed if it is still running __STOP_GRACE seconds after SIGTERM.
+        """
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            pass
+        # end try-except
+
+        try:
+            return await asyncio.wait_for(process.communicate(), self.__STOP_GRACE)
+        except asyncio.TimeoutError:
+            self.__loggingService.error(
+                f"openocd did not exit {self.__STOP_GRACE} s after SIGTERM, killing it"
+            )
+            process.kill()
+            return await process.communicate()
+        # end try-except
+
+    # end def
+
+    def _execute_command(self, file):
+        """Execute the OpenOCD command with the given file."""
+        command = self.__build_command(file, self.__interface)
+
+        result = subprocess.run(
+            command, capture_output=True, text=True, cwd=self.__path
+        )
 
         # Print the output and errors
         return {
@@ -63,15 +404,370 @@ class openOCD:
 
     # end def
 
+    async def burn_targets(
+        self,
+        program: str = "testProgram",
+        targets: List[str] = None,
+        timeout: float = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Flash several targets at the same time, one openocd process per target.
+
+        Args:
+            program (str): "testProgram" or "firmware".
+            targets (List[str]): names of the targets to flash. All of them if None.
+            timeout (float): seconds allowed per target before its openocd process is killed.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: the result of every target by name. Cancelling the coroutine
+                kills every openocd process still running.
+        """
+        if program not in ["testProgram", "firmware"]:
+            raise ValueError(f"Unknown program: {program}")
+        # end if
+
+        names = targets if targets is not None else list(self.__targets.keys())
+        semaphore = asyncio.Semaphore(self.__maxParallel)
+
+        results = await asyncio.gather(
+            *[
+                self.__flash_target(
+                    name,
+                    program,
+                    self.__targets[name][program],
+                    self.__targets[name]["interface"],
+                    timeout,
+                    semaphore,
+                )
+                for name in names
+            ]
+        )
+
+        return {result["Target"]: result for result in results}
+
+    # end def
+
+    def start_burning_targets(
+        self,
+        program: str = "testProgram",
+        targets: List[str] = None,
+        timeout: float = None,
+    ) -> concurrent.futures.Future:
+        """
+        Starts burn_targets in the shared event loop. The result is available through the returned
+        future, which can be cancelled to stop the flashing.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.burn_targets(program, targets, timeout), getEventLoop()
+        )
+
+    # end def
+
     def burn_test_program(self):
         """Burn the microcontroller with the test program."""
-        return self._execute_command(self.__test)
+        start = time.monotonic()
+
+        if self.__mode == "daemon" and self.__delta:
+            result = self.program_delta(self.__testImage)
+        elif self.__mode == "daemon":
+            result = self.program(
+                self.__testImage, skipIfIdentical=self.__skipIfIdentical
+            )
+        else:
+            result = self._execute_command(self.__test)
+        # end if
+
+        return self.__record_flash("testProgram", "default", start, result)
 
     # end def
 
     def burn_firmware(self):
         """Burn the microcontroller with the firmware."""
-        return self._execute_command(self.__firmware)
+        start = time.monotonic()
+
+        if self.__mode == "daemon" and self.__delta:
+            result = self.program_delta(self.__firmwareImage)
+        elif self.__mode == "daemon":
+            result = self.program(
+                self.__firmwareImage, skipIfIdentical=self.__skipIfIdentical
+            )
+        else:
+            result = self._execute_command(self.__firmware)
+        # end if
+
+        return self.__record_flash("firmware", "default", start, result)
+
+    # end def
+
+    def dispose(self) -> None:
+        """Stops the openocd daemon if it is running."""
+        if self.__mode == "daemon":
+            # a daemon still starting would be left running otherwise
+            self.__daemonPrepared.wait()
+        # end if
+
+        with self.__daemonLock:
+            self.__stop_daemon()
+
+    # end def
+
+    def get_targets(self) -> List[str]:
+        return list(self.__targets.keys())
+
+    # end def
+
+    def halt(self) -> Dict[str, Any]:
+        """Halts the target through the openocd daemon."""
+        return self.__daemon_check("halt")
+
+    # end def
+
+    def is_programmed(self, image: str) -> bool:
+        """
+        Checks whether the target already contains the image. Every section of the image parsed and
+        cached by loadImage is read back and compared with its crc32, the file is not parsed again,
+        neither here nor by openocd.
+        """
+        parsedImage = loadImage(image)
+
+        # sections with no data can not be in the target, there's nothing to compare
+        if parsedImage.size == 0:
+            return False
+        # end if
+
+        if not self.__daemon_check("reset halt")["Success"]:
+            return False
+        # end if
+
+        try:
+            for (address, data), checksum in zip(
+                parsedImage.sections, parsedImage.checksums
+            ):
+                # memory is read in words, the section may start or end inside one
+                start = address // 4 * 4
+                end = (address + len(data) + 3) // 4 * 4
+                content = self.__read_flash(start, end - start)
+                content = content[address - start : address - start + len(data)]
+
+                if zlib.crc32(content) != checksum:
+                    return False
+                # end if
+            # end for
+        except (OSError, RuntimeError, ValueError) as e:
+            self.__loggingService.warning(f"image not compared: {e}")
+            return False
+        # end try-except
+
+        return True
+
+    # end def
+
+    def program(
+        self,
+        image: str,
+        verify: bool = True,
+        reset: bool = True,
+        skipIfIdentical: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Programs the image through the openocd daemon.
+
+        Args:
+            image (str): path of the hex, elf or bin file.
+            verify (bool): verify the image after writing it.
+            reset (bool): reset the target after writing it.
+            skipIfIdentical (bool): do not write the image if the target already contains it.
+
+        Returns:
+            Dict[str, Any]: the same result as burn_test_program. "Skipped" is True when the
+                image was already programmed.
+        """
+        if skipIfIdentical and self.is_programmed(image):
+            if reset:
+                self.reset()
+            # end if
+
+            return {
+                "Output:": "image already programmed",
+                "Error:": "",
+                "Success": True,
+                "Skipped": True,
+            }
+        # end if
+
+        command = f"program {{{image}}}"
+
+        if verify:
+            command += " verify"
+        # end if
+
+        if reset:
+            command += " reset"
+        # end if
+
+        return self.__daemon_check(command)
+
+    # end def
+
+    def program_delta(self, image: str, reset: bool = True) -> Dict[str, Any]:
+        """
+        Programs only the flash pages of the image that differ from the target through the openocd
+        daemon. The pages of the image are read back, compared with the checksums of the paged
+        image and the runs of differing pages are written and verified, every run in a single
+        write. The flash driver erases the pages it writes, the SAMD21 one row by row.
+
+        Args:
+            image (str): path of the hex, elf or bin file.
+            reset (bool): reset the target after writing it.
+
+        Returns:
+            Dict[str, Any]: the same result as program plus "BytesWritten", "PagesWritten" and
+                "PagesSkipped".
+        """
+        paged = loadPagedImage(image, self.__pageSize, self.__cacheDirectory)
+        result = self.__daemon_check("reset halt")
+
+        if not result["Success"]:
+            return result
+        # end if
+
+        differing = []
+
+        try:
+            for first, count in paged.regions():
+                content = self.__read_flash(
+                    paged.addresses[first], count * paged.pageSize
+                )
+
+                for index in range(first, first + count):
+                    offset = (index - first) * paged.pageSize
+
+                    if (
+                        zlib.crc32(content[offset : offset + paged.pageSize])
+                        != paged.checksums[index]
+                    ):
+                        differing.append(index)
+                    # end if
+                # end for
+            # end for
+        except (OSError, RuntimeError, ValueError) as e:
+            return {
+                "Output:": "",
+                "Error:": f"reading back failed: {e}",
+                "Success": False,
+            }
+        # end try-except
+
+        # runs of contiguous differing pages, written with one command each
+        runs = []
+
+        for index in differing:
+            if (
+                len(runs) > 0
+                and paged.addresses[runs[-1][-1]] + paged.pageSize
+                == paged.addresses[index]
+            ):
+                runs[-1].append(index)
+            else:
+                runs.append([index])
+            # end if
+        # end for
+
+        os.makedirs(self.__cacheDirectory, exist_ok=True)
+        written = 0
+
+        for run in runs:
+            address = paged.addresses[run[0]]
+            blockPath = os.path.join(
+                self.__cacheDirectory, f"{paged.digest}.{address:08x}.bin"
+            )
+
+            with open(blockPath, "wb") as file:
+                file.write(b"".join(paged.page(index) for index in run))
+            # end with
+
+            result = self.__daemon_check(
+                f"flash write_image {{{blockPath}}} {address:#x} bin; "
+                f"verify_image {{{blockPath}}} {address:#x} bin"
+            )
+            os.remove(blockPath)
+
+            if not result["Success"]:
+                return result
+            # end if
+
+            written += len(run) * paged.pageSize
+        # end for
+
+        skipped = len(paged.addresses) - len(differing)
+        registry = getRegistry()
+        registry.counter(
+            "flash_delta_bytes_total",
+            "Bytes of the images written and skipped by delta flashing",
+            kind="written",
+        ).inc(written)
+        registry.counter("flash_delta_bytes_total", kind="skipped").inc(
+            skipped * paged.pageSize
+        )
+
+        if reset:
+            result = self.reset()
+
+            if not result["Success"]:
+                return result
+            # end if
+        # end if
+
+        return {
+            "Output:": f"{len(differing)} pages written in {len(runs)} blocks, "
+            f"{skipped} pages unchanged",
+            "Error:": "",
+            "Success": True,
+            "BytesWritten": written,
+            "PagesWritten": len(differing),
+            "PagesSkipped": skipped,
+        }
+
+    # end def
+
+    def __read_flash(self, address: int, size: int) -> bytes:
+        """Reads the target's memory through the daemon, in chunks of up to 4 KiB."""
+        content = bytearray()
+
+        for offset in range(0, size, self.__READ_CHUNK):
+            words = min(self.__READ_CHUNK, size - offset) // 4
+            response = self.__daemon_check(
+                f"read_memory {address + offset:#x} 32 {words}"
+            )
+
+            if not response["Success"]:
+                raise RuntimeError(response["Error:"])
+            # end if
+
+            values = response["Output:"].split()
+
+            if len(values) != words:
+                raise ValueError(f"{len(values)} words read instead of {words}")
+            # end if
+
+            for value in values:
+                content += int(value, 0).to_bytes(4, "little")
+            # end for
+        # end for
+
+        return bytes(content)
+
+    # end def
+
+    def reset(self, mode: str = "run") -> Dict[str, Any]:
+        """Resets the target through the openocd daemon. mode can be run, halt or init."""
+        return self.__daemon_check(f"reset {mode}")
+
+    # end def
+
+    def verify_image(self, image: str) -> Dict[str, Any]:
+        """Compares the image with the target's memory through the openocd daemon."""
+        return self.__daemon_check(f"verify_image {{{image}}}")
 
     # end def
 